@@ -0,0 +1,108 @@
+#Load time and peak memory of the trip file formats
+#
+#Usage:
+#    python benchmarks/bench_formats.py [--file nyc_dataset_medium.txt] [--repeats 3] [--columns PULocationID DOLocationID]
+#
+#The file is converted (in a temporary directory) to the formats nyctaxi reads:
+#  txt      the csv file itself, nyctaxi.trip_loader.load_trips (memory-mapped scanner)
+#  npy      the .trip_cache columns of nyctaxi.trip_cache.cached_load_trips (a warm cache)
+#  parquet  Parquet partitioned by pickup month, zstd (python -m nyctaxi convert)
+#  feather  one uncompressed Arrow IPC file (python -m nyctaxi convert --format feather)
+#Every load runs in a fresh interpreter, which reports its time and its peak RSS
+#(VmHWM, ru_maxrss outside Linux). pyarrow is imported before the clock starts in
+#every run, so the baseline (imports only) is the same for all formats. Every column
+#is touched after the load so that memory maps are counted as read
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nyctaxi.trip_cache import cached_load_trips  # noqa: E402
+from nyctaxi.trip_columnar import write_arrow, write_partitioned  # noqa: E402
+from nyctaxi.trip_loader import load_trips  # noqa: E402
+
+_PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import numpy as np
+import pyarrow, pyarrow.dataset, pyarrow.parquet
+from nyctaxi.trip_cache import cached_load_trips
+from nyctaxi.trip_loader import load_trips
+start = time.perf_counter()
+if {reader!r} == "npy":
+    data = cached_load_trips({path!r}, {columns!r}, cache_dir={cache_dir!r})
+elif {reader!r} == "load":
+    data = load_trips({path!r}, {columns!r})
+else:
+    data = None
+if data is not None:
+    for values in data.columns.values():
+        np.asarray(values).view(np.uint8).max()
+elapsed = time.perf_counter() - start
+try:
+    #VmHWM belongs to this program only, ru_maxrss also keeps the peak of the parent before exec
+    with open("/proc/self/status") as status:
+        rss = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:")) * 1024
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+print(json.dumps({{"seconds": elapsed, "rss": rss}}))
+"""
+
+
+def measure(reader: str, path: str, columns, cache_dir: str, repeats: int) -> dict:
+    """
+    Loads a dataset in 'repeats' fresh interpreters, returns the best time and the largest peak RSS.
+    """
+    runs = []
+    for _ in range(repeats):
+        code = _PROBE.format(root=ROOT, reader=reader, path=path, columns=columns, cache_dir=cache_dir)
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output))
+    return {"seconds": min(run["seconds"] for run in runs), "rss": max(run["rss"] for run in runs)}
+
+
+def disk_bytes(path: str) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--file", default=os.path.join(ROOT, "nyc_dataset_medium.txt"))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--columns", nargs="+", help="also time a load of only these columns")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        parquet_dir = os.path.join(tmp, "parquet")
+        feather_file = os.path.join(tmp, "trips.feather")
+        data = load_trips(args.file)
+        write_partitioned(args.file, parquet_dir)
+        write_arrow(data, feather_file)
+        cached_load_trips(args.file, cache_dir=cache_dir)
+        del data
+        formats = [("txt", "load", args.file, disk_bytes(args.file)),
+                   ("npy", "npy", args.file, disk_bytes(cache_dir)),
+                   ("parquet", "load", parquet_dir, disk_bytes(parquet_dir)),
+                   ("feather", "load", feather_file, disk_bytes(feather_file))]
+
+        baseline = measure("none", args.file, None, cache_dir, args.repeats)
+        print(f"{os.path.basename(args.file)}, imports alone: {baseline['rss'] / 1e6:.1f} MB peak RSS")
+        print(f"{'format':<9}{'columns':<10}{'disk MB':>9}{'seconds':>10}{'peak MB':>10}{'+MB':>8}")
+        for columns in [None] + ([args.columns] if args.columns else []):
+            label = "all" if columns is None else str(len(columns))
+            for name, reader, path, size in formats:
+                result = measure(reader, path, columns, cache_dir, args.repeats)
+                print(f"{name:<9}{label:<10}{size / 1e6:>9.1f}{result['seconds']:>10.3f}"
+                      f"{result['rss'] / 1e6:>10.1f}{(result['rss'] - baseline['rss']) / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
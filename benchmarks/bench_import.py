@@ -0,0 +1,66 @@
+#Import-time budget of the nyctaxi package, its CLI and the task scripts
+#
+#Usage:
+#    python benchmarks/bench_import.py [--budget-ms 300] [--repeats 5]
+#
+#Every module is imported in a fresh interpreter. The check fails (exit code 1) when
+#the best time is above the budget or when a plotting/graph library got imported,
+#those must only be loaded by the code that draws
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["nyctaxi", "nyctaxi.cli", "task1_project", "task2_project", "task3_project"]
+
+#Libraries that must not be loaded just by importing the modules above (pyarrow is
+#only needed for Parquet/Arrow files)
+HEAVY_MODULES = ["matplotlib", "networkx", "scipy", "pyarrow"]
+
+#numpy alone takes about 100 ms
+DEFAULT_BUDGET_MS = 300
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{"ms": elapsed * 1000, "heavy": heavy}}))
+"""
+
+
+def measure_import(module: str, repeats: int = 5) -> dict:
+    """
+    Imports a module in 'repeats' fresh interpreters, returns the best time in
+    milliseconds and the heavy libraries it loaded.
+    """
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output))
+    return {"ms": min(run["ms"] for run in runs), "heavy": runs[-1]["heavy"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':<16}{'import ms':>10}  heavy")
+    for module in MODULES:
+        result = measure_import(module, args.repeats)
+        over = result["ms"] > args.budget_ms or result["heavy"]
+        failed |= bool(over)
+        print(f"{module:<16}{result['ms']:>10.1f}  {','.join(result['heavy']) or '-'}{'  OVER BUDGET' if over else ''}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#Scaling benchmark of nyctaxi.trip_parallel.parallel_aggregate from 1 to N worker processes
+#
+#Usage:
+#    python benchmarks/bench_parallel.py [--rows 10000000] [--max-workers N]
+#
+#Every worker count is checked against the serial stream_stats.
+#Runs on nyc_dataset_medium.txt and on a synthetic file made of rows resampled
+#from it (written once next to the sample files, reused afterwards)
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nyctaxi.trip_parallel import parallel_aggregate  # noqa: E402
+from nyctaxi.trip_stats import STATS_FIELDS, stream_stats  # noqa: E402
+
+
+def make_synthetic_file(source: str, target: str, rows: int, seed: int = 0) -> str:
+    #Writes 'rows' lines drawn at random (with replacement) from the source file
+    if os.path.exists(target):
+        return target
+    with open(source, "r") as f:
+        header = f.readline()
+        lines = f.readlines()
+    rng = random.Random(seed)
+    with open(target + ".part", "w") as out:
+        out.write(header)
+        for start in range(0, rows, 100000):
+            out.writelines(rng.choices(lines, k=min(100000, rows - start)))
+    os.replace(target + ".part", target)
+    return target
+
+
+def bench(file_path: str, max_workers: int, repeats: int) -> None:
+    size_mb = os.path.getsize(file_path) / 1e6
+    print(f"\n{os.path.basename(file_path)} ({size_mb:.1f} MB)")
+    print(f"{'workers':>8} {'best s':>10} {'MB/s':>10} {'speedup':>8}")
+    baseline = None
+    #Results of the serial path (calculate_stats and calculate_speed fold the same accumulators)
+    start = time.perf_counter()
+    serial = stream_stats(file_path, fields=STATS_FIELDS, speed=True)
+    print(f"{'serial':>8} {time.perf_counter() - start:>10.3f}")
+    reference = (serial.stats(), serial.speed_summary())
+    zones = None
+    workers = 1
+    while workers <= max_workers:
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = parallel_aggregate(file_path, workers=workers)
+            best = min(best, time.perf_counter() - start)
+        #Every worker count must give the same answer as the serial path, to the last digit
+        if (result.stats.stats(), result.stats.speed_summary()) != reference:
+            raise AssertionError(f"results with {workers} workers differ from the serial path")
+        zones = zones if zones is not None else result.zone_counts.tolist()
+        if result.zone_counts.tolist() != zones:
+            raise AssertionError(f"zone counts with {workers} workers differ from 1 worker")
+        baseline = baseline or best
+        print(f"{workers:>8} {best:>10.3f} {size_mb / best:>10.1f} {baseline / best:>8.2f}")
+        workers *= 2
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000, help="rows of the synthetic file")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    medium = os.path.join(ROOT, "nyc_dataset_medium.txt")
+    bench(medium, args.max_workers, args.repeats)
+    synthetic = os.path.join(ROOT, f"nyc_dataset_synthetic_{args.rows}.txt")
+    bench(make_synthetic_file(medium, synthetic, args.rows), args.max_workers, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#Throughput of the pipelined multi-file aggregation (nyctaxi.pipeline)
+#
+#Usage:
+#    python benchmarks/bench_pipeline.py [--files 6] [--rows 1000000] [--compression gzip] [--repeats 3]
+#
+#Writes 'files' monthly-like files made of rows resampled from nyc_dataset_medium.txt
+#(compressed with gzip, zstd or not at all; written once in .bench_pipeline next to the
+#sample files, reused afterwards) and aggregates them:
+#  sequential  aggregate_files_sequential, read + decompress + parse one file after the other
+#  pipeline    aggregate_files with 1, 2 and 4 files in flight (threads)
+#  processes   aggregate_files with 1 to --max-processes worker processes
+#Every run must give the same TripAggregates as the sequential one.
+#On one core no mode beats the sequential one (4 x 300k rows, gzip: 0.85-0.94x for the
+#threads); the processes can only gain with a free core per file in flight
+import argparse
+import gzip
+import os
+import shutil
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_parallel import make_synthetic_file  # noqa: E402
+from nyctaxi.pipeline import aggregate_files, aggregate_files_sequential  # noqa: E402
+
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+
+def compress(source: str, target: str, compression: str) -> str:
+    if os.path.exists(target):
+        return target
+    with open(source, "rb") as f_in, open(target + ".part", "wb") as raw:
+        if compression == "gzip":
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as f_out:
+                shutil.copyfileobj(f_in, f_out, 1 << 20)
+        elif compression == "zstd":
+            import zstandard
+            with zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False) as f_out:
+                shutil.copyfileobj(f_in, f_out, 1 << 20)
+        else:
+            shutil.copyfileobj(f_in, raw, 1 << 20)
+    os.replace(target + ".part", target)
+    return target
+
+
+def make_files(count: int, rows: int, compression: str) -> list:
+    #Every file gets its own seed, like distinct months of trips
+    folder = os.path.join(ROOT, ".bench_pipeline")
+    os.makedirs(folder, exist_ok=True)
+    medium = os.path.join(ROOT, "nyc_dataset_medium.txt")
+    paths = []
+    for index in range(count):
+        plain = make_synthetic_file(medium, os.path.join(folder, f"trips_{rows}_{index:02d}.txt"), rows, seed=index)
+        paths.append(compress(plain, plain + SUFFIXES[compression], compression) if compression != "none" else plain)
+    return paths
+
+
+def summary(result) -> tuple:
+    aggregates = result.aggregates
+    return (aggregates.stats.stats(), aggregates.stats.speed_summary(), aggregates.zone_counts.tolist(),
+            aggregates.od_matrix.tolist(), aggregates.rows)
+
+
+def best_run(function, repeats: int):
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=6)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="rows of every file")
+    parser.add_argument("--compression", choices=list(SUFFIXES), default="gzip")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-processes", type=int, default=max(2, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    paths = make_files(args.files, args.rows, args.compression)
+    disk_mb = sum(os.path.getsize(path) for path in paths) / 1e6
+    print(f"{args.files} files x {args.rows} rows, {args.compression}, {disk_mb:.1f} MB on disk, "
+          f"{os.cpu_count()} cpu(s)")
+    print(f"{'mode':<22}{'seconds':>10}{'rows/s':>14}{'speedup':>9}")
+    baseline, expected = best_run(lambda: aggregate_files_sequential(paths), args.repeats)
+    expected = summary(expected)
+    rows = args.files * args.rows
+    print(f"{'sequential':<22}{baseline:>10.3f}{rows / baseline:>14,.0f}{1.0:>8.2f}x")
+    runs = [(f"pipeline, {in_flight} in flight", {"files_in_flight": in_flight}) for in_flight in (1, 2, 4)]
+    processes = 1
+    while processes <= args.max_processes:
+        runs.append((f"processes, {processes}", {"processes": processes}))
+        processes *= 2
+    for label, options in runs:
+        seconds, result = best_run(lambda: aggregate_files(paths, **options), args.repeats)
+        assert summary(result) == expected, f"{label} disagrees"
+        print(f"{label:<22}{seconds:>10.3f}{rows / seconds:>14,.0f}{baseline / seconds:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
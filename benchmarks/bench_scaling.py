@@ -0,0 +1,142 @@
+#Throughput and peak memory of every analysis as the trip files grow
+#
+#Usage:
+#    python benchmarks/bench_scaling.py [--sizes 1000000 10000000 100000000] [--seed 0]
+#                                       [--analyses stats speed zones fused sort od-graph] [--json out.json] [--csv out.csv]
+#
+#The files are generated once by nyctaxi.synthetic (about 114 bytes per row, so
+#11 GB for 100M rows) in .bench_scaling next to the sample files and reused afterwards.
+#Every analysis runs on every size in a fresh interpreter, which reports its time and
+#its peak RSS (VmHWM, ru_maxrss outside Linux):
+#  stats     stream_stats of the four fields of calculate_stats, chunk by chunk
+#  speed     stream_stats of the speed only
+#  zones     trips per pickup zone, scanning PULocationID only
+#  fused     stats + speed + zone counts from one scan (nyctaxi.analysis_plan)
+#  sort      loads fare_amount and sorts it with every algorithm of --algorithms;
+#            an algorithm is skipped above its SORT_LIMITS entry (Python lists of
+#            100M floats do not fit in memory, bubble sort does not end)
+#  od-graph  OD matrix, connected components, PageRank and busiest routes
+#Rows/sec of 'sort' count the values sorted, the time is the one the algorithm reports.
+#The csv files are memory-mapped by the scanner, so the peak RSS also counts the pages
+#of the file read so far while they stay resident
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nyctaxi.synthetic import ensure_synthetic  # noqa: E402
+
+ANALYSES = ("stats", "speed", "zones", "fused", "sort", "od-graph")
+
+#Largest column every sorting algorithm is given
+SORT_LIMITS = {"bubble": 5000, "quick": 1_000_000, "intro": 10_000_000, "merge": 10_000_000,
+               "counting": 10_000_000, "radix": 10_000_000, "python": 10_000_000, "numpy": 10_000_000}
+
+_PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+import numpy as np
+path, analysis, algorithm = {path!r}, {analysis!r}, {algorithm!r}
+start = time.perf_counter()
+rows = None
+if analysis == "stats":
+    from nyctaxi.trip_stats import stream_stats
+    rows = stream_stats(path, speed=False).rows
+elif analysis == "speed":
+    from nyctaxi.trip_stats import stream_stats
+    rows = stream_stats(path, fields=(), speed=True).rows
+elif analysis == "zones":
+    from nyctaxi.od_matrix import ZONE_SLOTS
+    from nyctaxi.trip_scanner import scan_trips
+    pickup = scan_trips(path, ["PULocationID"])
+    np.bincount(pickup.valid("PULocationID").astype(np.int64), minlength=ZONE_SLOTS)
+    rows = len(pickup)
+elif analysis == "fused":
+    from nyctaxi.analysis_plan import SpeedAnalysis, StatsAnalysis, TripCountAnalysis, run
+    run(path, [StatsAnalysis(), SpeedAnalysis(), TripCountAnalysis({{1: "", 132: "", 74: "", 43: ""}})], memo=False)
+elif analysis == "sort":
+    from nyctaxi.sorting import sorting_algorithms
+    from nyctaxi.trip_scanner import scan_trips
+    values = scan_trips(path, ["fare_amount"]).valid("fare_amount").tolist()
+    rows = len(values)
+    _, elapsed = sorting_algorithms[algorithm](values)
+elif analysis == "od-graph":
+    from nyctaxi.graph_analytics import connected_components, from_od_matrix, pagerank, top_routes
+    from nyctaxi.od_matrix import OD_COLUMNS, od_matrix
+    from nyctaxi.trip_scanner import scan_trips
+    trips = scan_trips(path, list(OD_COLUMNS))
+    matrix = od_matrix(trips)
+    graph = from_od_matrix(matrix)
+    connected_components(graph)
+    pagerank(graph)
+    top_routes(matrix, 10)
+    rows = len(trips)
+if analysis != "sort":
+    elapsed = time.perf_counter() - start
+try:
+    #VmHWM belongs to this program only, ru_maxrss also keeps the peak of the parent before exec
+    with open("/proc/self/status") as status:
+        rss = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:")) * 1024
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+print(json.dumps({{"seconds": elapsed, "rss": rss, "rows": rows}}))
+"""
+
+
+def measure(path: str, analysis: str, algorithm: str = None) -> dict:
+    """
+    Runs one analysis of a file in a fresh interpreter, returns its time, peak RSS and rows.
+    """
+    code = _PROBE.format(root=ROOT, path=path, analysis=analysis, algorithm=algorithm)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000_000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--analyses", nargs="+", choices=ANALYSES, default=list(ANALYSES))
+    parser.add_argument("--algorithms", nargs="+", choices=list(SORT_LIMITS), default=["intro", "radix", "python", "numpy"])
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    parser.add_argument("--csv", help="also write the results to this csv file")
+    args = parser.parse_args()
+
+    samples = [os.path.join(ROOT, name) for name in ("nyc_dataset_small.txt", "nyc_dataset_medium.txt")]
+    paths = ensure_synthetic(os.path.join(ROOT, ".bench_scaling"), args.sizes, args.seed, samples)
+    results = []
+    print(f"{'rows':>12}  {'analysis':<16}{'seconds':>10}{'rows/s':>14}{'peak MB':>10}")
+    for rows, path in zip(args.sizes, paths):
+        runs = [(analysis, None) for analysis in args.analyses if analysis != "sort"]
+        if "sort" in args.analyses:
+            runs += [("sort", algorithm) for algorithm in args.algorithms]
+        for analysis, algorithm in runs:
+            label = f"sort {algorithm}" if algorithm else analysis
+            if algorithm and rows > SORT_LIMITS[algorithm]:
+                print(f"{rows:>12}  {label:<16}{'skipped, above ' + str(SORT_LIMITS[algorithm]):>34}")
+                continue
+            result = measure(path, analysis, algorithm)
+            processed = result["rows"] if result["rows"] is not None else rows
+            row = {"rows": rows, "analysis": label, "seconds": result["seconds"],
+                   "rows_per_s": processed / result["seconds"] if result["seconds"] > 0 else None,
+                   "peak_bytes": result["rss"], "file_bytes": os.path.getsize(path)}
+            results.append(row)
+            print(f"{rows:>12}  {label:<16}{row['seconds']:>10.3f}{row['rows_per_s'] or 0:>14,.0f}"
+                  f"{row['peak_bytes'] / 1e6:>10.1f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"seed": args.seed, "cpus": os.cpu_count(), "results": results}, f, indent=1)
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]) if results else ["rows"])
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#Benchmark of the sorting algorithms of task2_project (nyctaxi/sorting.py) on inputs sampled from the trip columns
+#
+#Usage:
+#    python benchmarks/bench_sorting.py [--file nyc_dataset_medium.txt] [--sizes 100 1000 10000]
+#                                       [--algorithms intro merge python numpy]
+#                                       [--csv sorting.csv] [--json sorting.json]
+#
+#Million-row inputs are drawn with replacement, e.g. --sizes 1000000 --algorithms intro merge radix python numpy
+#
+#The json report records the commit it was produced on, keep one per commit to
+#spot regressions
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nyctaxi.sort_bench import SIZE_LIMITS, SORT_COLUMNS, format_table, run_benchmark, write_csv, write_json  # noqa: E402
+from nyctaxi.sorting import sorting_algorithms  # noqa: E402
+from nyctaxi.trip_cache import cached_load_trips  # noqa: E402
+
+ALGORITHMS = sorting_algorithms
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--file", default=os.path.join(ROOT, "nyc_dataset_medium.txt"))
+    parser.add_argument("--columns", nargs="+", default=list(SORT_COLUMNS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000])
+    parser.add_argument("--algorithms", nargs="+", default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", help="write the results to this csv file")
+    parser.add_argument("--json", help="write the results to this json file")
+    args = parser.parse_args()
+
+    data = cached_load_trips(args.file)
+    algorithms = {name: ALGORITHMS[name] for name in args.algorithms}
+    results = run_benchmark(data, algorithms, args.columns, args.sizes, args.warmup,
+                            args.repeats, args.seed, SIZE_LIMITS)
+
+    print(format_table(results))
+    if args.csv:
+        write_csv(results, args.csv)
+    if args.json:
+        write_json(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+#Analyses of the NYC taxi trip files
+#
+#The modules are imported on demand (e.g. 'from nyctaxi.trip_stats import stream_stats');
+#importing the package itself loads nothing else, see 'python -m nyctaxi --help'
@@ -0,0 +1,370 @@
+#Fused, memoized execution of several analyses over the same trips
+#Every analysis declares the columns it reads and the intermediates it needs
+#(trip durations, speeds, pickup zone counts, OD matrix cells); an intermediate may
+#need other intermediates. A Plan orders the intermediates of all the requested
+#analyses so each one is computed once per chunk, and the file is scanned once,
+#for the union of the columns, whatever the number of analyses:
+#    run("nyc_dataset_medium.txt", [StatsAnalysis(), SpeedAnalysis(), TripCountAnalysis(zones)])
+#Results are memoized by dataset fingerprint (path, size and mtime of a file, the
+#object itself for a TripTable) and the analysis parameters, so asking again only
+#computes what is missing. A file keeps one entry, replaced when its fingerprint
+#changes, and only the MEMO_FILES files used last are kept. For an in-memory
+#TripTable the intermediates are kept too, as long as the table is alive; tables
+#are treated as read-only.
+import copy
+import os
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .od_matrix import OD_COLUMNS, ZONE_SLOTS, od_cells, od_columns, od_matrix
+from .profiling import stage
+from .trip_loader import DEFAULT_BLOCK_ROWS, TripTable, iter_trip_chunks
+from .trip_parallel import trips_in_order
+from .trip_stats import SPEED_COLUMNS, STATS_FIELDS, SpeedFilters, TripStats, compute_speeds, trip_durations
+
+#Number of files whose results are kept, least recently used ones are dropped above it
+MEMO_FILES = 16
+
+#Results of the files already analysed: path -> (fingerprint, results by analysis key)
+_file_results: "OrderedDict[str, Tuple[tuple, Dict[tuple, object]]]" = OrderedDict()
+#Results and intermediates of the in-memory tables, dropped with the table
+_table_memos: "weakref.WeakKeyDictionary[TripTable, dict]" = weakref.WeakKeyDictionary()
+
+
+class Intermediate:
+    """
+    A value computed from a chunk of trips and shared by the analyses needing it.
+
+    :key: Identifies the value; intermediates with equal keys are computed once
+    :columns: The trip columns it reads
+    :needs: The Intermediates it is computed from
+    :compute: Called as compute(chunk, values), 'values' holding the needed intermediates by key
+    """
+
+    def __init__(self, key: tuple, columns: Sequence[str], needs: Sequence["Intermediate"],
+                 compute: Callable[[TripTable, dict], object]):
+        self.key = key
+        self.columns = tuple(columns)
+        self.needs = tuple(needs)
+        self.compute = compute
+
+    def __repr__(self) -> str:
+        return f"Intermediate{self.key}"
+
+
+def _known_pickups(chunk: TripTable, values: dict) -> tuple:
+    #Row of every trip whose pickup zone is known, and that zone
+    pickup = chunk['PULocationID'].astype(np.int64)
+    rows = np.flatnonzero(~chunk.nulls['PULocationID'] & (pickup >= 0) & (pickup < ZONE_SLOTS))
+    return rows, pickup[rows]
+
+
+DURATIONS = Intermediate(("duration_s",), ("tpep_pickup_datetime", "tpep_dropoff_datetime"), (),
+                         lambda chunk, values: trip_durations(chunk))
+PICKUP_ZONES = Intermediate(("pickup_zones",), ("PULocationID",), (), _known_pickups)
+ZONE_COUNTS = Intermediate(("zone_counts",), (), (PICKUP_ZONES,),
+                           lambda chunk, values: np.bincount(values[PICKUP_ZONES.key][1], minlength=ZONE_SLOTS))
+OD_CELLS = Intermediate(("od_cells",), OD_COLUMNS, (), lambda chunk, values: od_cells(chunk))
+
+
+def _filter_key(filters: Optional[SpeedFilters]) -> tuple:
+    filters = filters or SpeedFilters()
+    return (filters.min_duration_s, filters.max_duration_s, filters.min_distance_miles, filters.max_speed_kmh)
+
+
+def speeds(filters: Optional[SpeedFilters] = None) -> Intermediate:
+    """
+    Returns the intermediate holding compute_speeds(chunk, filters): the kept speeds and the rejection counts.
+    """
+    return Intermediate(("speeds",) + _filter_key(filters), SPEED_COLUMNS, (DURATIONS,),
+                        lambda chunk, values: compute_speeds(chunk, filters, values[DURATIONS.key]))
+
+
+class Analysis:
+    """
+    An analysis folded chunk by chunk; a new instance is used for every run.
+
+    :name: The name of its result
+    :key: Identifies the analysis and its parameters in the memo
+    :columns: The trip columns it reads itself
+    :needs: The Intermediates it reads
+    """
+
+    name = ""
+    columns: Tuple[str, ...] = ()
+    needs: Tuple[Intermediate, ...] = ()
+
+    @property
+    def key(self) -> tuple:
+        return (type(self).__name__,)
+
+    def update(self, chunk: TripTable, values: dict) -> None:
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class StatsAnalysis(Analysis):
+    """
+    min, max and avg of the fields, as calculate_stats.
+    """
+
+    def __init__(self, fields: Sequence[str] = STATS_FIELDS, name: str = "stats"):
+        self.name = name
+        self.fields = tuple(fields)
+        self.columns = self.fields
+        self.stats = TripStats(self.fields, speed=False)
+
+    @property
+    def key(self) -> tuple:
+        return ("stats",) + self.fields
+
+    def update(self, chunk: TripTable, values: dict) -> None:
+        self.stats.update(chunk)
+
+    def result(self):
+        return self.stats.stats()
+
+
+class SpeedAnalysis(Analysis):
+    """
+    min, max and avg speed of the trips kept by the filters, as calculate_speed.
+    """
+
+    def __init__(self, filters: Optional[SpeedFilters] = None, name: str = "speed"):
+        self.name = name
+        self.filters = filters
+        self.needs = (speeds(filters),)
+        self.stats = TripStats(fields=(), speed=True, speed_filters=filters)
+
+    @property
+    def key(self) -> tuple:
+        return self.needs[0].key
+
+    def update(self, chunk: TripTable, values: dict) -> None:
+        self.stats.update_speeds(*values[self.needs[0].key])
+
+    def result(self):
+        return self.stats.speed_summary()
+
+
+class TripCountAnalysis(Analysis):
+    """
+    Trips leaving the given zones in order of first appearance, as count_trips.
+    """
+
+    needs = (PICKUP_ZONES, ZONE_COUNTS)
+
+    def __init__(self, zones: Dict[int, str], name: str = "trips"):
+        self.name = name
+        self.zones = dict(zones)
+        self.zone_counts = np.zeros(ZONE_SLOTS, dtype=np.int64)
+        self.first_seen = np.full(ZONE_SLOTS, np.iinfo(np.int64).max, dtype=np.int64)
+        self.rows = 0
+
+    @property
+    def key(self) -> tuple:
+        return ("trips",) + tuple(sorted(self.zones.items()))
+
+    def update(self, chunk: TripTable, values: dict) -> None:
+        rows, pickup = values[PICKUP_ZONES.key]
+        self.zone_counts += values[ZONE_COUNTS.key]
+        zones, first = np.unique(pickup, return_index=True)
+        self.first_seen[zones] = np.minimum(self.first_seen[zones], rows[first] + self.rows)
+        self.rows += len(chunk)
+
+    def result(self):
+        return trips_in_order(self.zone_counts, self.first_seen, self.zones)
+
+
+class GroupedTripCountAnalysis(Analysis):
+    """
+    Trips leaving every borough or service zone of a ZoneCatalog, as count_trips_by.
+    """
+
+    needs = (ZONE_COUNTS,)
+
+    def __init__(self, catalog, by: str = "borough", name: Optional[str] = None):
+        self.name = name or f"trips_by_{by}"
+        self.catalog = catalog
+        self.by = by
+        self.zone_counts = np.zeros(ZONE_SLOTS, dtype=np.int64)
+
+    @property
+    def key(self) -> tuple:
+        #The grouping itself, so equal lookup files share their result
+        codes, labels = self.catalog.codes(self.by)
+        return ("trips_by", self.by, codes.tobytes(), labels)
+
+    def update(self, chunk: TripTable, values: dict) -> None:
+        self.zone_counts += values[ZONE_COUNTS.key]
+
+    def result(self):
+        return self.catalog.group(self.zone_counts, self.by)
+
+
+class ODMatrixAnalysis(Analysis):
+    """
+    The pickup -> dropoff matrix of od_matrix, trip counts or sums of a weight.
+    """
+
+    needs = (OD_CELLS,)
+
+    def __init__(self, weight: Optional[str] = None, name: Optional[str] = None):
+        self.name = name or ("od_matrix" if weight is None else f"od_{weight}")
+        self.weight = weight
+        self.columns = od_columns(weight)
+        self.matrix = None
+
+    @property
+    def key(self) -> tuple:
+        return ("od_matrix", self.weight)
+
+    def update(self, chunk: TripTable, values: dict) -> None:
+        matrix = od_matrix(chunk, self.weight, cells=values[OD_CELLS.key])
+        self.matrix = matrix if self.matrix is None else self.matrix + matrix
+
+    def result(self):
+        if self.matrix is None:
+            return np.zeros((ZONE_SLOTS, ZONE_SLOTS), dtype=np.int64 if self.weight is None else np.float64)
+        return self.matrix
+
+
+class Plan:
+    """
+    The analyses of one run with the intermediates they need, in the order they are computed.
+
+    :analyses: The analyses
+    :intermediates: Every needed Intermediate once, each after the ones it is computed from
+    :columns: The union of the columns the analyses and intermediates read
+    """
+
+    def __init__(self, analyses: Sequence[Analysis]):
+        names = [analysis.name for analysis in analyses]
+        duplicated = sorted({name for name in names if names.count(name) > 1})
+        if duplicated:
+            raise ValueError(f"several analyses are named {duplicated}")
+        self.analyses = list(analyses)
+        self.intermediates: List[Intermediate] = []
+        seen = set()
+
+        def visit(intermediate: Intermediate) -> None:
+            #Depth first, so an intermediate comes after the ones it needs
+            if intermediate.key in seen:
+                return
+            seen.add(intermediate.key)
+            for need in intermediate.needs:
+                visit(need)
+            self.intermediates.append(intermediate)
+
+        for analysis in self.analyses:
+            for intermediate in analysis.needs:
+                visit(intermediate)
+        columns = [column for step in self.intermediates + self.analyses for column in step.columns]
+        self.columns = tuple(dict.fromkeys(columns))
+
+    def update(self, chunk: TripTable, values: Optional[dict] = None) -> dict:
+        """
+        Computes the missing intermediates of a chunk, then folds it into every analysis.
+
+        @return: The intermediates of the chunk by key
+        """
+        values = {} if values is None else values
+        for intermediate in self.intermediates:
+            if intermediate.key not in values:
+                values[intermediate.key] = intermediate.compute(chunk, values)
+        for analysis in self.analyses:
+            analysis.update(chunk, values)
+        return values
+
+    def results(self) -> Dict[str, object]:
+        return {analysis.name: analysis.result() for analysis in self.analyses}
+
+    def describe(self) -> str:
+        """
+        Returns the plan as text: the columns scanned, the intermediates and the analyses.
+        """
+        lines = [f"scan once: {', '.join(self.columns)}"]
+        lines += [f"  intermediate {'/'.join(map(str, step.key))}" for step in self.intermediates]
+        lines += [f"  analysis {analysis.name}" for analysis in self.analyses]
+        return "\n".join(lines)
+
+
+def dataset_fingerprint(file_path: str) -> tuple:
+    """
+    Returns the path, size and mtime of a trip file, or of every file of a dataset directory.
+    """
+    path = os.path.abspath(file_path)
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return (path, stat.st_size, stat.st_mtime_ns)
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in sorted(names):
+            stat = os.stat(os.path.join(root, name))
+            files.append((os.path.relpath(os.path.join(root, name), path), stat.st_size, stat.st_mtime_ns))
+    return (path,) + tuple(files)
+
+
+def clear_memo() -> None:
+    """
+    Forgets the memoized results and intermediates.
+    """
+    _file_results.clear()
+    _table_memos.clear()
+
+
+def _file_memo(file_path: str) -> Dict[tuple, object]:
+    #Results memoized for the file, emptied when it changed since they were computed
+    fingerprint = dataset_fingerprint(file_path)
+    path = fingerprint[0]
+    entry = _file_results.get(path)
+    if entry is None or entry[0] != fingerprint:
+        entry = _file_results[path] = (fingerprint, {})
+    _file_results.move_to_end(path)
+    while len(_file_results) > MEMO_FILES:
+        _file_results.popitem(last=False)
+    return entry[1]
+
+
+def run(source: Union[str, TripTable], analyses: Iterable[Analysis], chunk_rows: int = DEFAULT_BLOCK_ROWS,
+        memo: bool = True) -> Dict[str, object]:
+    """
+    This function computes several analyses of the same trips in a single pass.
+
+    Parameters:
+    :source: A trip file (csv, Parquet or Feather, see iter_trip_chunks) or a TripTable
+    :analyses: The Analysis instances to compute (e.g. StatsAnalysis(), SpeedAnalysis(),
+        TripCountAnalysis(zones), ODMatrixAnalysis())
+    :chunk_rows: The number of trips of a file read at once
+    :memo: Whether to reuse and keep the results (and, for a TripTable, the intermediates)
+
+    @return: The result of every analysis by name; for a file, every column needed by
+        any of them is read only once, and not at all when every result is memoized
+    """
+    analyses = list(analyses)
+    if isinstance(source, TripTable):
+        memory = _table_memos.setdefault(source, {"results": {}, "values": {}}) if memo else None
+        results, values = (memory["results"], memory["values"]) if memo else ({}, {})
+    else:
+        results = _file_memo(source) if memo else {}
+    missing = [analysis for analysis in analyses if analysis.key not in results]
+    if missing:
+        plan = Plan(missing)
+        with stage("analysis_plan.run") as current:
+            if isinstance(source, TripTable):
+                plan.update(source, values)
+                current.add_rows(len(source))
+            else:
+                for chunk in iter_trip_chunks(source, plan.columns, chunk_rows):
+                    plan.update(chunk)
+                    current.add_rows(len(chunk))
+        for analysis in missing:
+            results[analysis.key] = analysis.result()
+    #Copies, so a caller changing a result does not change the memo
+    return {analysis.name: copy.deepcopy(results[analysis.key]) for analysis in analyses}
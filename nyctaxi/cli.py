@@ -0,0 +1,441 @@
+#Command line interface of the nyctaxi package
+#
+#Usage:
+#    python -m nyctaxi stats FILE [--workers N | --clean] [--rules rules.json]   (--rules implies --clean)
+#    python -m nyctaxi speed FILE [--max-duration S] [--min-distance MI] [--max-speed KMH] [--clean] [--rules rules.json]
+#    python -m nyctaxi validate FILE [--rules rules.json] [--lookup taxi+_zone_lookup.csv]
+#    python -m nyctaxi analyse FILE [--only stats speed zones boroughs routes] [--explain]
+#    python -m nyctaxi zones FILE [--lookup taxi+_zone_lookup.csv] [--ids 1 132 74 43 | --by borough]
+#    python -m nyctaxi sort-bench FILE [--sizes 100 1000] [--algorithms intro merge] [--output chart.png | --no-plot]
+#    python -m nyctaxi od-graph FILE [--lookup taxi+_zone_lookup.csv] [--top 10] [--output graph.png | --no-plot]
+#    python -m nyctaxi rollup-append STORE FILE [FILE ...]
+#    python -m nyctaxi rollup-query STORE [--start 2022-07-01] [--end 2022-07-08T12] [--pickup 132] [--by borough] [--per-hour]
+#    python -m nyctaxi pipeline FILE [FILE ...] [--files-in-flight 2] [--queue-blocks 4] [--workers N] [--processes N]
+#    python -m nyctaxi convert FILE TARGET [--format parquet | feather] [--row-group-rows 131072]
+#    python -m nyctaxi generate TARGET --rows 10000000 [--seed 0] [--samples FILE ...] [--start 2022-01-01 --end 2023-01-01]
+#
+#Global options, before the subcommand:
+#    --trace trace.json [--trace-memory]   time, rows/sec (and peak memory) of every stage, see profiling.py
+#    --profile run.prof                    cProfile statistics of the whole command
+#
+#Every FILE may be a csv trip file, a Parquet file, a directory of Parquet files or an Arrow/Feather file
+#
+#Only numpy is imported up front; matplotlib and networkx are loaded by the
+#subcommands that draw, and never with --no-plot
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from . import profiling
+from .zones import DEFAULT_LOOKUP, GROUP_BY, load_catalog
+
+#Zones counted by 'zones' when no --ids are given, as in task1_project
+DEFAULT_ZONE_IDS = [1, 132, 74, 43]
+
+
+def read_zone_names(lookup_file: str) -> Dict[int, str]:
+    """
+    Returns the zone name of every LocationID of the zone lookup csv (see zones.py).
+    """
+    return load_catalog(lookup_file).names_dict()
+
+
+def _print_json(result) -> None:
+    print(json.dumps(result, indent=1, default=float))
+
+
+def _speed_filters(args):
+    from .trip_stats import SpeedFilters
+    return SpeedFilters(args.min_duration, args.max_duration, args.min_distance, args.max_speed)
+
+
+def _validation_rules(args):
+    #The rules of --rules (a JSON spec, see validation.rules_from_spec), DEFAULT_RULES otherwise
+    from .validation import DEFAULT_RULES, rules_from_spec
+    if not args.rules:
+        return DEFAULT_RULES
+    with open(args.rules) as f:
+        return rules_from_spec(json.load(f), load_catalog(args.lookup))
+
+
+def _trip_stats(args, speed: bool, report=None):
+    #Statistics of the file, split across processes with --workers, streamed otherwise
+    from .trip_stats import STATS_FIELDS, stream_stats
+    if args.workers is not None:
+        from .trip_parallel import parallel_aggregate
+        return parallel_aggregate(args.file, workers=args.workers).stats
+    return stream_stats(args.file, fields=STATS_FIELDS if not speed else (), speed=speed,
+                        speed_filters=_speed_filters(args) if speed else None,
+                        rules=_validation_rules(args) if args.clean else None, report=report)
+
+
+def _cleaning_report(args):
+    from .validation import ValidationReport
+    return ValidationReport() if args.clean else None
+
+
+def cmd_stats(args) -> int:
+    report = _cleaning_report(args)
+    result = _trip_stats(args, speed=False, report=report).stats()
+    if report is not None:
+        result = {"stats": result, "validation": report.as_dict()}
+    _print_json(result)
+    return 0
+
+
+def cmd_speed(args) -> int:
+    report = _cleaning_report(args)
+    stats = _trip_stats(args, speed=True, report=report)
+    _, minimum, _, maximum, _, average = stats.speed_summary()
+    result = {"min": minimum, "max": maximum, "avg": average, "rejected": stats.speed_rejections}
+    if report is not None:
+        result["validation"] = report.as_dict()
+    _print_json(result)
+    return 0
+
+
+def cmd_validate(args) -> int:
+    from .trip_loader import iter_trip_chunks
+    from .validation import ValidationReport, iter_validated, rule_columns
+    rules = _validation_rules(args)
+    report = ValidationReport(rules)
+    #Only the columns the rules read are parsed, one chunk at a time
+    for _ in iter_validated(iter_trip_chunks(args.file, rule_columns(rules)), rules, report):
+        pass
+    _print_json(report.as_dict())
+    return 0
+
+
+#Analyses of 'analyse', all of them when no --only is given
+ANALYSES = ("stats", "speed", "zones", "boroughs", "routes")
+
+
+def cmd_analyse(args) -> int:
+    from . import analysis_plan as plan
+    from .graph_analytics import top_routes
+    names = read_zone_names(args.lookup)
+    wanted = args.only or ANALYSES
+    analyses = []
+    if "stats" in wanted:
+        analyses.append(plan.StatsAnalysis())
+    if "speed" in wanted:
+        analyses.append(plan.SpeedAnalysis())
+    if "zones" in wanted:
+        analyses.append(plan.TripCountAnalysis({zone_id: names.get(zone_id, str(zone_id)) for zone_id in args.ids}))
+    if "boroughs" in wanted:
+        analyses.append(plan.GroupedTripCountAnalysis(load_catalog(args.lookup)))
+    if "routes" in wanted:
+        analyses.append(plan.ODMatrixAnalysis())
+    if args.explain:
+        print(plan.Plan(analyses).describe(), file=sys.stderr)
+    #Every requested analysis is computed from a single scan of the file
+    results = plan.run(args.file, analyses)
+    if "speed" in results:
+        _, minimum, _, maximum, _, average = results["speed"]
+        results["speed"] = {"min": minimum, "max": maximum, "avg": average}
+    if "od_matrix" in results:
+        results["top_routes"] = [[names.get(pickup, str(pickup)), names.get(dropoff, str(dropoff)), trips]
+                                 for pickup, dropoff, trips in top_routes(results.pop("od_matrix"), args.top)]
+    _print_json(results)
+    return 0
+
+
+def cmd_zones(args) -> int:
+    from .od_matrix import ZONE_SLOTS
+    from .trip_scanner import scan_trips
+    if args.by is not None:
+        #Trips are counted per LocationID, then the counts are added up per group
+        pickup = scan_trips(args.file, ["PULocationID"])
+        counts = np.bincount(pickup.valid("PULocationID").astype(np.int64), minlength=ZONE_SLOTS)
+        _print_json(load_catalog(args.lookup).group(counts, args.by))
+        return 0
+    names = read_zone_names(args.lookup)
+    #Only the trips leaving the requested zones are kept by the scanner
+    pickup = scan_trips(args.file, ["PULocationID"], where=[("PULocationID", "in", set(args.ids))])
+    counts = np.bincount(pickup["PULocationID"].astype(np.int64), minlength=ZONE_SLOTS)
+    _print_json({names.get(zone_id, str(zone_id)): int(counts[zone_id])
+                 for zone_id in args.ids if 0 <= zone_id < ZONE_SLOTS})
+    return 0
+
+
+def cmd_sort_bench(args) -> int:
+    from .sort_bench import SIZE_LIMITS, format_table, run_benchmark, write_csv, write_json
+    from .sorting import algorithm_labels, sorting_algorithms
+    from .trip_cache import cached_load_trips
+    algorithms = {name: sorting_algorithms[name] for name in args.algorithms}
+    results = run_benchmark(cached_load_trips(args.file), algorithms, args.columns, args.sizes,
+                            args.warmup, args.repeats, args.seed, SIZE_LIMITS)
+    print(format_table(results))
+    if args.csv:
+        write_csv(results, args.csv)
+    if args.json:
+        write_json(results, args.json)
+    if not args.no_plot:
+        from .plots import plot_sort_times
+        #One bar per algorithm and column, for the largest size
+        largest = max(args.sizes)
+        times = {name: [next((row["median_ns"] / 1e9 for row in results if row["algorithm"] == name
+                              and row["column"] == column and row["size"] == largest), 0.0)
+                        for column in args.columns] for name in algorithms}
+        plot_sort_times(list(args.columns), times, algorithm_labels, args.output)
+    return 0
+
+
+def cmd_od_graph(args) -> int:
+    from .graph_analytics import connected_components, from_od_matrix, pagerank, top_routes
+    from .od_matrix import OD_COLUMNS, od_matrix
+    names = read_zone_names(args.lookup)
+    if args.workers is not None:
+        from .trip_parallel import parallel_aggregate
+        counts = parallel_aggregate(args.file, workers=args.workers).od_matrix
+    else:
+        from .trip_scanner import scan_trips
+        counts = od_matrix(scan_trips(args.file, columns=OD_COLUMNS))
+
+    components = connected_components(from_od_matrix(counts))
+    rank = pagerank(from_od_matrix(counts, directed=True))
+    busiest = np.argsort(rank, kind="stable")[::-1][:args.top]
+    _print_json({
+        "components": [[names.get(zone_id, str(zone_id)) for zone_id in component.tolist()]
+                       for component in components],
+        "top_routes": [[names.get(pickup, str(pickup)), names.get(dropoff, str(dropoff)), trips]
+                       for pickup, dropoff, trips in top_routes(counts, args.top, directed=False)],
+        #[LocationID, name, rank]: zones sharing a name (e.g. Corona) stay apart
+        "pagerank": [[zone_id, names.get(zone_id, str(zone_id)), float(rank[zone_id])]
+                     for zone_id in busiest.tolist() if rank[zone_id] > 0],
+    })
+    if not args.no_plot:
+        from .plots import draw_zone_graph
+        draw_zone_graph(counts, list(names), args.output)
+    return 0
+
+
+def cmd_rollup_append(args) -> int:
+    from .rollups import RollupStore
+    store = RollupStore(args.store)
+    for file_path in args.files:
+        added = store.append(file_path)
+        print(f"{file_path}: {'appended' if added else 'already in the store'}")
+    return 0
+
+
+def cmd_rollup_query(args) -> int:
+    from .graph_analytics import top_routes
+    from .rollups import RollupStore
+    names = read_zone_names(args.lookup)
+    rollup = RollupStore(args.store).load().window(args.start, args.end).where(args.pickup, args.dropoff)
+    result = {
+        "trips": rollup.total_trips(),
+        "stats": rollup.stats(),
+        "top_routes": [[names.get(pickup, str(pickup)), names.get(dropoff, str(dropoff)), trips]
+                       for pickup, dropoff, trips in top_routes(rollup.od_matrix(), args.top)],
+    }
+    if args.by is not None:
+        result["trips_by_" + args.by] = rollup.count_trips_by(load_catalog(args.lookup), args.by)
+    if args.per_hour:
+        hours, trips = rollup.per_hour()
+        result["per_hour"] = {str(hour): int(count) for hour, count in zip(hours, trips)}
+    _print_json(result)
+    return 0
+
+
+def cmd_pipeline(args) -> int:
+    from .graph_analytics import top_routes
+    from .pipeline import aggregate_files
+    names = read_zone_names(args.lookup)
+    #One line per file on stderr as soon as it is aggregated, the results on stdout
+    result = aggregate_files(args.files, workers=args.workers, files_in_flight=args.files_in_flight,
+                             queue_blocks=args.queue_blocks, block_bytes=int(args.block_mb * 1024 * 1024),
+                             on_done=lambda report: print(report, file=sys.stderr), processes=args.processes)
+    aggregates = result.aggregates
+    _, minimum, _, maximum, _, average = aggregates.stats.speed_summary()
+    _print_json({
+        "files": len(args.files),
+        "rows": aggregates.rows,
+        "seconds": result.seconds,
+        "rows_per_s": result.rows_per_s,
+        "stats": aggregates.stats.stats(),
+        "speed": {"min": minimum, "max": maximum, "avg": average},
+        "zones": aggregates.count_trips({zone_id: names.get(zone_id, str(zone_id)) for zone_id in args.ids}),
+        "top_routes": [[names.get(pickup, str(pickup)), names.get(dropoff, str(dropoff)), trips]
+                       for pickup, dropoff, trips in top_routes(aggregates.od_matrix, args.top)],
+    })
+    return 0
+
+
+def cmd_convert(args) -> int:
+    from .trip_columnar import write_arrow, write_partitioned
+    from .trip_loader import load_trips
+    if args.format == "feather":
+        write_arrow(load_trips(args.file), args.target)
+        print(args.target)
+    else:
+        for path in write_partitioned(args.file, args.target, args.row_group_rows, args.compression):
+            print(path)
+    return 0
+
+
+def cmd_generate(args) -> int:
+    from .synthetic import generate_trips
+    print(generate_trips(args.target, args.rows, args.seed, args.samples, args.start, args.end, args.duration_spread))
+    return 0
+
+
+def _add_plot_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--output", help="save the figure to this file (headless) instead of showing it")
+    group.add_argument("--no-plot", action="store_true", help="only print the results, matplotlib is not loaded")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="nyctaxi", description="Analyses of the NYC taxi trip files")
+    parser.add_argument("--trace", help="write the time, rows and rows/sec of every stage to this JSON file")
+    parser.add_argument("--trace-memory", action="store_true", help="also trace the peak memory of every stage")
+    parser.add_argument("--profile", help="write the cProfile statistics of the command to this file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stats = commands.add_parser("stats", help="min, max and average of the trip fields")
+    speed = commands.add_parser("speed", help="min, max and average speed of the trips in km/h")
+    for command in (stats, speed):
+        command.add_argument("file")
+        mode = command.add_mutually_exclusive_group()
+        mode.add_argument("--workers", type=int, help="split the file across this many processes")
+        mode.add_argument("--clean", action="store_true", help="leave out the trips failing the validation rules")
+        command.add_argument("--rules", help="JSON spec of the validation rules used by --clean (implied), "
+                                             "the defaults otherwise")
+        command.add_argument("--lookup", default=DEFAULT_LOOKUP, help="zone lookup of the known_zone rules of --rules")
+    speed.add_argument("--min-duration", type=float, default=0.0, help="reject trips lasting this many seconds or less")
+    speed.add_argument("--max-duration", type=float, help="reject trips lasting more than this many seconds")
+    speed.add_argument("--min-distance", type=float, help="reject trips shorter than this many miles")
+    speed.add_argument("--max-speed", type=float, help="reject trips faster than this many km/h")
+    stats.set_defaults(handler=cmd_stats)
+    speed.set_defaults(handler=cmd_speed)
+
+    validate = commands.add_parser("validate", help="number of trips rejected by every data-quality rule")
+    validate.add_argument("file")
+    validate.add_argument("--rules", help="JSON spec of the rules (see validation.py), the default rules otherwise")
+    validate.add_argument("--lookup", default=DEFAULT_LOOKUP, help="zone lookup of the known_zone rules")
+    validate.set_defaults(handler=cmd_validate)
+
+    analyse = commands.add_parser("analyse", help="stats, speed, zone counts and busiest routes from one scan of the file")
+    analyse.add_argument("file")
+    analyse.add_argument("--only", nargs="+", choices=ANALYSES, help="the analyses to run, all of them otherwise")
+    analyse.add_argument("--lookup", default=DEFAULT_LOOKUP)
+    analyse.add_argument("--ids", nargs="+", type=int, default=DEFAULT_ZONE_IDS, help="pickup zones counted by 'zones'")
+    analyse.add_argument("--top", type=int, default=10, help="number of busiest routes")
+    analyse.add_argument("--explain", action="store_true", help="print the columns scanned and the shared intermediates")
+    analyse.set_defaults(handler=cmd_analyse)
+
+    zones = commands.add_parser("zones", help="number of trips leaving the given pickup zones")
+    zones.add_argument("file")
+    zones.add_argument("--lookup", default=DEFAULT_LOOKUP)
+    zones.add_argument("--ids", nargs="+", type=int, default=DEFAULT_ZONE_IDS)
+    zones.add_argument("--by", choices=GROUP_BY, help="count the trips of every borough or service zone instead")
+    zones.set_defaults(handler=cmd_zones)
+
+    from .sort_bench import SORT_COLUMNS
+    from .sorting import sorting_algorithms
+    sort_bench = commands.add_parser("sort-bench", help="benchmark the sorting algorithms on the trip columns")
+    sort_bench.add_argument("file")
+    sort_bench.add_argument("--columns", nargs="+", default=list(SORT_COLUMNS))
+    sort_bench.add_argument("--sizes", nargs="+", type=int, default=[100, 1000])
+    sort_bench.add_argument("--algorithms", nargs="+", default=["quick", "bubble"],
+                            choices=list(sorting_algorithms))
+    sort_bench.add_argument("--warmup", type=int, default=1)
+    sort_bench.add_argument("--repeats", type=int, default=3)
+    sort_bench.add_argument("--seed", type=int, default=0)
+    sort_bench.add_argument("--csv", help="write the results to this csv file")
+    sort_bench.add_argument("--json", help="write the results to this json file")
+    _add_plot_arguments(sort_bench)
+    sort_bench.set_defaults(handler=cmd_sort_bench)
+
+    od_graph = commands.add_parser("od-graph", help="components, busiest routes and PageRank of the zone graph")
+    od_graph.add_argument("file")
+    od_graph.add_argument("--lookup", default=DEFAULT_LOOKUP)
+    od_graph.add_argument("--top", type=int, default=10, help="number of routes and zones listed")
+    od_graph.add_argument("--workers", type=int, help="split the file across this many processes")
+    _add_plot_arguments(od_graph)
+    od_graph.set_defaults(handler=cmd_od_graph)
+
+    rollup_append = commands.add_parser("rollup-append", help="add the hourly rollups of trip files to a store")
+    rollup_append.add_argument("store", help="directory of the rollups, created if needed")
+    rollup_append.add_argument("files", nargs="+")
+    rollup_append.set_defaults(handler=cmd_rollup_append)
+
+    rollup_query = commands.add_parser("rollup-query", help="trips, stats and busiest routes of a time window")
+    rollup_query.add_argument("store")
+    rollup_query.add_argument("--start", help="first pickup hour included, e.g. 2022-07-01 or 2022-07-01T08")
+    rollup_query.add_argument("--end", help="first pickup hour left out")
+    rollup_query.add_argument("--pickup", nargs="+", type=int, help="only trips leaving these LocationIDs")
+    rollup_query.add_argument("--dropoff", nargs="+", type=int, help="only trips arriving at these LocationIDs")
+    rollup_query.add_argument("--lookup", default=DEFAULT_LOOKUP)
+    rollup_query.add_argument("--top", type=int, default=10, help="number of routes listed")
+    rollup_query.add_argument("--by", choices=GROUP_BY, help="also count the trips leaving every borough or service zone")
+    rollup_query.add_argument("--per-hour", action="store_true", help="also list the number of trips of every hour")
+    rollup_query.set_defaults(handler=cmd_rollup_query)
+
+    from .pipeline import DEFAULT_FILES_IN_FLIGHT, DEFAULT_QUEUE_BLOCKS
+    pipeline = commands.add_parser("pipeline", help="stats, zone counts and busiest routes of many files, "
+                                                    "plain or compressed (.gz .bz2 .xz .zst)")
+    pipeline.add_argument("files", nargs="+")
+    pipeline.add_argument("--files-in-flight", type=int, default=DEFAULT_FILES_IN_FLIGHT,
+                          help="files read and parsed at the same time")
+    pipeline.add_argument("--queue-blocks", type=int, default=DEFAULT_QUEUE_BLOCKS,
+                          help="blocks a reader may read ahead of its parser")
+    pipeline.add_argument("--block-mb", type=float, default=8.0, help="size of a block of decompressed csv")
+    pipeline.add_argument("--workers", type=int, help="threads of the pool")
+    pipeline.add_argument("--processes", type=int,
+                          help="aggregate every file whole in one of N worker processes instead of the threads")
+    pipeline.add_argument("--lookup", default=DEFAULT_LOOKUP)
+    pipeline.add_argument("--ids", nargs="+", type=int, default=DEFAULT_ZONE_IDS)
+    pipeline.add_argument("--top", type=int, default=10, help="number of routes listed")
+    pipeline.set_defaults(handler=cmd_pipeline)
+
+    from .trip_columnar import DEFAULT_ROW_GROUP_ROWS
+    convert = commands.add_parser("convert", help="write a trip file as Parquet partitioned by pickup month, or Feather")
+    convert.add_argument("file")
+    convert.add_argument("target", help="directory of the Parquet dataset, or the .feather file")
+    convert.add_argument("--format", choices=["parquet", "feather"], default="parquet")
+    convert.add_argument("--row-group-rows", type=int, default=DEFAULT_ROW_GROUP_ROWS)
+    convert.add_argument("--compression", default="zstd", help="Parquet codec (zstd, snappy, gzip, none)")
+    convert.set_defaults(handler=cmd_convert)
+
+    from .synthetic import DEFAULT_DURATION_SPREAD, DEFAULT_SAMPLES
+    generate = commands.add_parser("generate", help="write a synthetic trip file drawn from the sample files")
+    generate.add_argument("target")
+    generate.add_argument("--rows", type=int, required=True)
+    generate.add_argument("--seed", type=int, default=0, help="the same seed gives the same file")
+    generate.add_argument("--samples", nargs="+", default=list(DEFAULT_SAMPLES), help="trip files the trips are drawn from")
+    generate.add_argument("--start", help="first day of the pickups, e.g. 2022-01-01 (first day of the samples)")
+    generate.add_argument("--end", help="day after the last pickup (day after the last day of the samples)")
+    generate.add_argument("--duration-spread", type=float, default=DEFAULT_DURATION_SPREAD,
+                          help="sigma of the log-normal factor applied to the durations, 0 to keep them")
+    generate.set_defaults(handler=cmd_generate)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.trace_memory and not args.trace:
+        parser.error("--trace-memory needs --trace")
+    if args.command in ("stats", "speed") and args.rules:
+        #The rules are only applied when cleaning, which the sharded --workers path does not do
+        if args.workers is not None:
+            parser.error("--rules cannot be used with --workers")
+        args.clean = True
+    if args.trace:
+        profiling.enable(memory=args.trace_memory)
+    with profiling.profile(args.profile), profiling.stage(args.command):
+        status = args.handler(args)
+    if args.trace:
+        profiling.write_trace(args.trace)
+        print(profiling.format_summary(), file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#File helpers shared by the on-disk stores (trip_cache, rollups)
+#Content digests, JSON files replaced atomically and an exclusive lock for the
+#read-modify-write of a file that several processes update
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+
+def file_digest(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    Returns the blake2b hash of the content of a file, or of the names and contents
+    of the files of a directory (e.g. a partitioned Parquet dataset).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if os.path.isdir(file_path):
+        for root, dirs, files in os.walk(file_path):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, file_path).encode())
+                digest.update(file_digest(path, block_size).encode())
+        return digest.hexdigest()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_json(path: str) -> dict:
+    """
+    Returns the content of a JSON file, {} if it is missing or unreadable.
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_json(path: str, content: dict) -> None:
+    """
+    Writes a JSON file through a temporary file, so a crash never leaves half a file behind.
+    """
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(content, f, indent=1)
+    os.replace(temporary, path)
+
+
+def _lock(f, hold: bool) -> None:
+    try:
+        import fcntl
+    except ImportError:
+        #Windows: the first byte of the file is locked instead
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if hold else msvcrt.LK_UNLCK, 1)
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX if hold else fcntl.LOCK_UN)
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on the file 'path' (created if missing) while the block runs;
+    other processes and threads locking the same path wait for it.
+    """
+    with open(path, "a+b") as f:
+        _lock(f, True)
+        try:
+            yield
+        finally:
+            _lock(f, False)
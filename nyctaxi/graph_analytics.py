@@ -0,0 +1,258 @@
+#Graph analytics on the zone graph, straight from the origin-destination matrix
+#The graph is kept as CSR arrays (indptr, indices, weights) indexed by LocationID,
+#so no networkx objects are created; networkx is only used by cross_check()
+import json
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .profiling import traced
+
+
+class CSRGraph:
+    """
+    Weighted graph over the LocationIDs stored as compressed sparse rows.
+
+    :indptr: The neighbours of node i are indices[indptr[i]:indptr[i + 1]]
+    :indices: The neighbour of every edge
+    :weights: The weight of every edge (number of trips)
+    :active: True for the nodes that have at least one trip
+    :directed: Whether the edges go pickup -> dropoff only
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray,
+                 active: np.ndarray, directed: bool):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.active = active
+        self.directed = directed
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    def sources(self) -> np.ndarray:
+        #Source node of every edge
+        return np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+
+    def nodes(self) -> np.ndarray:
+        #LocationIDs of the nodes with trips
+        return np.flatnonzero(self.active)
+
+
+def from_od_matrix(matrix: np.ndarray, directed: bool = False) -> CSRGraph:
+    """
+    This function builds the CSR graph of an origin-destination matrix.
+
+    Parameters:
+    :matrix: A ZONE_SLOTS x ZONE_SLOTS od_matrix of trip counts
+    :directed: Keep pickup -> dropoff edges apart; otherwise the two directions are
+        added together into one undirected edge (a trip within a zone counts once)
+
+    @return: A CSRGraph
+    """
+    matrix = np.asarray(matrix)
+    if not directed:
+        matrix = matrix + matrix.T
+        np.fill_diagonal(matrix, np.diagonal(matrix) // 2 if matrix.dtype.kind in "iu" else np.diagonal(matrix) / 2)
+    rows, columns = np.nonzero(matrix)
+    indptr = np.zeros(matrix.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=matrix.shape[0]), out=indptr[1:])
+    active = np.zeros(matrix.shape[0], dtype=bool)
+    active[rows] = True
+    active[columns] = True
+    return CSRGraph(indptr, columns, matrix[rows, columns], active, directed)
+
+
+@traced()
+def connected_components(graph: CSRGraph) -> List[np.ndarray]:
+    """
+    Finds the (weakly) connected components with a union-find over the edge arrays.
+
+    @return: One array of LocationIDs per component, largest first
+    """
+    parent = np.arange(graph.num_nodes)
+
+    def find(node: int) -> int:
+        while parent[node] != node:
+            #Path halving keeps the trees flat
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for source, target in zip(graph.sources().tolist(), graph.indices.tolist()):
+        root_source, root_target = find(source), find(target)
+        if root_source != root_target:
+            parent[max(root_source, root_target)] = min(root_source, root_target)
+
+    nodes = graph.nodes()
+    roots = np.array([find(node) for node in nodes.tolist()], dtype=np.int64)
+    labels, inverse = np.unique(roots, return_inverse=True)
+    components = [nodes[inverse == i] for i in range(len(labels))]
+    return sorted(components, key=len, reverse=True)
+
+
+def strength(graph: CSRGraph) -> np.ndarray:
+    """
+    Weighted degree of every node: the trips of its edges (outgoing ones if directed).
+    """
+    return np.bincount(graph.sources(), weights=graph.weights, minlength=graph.num_nodes)
+
+
+def degree(graph: CSRGraph) -> np.ndarray:
+    """
+    Number of neighbours of every node (outgoing ones if directed).
+    """
+    return np.diff(graph.indptr)
+
+
+@traced()
+def pagerank(graph: CSRGraph, alpha: float = 0.85, tol: float = 1e-6, max_iter: int = 100) -> np.ndarray:
+    """
+    This function computes the weighted PageRank of the nodes by power iteration
+    over the CSR arrays (same definition and defaults as networkx.pagerank).
+
+    Parameters:
+    :graph: A CSRGraph, usually directed
+    :alpha: The damping factor
+    :tol: Convergence threshold, on the sum of the changes scaled by the number of nodes
+    :max_iter: The maximum number of iterations
+
+    @return: The PageRank of every LocationID, 0 for the nodes without trips
+    """
+    nodes = graph.nodes()
+    n = len(nodes)
+    rank = np.zeros(graph.num_nodes)
+    if n == 0:
+        return rank
+    out_weight = strength(graph)
+    sources = graph.sources()
+    #Share of the rank of its source that every edge passes on
+    share = graph.weights / np.where(out_weight[sources] > 0, out_weight[sources], 1)
+    dangling = graph.active & (out_weight == 0)
+    rank[nodes] = 1.0 / n
+    for _ in range(max_iter):
+        previous = rank
+        rank = alpha * np.bincount(graph.indices, weights=previous[sources] * share, minlength=graph.num_nodes)
+        rank += (alpha * previous[dangling].sum() + 1 - alpha) / n
+        rank[~graph.active] = 0.0
+        if np.abs(rank - previous).sum() < n * tol:
+            return rank
+    raise RuntimeError(f"pagerank did not converge in {max_iter} iterations")
+
+
+def top_routes(matrix: np.ndarray, k: int = 10, directed: bool = True) -> List[Tuple[int, int, float]]:
+    """
+    Returns the k busiest (pickup, dropoff, trips) pairs of a matrix, found by
+    selection rather than by sorting every pair. With directed=False the two
+    directions of a pair are added together and reported as (smaller ID, larger ID).
+    """
+    matrix = np.asarray(matrix)
+    if not directed:
+        matrix = np.triu(matrix + matrix.T) - np.diag(np.diagonal(matrix))
+    flat = matrix.ravel()
+    k = min(k, int(np.count_nonzero(flat)))
+    if k == 0:
+        return []
+    best = np.argpartition(flat, -k)[-k:]
+    best = best[np.argsort(flat[best], kind="stable")[::-1]]
+    pickups, dropoffs = np.divmod(best, matrix.shape[1])
+    return [(int(p), int(d), flat[i].item()) for p, d, i in zip(pickups, dropoffs, best)]
+
+
+@traced()
+def force_layout(graph: CSRGraph, iterations: int = 100, seed: int = 0) -> Dict[int, Tuple[float, float]]:
+    """
+    This function places the nodes with a Fruchterman-Reingold force-directed layout,
+    every iteration being a handful of array operations over all the nodes at once.
+
+    Parameters:
+    :graph: A CSRGraph
+    :iterations: The number of steps of the simulation
+    :seed: Seed of the initial positions
+
+    @return: A dict mapping every LocationID with trips to its (x, y) position in [-1, 1]
+    """
+    nodes = graph.nodes()
+    n = len(nodes)
+    if n == 0:
+        return {}
+    slot = np.full(graph.num_nodes, -1)
+    slot[nodes] = np.arange(n)
+    sources, targets = slot[graph.sources()], slot[graph.indices]
+    keep = sources != targets
+    sources, targets = sources[keep], targets[keep]
+    #Heavier edges pull harder, on a log scale so the busiest routes do not dominate
+    pull = np.log1p(graph.weights[keep].astype(np.float64))
+    pull /= pull.max() if len(pull) else 1.0
+
+    position = np.random.default_rng(seed).uniform(-1, 1, size=(n, 2))
+    spacing = np.sqrt(4.0 / n)
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        delta = position[:, None, :] - position[None, :, :]
+        distance = np.maximum(np.sqrt((delta ** 2).sum(axis=-1)), 0.01)
+        #Every pair of nodes repels...
+        displacement = (delta * (spacing ** 2 / distance ** 2)[:, :, None]).sum(axis=1)
+        #...and the nodes of every edge attract
+        edge_delta = position[sources] - position[targets]
+        edge_distance = np.maximum(np.sqrt((edge_delta ** 2).sum(axis=1)), 0.01)
+        attraction = edge_delta * (edge_distance * pull / spacing)[:, None]
+        np.subtract.at(displacement, sources, attraction)
+        np.add.at(displacement, targets, attraction)
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 0.01)
+        position += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+    position -= position.mean(axis=0)
+    position /= np.abs(position).max() or 1.0
+    return {int(node): (float(x), float(y)) for node, (x, y) in zip(nodes, position)}
+
+
+def save_layout(layout: Dict[int, Tuple[float, float]], path: str) -> None:
+    """
+    Saves a layout so that later runs can reuse the same coordinates (see load_layout).
+    """
+    with open(path, "w") as f:
+        json.dump({str(node): list(xy) for node, xy in layout.items()}, f)
+
+
+def load_layout(path: str) -> Dict[int, Tuple[float, float]]:
+    """
+    Loads precomputed coordinates saved by save_layout.
+    """
+    with open(path, "r") as f:
+        return {int(node): tuple(xy) for node, xy in json.load(f).items()}
+
+
+def cross_check(matrix: np.ndarray) -> Dict[str, float]:
+    """
+    This function compares the CSR results with networkx on the same matrix.
+
+    @return: A dict with the number of components found by each side and the largest
+        absolute difference of the strengths and of the PageRanks
+    """
+    import networkx as nx
+
+    undirected = from_od_matrix(matrix)
+    directed = from_od_matrix(matrix, directed=True)
+    reference = nx.Graph()
+    reference.add_nodes_from(undirected.nodes().tolist())
+    reference.add_weighted_edges_from(zip(undirected.sources().tolist(), undirected.indices.tolist(),
+                                          undirected.weights.tolist()))
+    reference_directed = nx.DiGraph()
+    reference_directed.add_nodes_from(directed.nodes().tolist())
+    reference_directed.add_weighted_edges_from(zip(directed.sources().tolist(), directed.indices.tolist(),
+                                                   directed.weights.tolist()))
+
+    ours_strength = strength(directed)
+    theirs_strength = dict(reference_directed.out_degree(weight="weight"))
+    ours_rank = pagerank(directed)
+    theirs_rank = nx.pagerank(reference_directed, weight="weight")
+    return {
+        "components": len(connected_components(undirected)),
+        "networkx_components": nx.number_connected_components(reference),
+        "strength_max_diff": max((abs(ours_strength[n] - w) for n, w in theirs_strength.items()), default=0.0),
+        "pagerank_max_diff": max((abs(ours_rank[n] - r) for n, r in theirs_rank.items()), default=0.0),
+    }
@@ -0,0 +1,147 @@
+#Origin-destination (pickup -> dropoff) matrices of the trips
+#Trips are accumulated into a dense ZONE_SLOTS x ZONE_SLOTS array indexed by
+#LocationID with one bincount; zone names are only attached when the result is output
+from typing import Dict, Optional
+
+import numpy as np
+
+from .profiling import input_rows, traced
+from .trip_loader import TripTable
+
+#LocationIDs go from 1 to 265, slot 0 is left unused
+ZONE_SLOTS = 266
+
+OD_COLUMNS = ("PULocationID", "DOLocationID")
+
+#Weights that can be summed per pair besides the trip count, with the columns they need
+OD_WEIGHTS = {
+    "fare_amount": ("fare_amount",),
+    "trip_distance": ("trip_distance",),
+    "duration_s": ("tpep_pickup_datetime", "tpep_dropoff_datetime"),
+}
+
+
+def od_cells(data: TripTable) -> tuple:
+    """
+    Returns the flat matrix cell (pickup * ZONE_SLOTS + dropoff) of every trip whose
+    two LocationIDs are known and within range, with the mask of those trips.
+    """
+    pickup = data['PULocationID'].astype(np.int64)
+    dropoff = data['DOLocationID'].astype(np.int64)
+    known = ~(data.nulls['PULocationID'] | data.nulls['DOLocationID'])
+    known &= (pickup >= 0) & (pickup < ZONE_SLOTS) & (dropoff >= 0) & (dropoff < ZONE_SLOTS)
+    return pickup[known] * ZONE_SLOTS + dropoff[known], known
+
+
+def _weight_values(data: TripTable, weight: str) -> tuple:
+    #Values of a weight and the mask of the trips where it is missing
+    if weight == "duration_s":
+        pickup, dropoff = "tpep_pickup_datetime", "tpep_dropoff_datetime"
+        values = (data[dropoff] - data[pickup]) / 1e6
+        return values, data.nulls[pickup] | data.nulls[dropoff]
+    return data[weight], data.nulls[weight]
+
+
+@traced(rows=input_rows)
+def od_matrix(data: TripTable, weight: Optional[str] = None, cells: Optional[tuple] = None) -> np.ndarray:
+    """
+    This function accumulates the trips into a dense origin-destination matrix.
+
+    Parameters:
+    :data: A TripTable holding at least PULocationID and DOLocationID (and the
+        columns of the weight, see OD_WEIGHTS)
+    :weight: None to count the trips, or 'fare_amount', 'trip_distance' or
+        'duration_s' to sum that value per pair (trips missing it add nothing)
+    :cells: The result of od_cells(data) when already computed
+
+    @return: A ZONE_SLOTS x ZONE_SLOTS array, int64 counts or float64 sums,
+        indexed by [PULocationID, DOLocationID]
+    """
+    cells, known = cells if cells is not None else od_cells(data)
+    if weight is None:
+        counts = np.bincount(cells, minlength=ZONE_SLOTS * ZONE_SLOTS)
+        return counts.reshape(ZONE_SLOTS, ZONE_SLOTS)
+    if weight not in OD_WEIGHTS:
+        raise ValueError(f"unknown weight {weight!r}, expected one of {list(OD_WEIGHTS)}")
+    values, missing = _weight_values(data, weight)
+    values = np.where(missing, 0.0, values)[known]
+    sums = np.bincount(cells, weights=values, minlength=ZONE_SLOTS * ZONE_SLOTS)
+    return sums.reshape(ZONE_SLOTS, ZONE_SLOTS)
+
+
+def od_columns(weight: Optional[str] = None) -> tuple:
+    """
+    Returns the trip columns od_matrix needs for a weight.
+    """
+    return OD_COLUMNS + (OD_WEIGHTS[weight] if weight is not None else ())
+
+
+def _names_by_id(zone_names: Dict) -> Dict[int, str]:
+    #Accepts names keyed by int LocationID or by its string (as load_zone_names returns them)
+    return {int(zone_id): name for zone_id, name in zone_names.items()}
+
+
+def to_nested_dict(matrix: np.ndarray, zone_names: Dict) -> Dict[str, Dict[str, float]]:
+    """
+    This function attaches the zone names to a matrix.
+
+    Parameters:
+    :matrix: An od_matrix
+    :zone_names: A dict mapping a LocationID (int or str) to the zone name
+
+    @return: A nested dict {pickup zone: {dropoff zone: value}} with the non-zero pairs
+        whose zones both have a name, the same structure preparation_data returns.
+        Zones sharing a name are added together
+    """
+    names = _names_by_id(zone_names)
+    nested = {}
+    pickups, dropoffs = np.nonzero(matrix)
+    for pickup_id, dropoff_id, value in zip(pickups.tolist(), dropoffs.tolist(), matrix[pickups, dropoffs].tolist()):
+        pickup_loc = names.get(pickup_id)
+        dropoff_loc = names.get(dropoff_id)
+        if pickup_loc is not None and dropoff_loc is not None:
+            row = nested.setdefault(pickup_loc, {})
+            row[dropoff_loc] = row.get(dropoff_loc, 0) + value
+    return nested
+
+
+def to_sparse(matrix: np.ndarray):
+    """
+    Converts a matrix into a scipy.sparse CSR array. The data, index and pointer arrays
+    are computed with numpy and handed to scipy without a further copy.
+    """
+    from scipy import sparse
+
+    rows, columns = np.nonzero(matrix)
+    indptr = np.zeros(matrix.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=matrix.shape[0]), out=indptr[1:])
+    return sparse.csr_array((matrix[rows, columns], columns, indptr), shape=matrix.shape, copy=False)
+
+
+def to_networkx(matrix: np.ndarray, zone_names: Optional[Dict] = None, directed: bool = False):
+    """
+    Builds a networkx graph from a matrix, the values becoming the 'weight' of the edges.
+
+    Parameters:
+    :matrix: An od_matrix
+    :zone_names: Optional dict mapping a LocationID to the zone name, used as node labels
+        (zones without a name are dropped). Without it the nodes are the LocationIDs
+    :directed: A DiGraph keeps the two directions apart; a Graph (default) keeps, as
+        task3 always did, the value of the last pair added for the two directions
+
+    @return: A networkx Graph or DiGraph with the zones that have trips
+    """
+    import networkx as nx
+
+    graph_type = nx.DiGraph if directed else nx.Graph
+    if zone_names is not None:
+        graph = graph_type()
+        for pickup_loc, dropoffs in to_nested_dict(matrix, zone_names).items():
+            graph.add_node(pickup_loc)
+            for dropoff_loc, value in dropoffs.items():
+                graph.add_edge(pickup_loc, dropoff_loc, weight=value)
+        return graph
+    graph = nx.from_scipy_sparse_array(to_sparse(matrix), create_using=graph_type)
+    #Zones without any trip are left out
+    graph.remove_nodes_from([node for node in list(graph.nodes) if graph.degree(node) == 0])
+    return graph
@@ -0,0 +1,338 @@
+#Pipelined aggregation of many trip files, plain or compressed (.gz, .bz2, .xz, .zst)
+#An asyncio loop drives two steps per file on a bounded thread pool: a reader that
+#reads and decompresses blocks of complete lines, and a parser that decodes each
+#block (see trip_scanner.scan_block) and folds it into the TripAggregates of the
+#file. The blocks go through a bounded queue, so a reader running ahead waits for
+#its parser (back-pressure), and 'files_in_flight' files are open at once, so the
+#next file is read and decompressed while the current one is parsed.
+#The threads only overlap where zlib, bz2, lzma, zstandard and numpy release the GIL.
+#With 'processes' set, the CPU-bound work moves to a process pool instead: a compressed
+#stream can only be decompressed from its start, so every file is read, decompressed and
+#parsed whole by one worker process, and the loop only schedules the files and collects
+#their aggregates.
+#The aggregates of every file are merged in the order the files are given, so the
+#result does not depend on the timing of the threads or processes.
+#On a single core neither mode is faster than aggregate_files_sequential (see
+#benchmarks/bench_pipeline.py); the processes need one core per file in flight
+import asyncio
+import bz2
+import csv
+import gzip
+import io
+import lzma
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import BinaryIO, Callable, List, Optional, Sequence
+
+from .profiling import add_records, run_traced, stage, traced, worker_settings
+from .trip_parallel import AGGREGATE_COLUMNS, TripAggregates
+from .trip_scanner import DEFAULT_SCAN_BYTES, scan_block
+
+#Blocks waiting to be parsed, per file
+DEFAULT_QUEUE_BLOCKS = 4
+
+#Files read at the same time
+DEFAULT_FILES_IN_FLIGHT = 2
+
+def open_trip_stream(file_path: str) -> BinaryIO:
+    """
+    Opens a trip file for reading bytes, decompressing it on the fly according to its suffix.
+    """
+    lower = file_path.lower()
+    if lower.endswith(".gz"):
+        return gzip.open(file_path, "rb")
+    if lower.endswith(".bz2"):
+        return bz2.open(file_path, "rb")
+    if lower.endswith(".xz"):
+        return lzma.open(file_path, "rb")
+    if lower.endswith((".zst", ".zstd")):
+        try:
+            import zstandard
+        except ImportError as error:
+            raise ImportError("reading .zst trip files needs zstandard (pip install zstandard)") from error
+        #The zstd reader has no readline, the buffered reader adds it
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(file_path, "rb"), closefd=True))
+    return open(file_path, "rb")
+
+
+class FileReport:
+    """
+    Progress of one file of the pipeline.
+
+    :path: The file
+    :bytes_read: Bytes read from the disk (compressed size)
+    :bytes_decoded: Bytes of csv handed to the parser (decompressed size)
+    :blocks: Blocks parsed so far
+    :rows: Trips aggregated so far
+    :seconds: Time since the file was opened (until it was done)
+    :done: True once the whole file is aggregated
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.bytes_read = 0
+        self.bytes_decoded = 0
+        self.blocks = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.done = False
+        self._start = time.perf_counter()
+
+    def _tick(self) -> None:
+        self.seconds = time.perf_counter() - self._start
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def mb_per_s(self) -> float:
+        #Decompressed megabytes parsed per second
+        return self.bytes_decoded / 1e6 / self.seconds if self.seconds > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return {"path": self.path, "bytes_read": self.bytes_read, "bytes_decoded": self.bytes_decoded,
+                "blocks": self.blocks, "rows": self.rows, "seconds": self.seconds,
+                "rows_per_s": self.rows_per_s, "mb_per_s": self.mb_per_s, "done": self.done}
+
+    def __str__(self) -> str:
+        return (f"{os.path.basename(self.path)}: {self.rows} rows, {self.bytes_read / 1e6:.1f} MB read, "
+                f"{self.bytes_decoded / 1e6:.1f} MB parsed in {self.seconds:.2f} s "
+                f"({self.rows_per_s:,.0f} rows/s, {self.mb_per_s:.1f} MB/s)")
+
+
+class PipelineResult:
+    """
+    Output of the pipeline.
+
+    :aggregates: The TripAggregates of all the files, merged in the order they were given
+    :per_file: The TripAggregates of every file
+    :files: The FileReport of every file
+    :seconds: Wall time of the whole run
+    """
+
+    def __init__(self, aggregates: TripAggregates, per_file: List[TripAggregates], files: List[FileReport],
+                 seconds: float):
+        self.aggregates = aggregates
+        self.per_file = per_file
+        self.files = files
+        self.seconds = seconds
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.aggregates.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def _split_lines(stream: BinaryIO, block_bytes: int, carry: bytes) -> tuple:
+    #Reads about block_bytes from the stream; returns (complete lines, rest of the last line, end reached)
+    data = stream.read(block_bytes)
+    if not data:
+        return carry, b"", True
+    data = carry + data
+    cut = data.rfind(b"\n") + 1
+    return data[:cut], data[cut:], False
+
+
+def _raw_size(stream: BinaryIO, file_path: str) -> int:
+    #Bytes of the file consumed so far, for the compressed streams that can tell
+    source = getattr(stream, "fileobj", None) or getattr(stream, "_fp", None)
+    try:
+        return source.tell() if source is not None else os.path.getsize(file_path)
+    except (OSError, ValueError, AttributeError):
+        return os.path.getsize(file_path)
+
+
+async def _read_file(file_path: str, queue: asyncio.Queue, pool: ThreadPoolExecutor, block_bytes: int,
+                     report: FileReport) -> None:
+    #Producer: the header, then blocks of complete lines, then None
+    loop = asyncio.get_running_loop()
+    stream = None
+    try:
+        stream = await loop.run_in_executor(pool, open_trip_stream, file_path)
+        header = await loop.run_in_executor(pool, stream.readline)
+        await queue.put(_parse_header(header))
+        carry, finished = b"", False
+        while not finished:
+            block, carry, finished = await loop.run_in_executor(pool, _split_lines, stream, block_bytes, carry)
+            report.bytes_read = _raw_size(stream, file_path)
+            if block:
+                report.bytes_decoded += len(block)
+                #Waits here while the parser is 'queue_blocks' blocks behind
+                await queue.put(block)
+        report.bytes_read = os.path.getsize(file_path)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        #Wakes the parser up, the error is raised again where the reader is awaited
+        await queue.put(None)
+        raise
+    else:
+        await queue.put(None)
+    finally:
+        if stream is not None:
+            stream.close()
+
+
+def _parse_header(line: bytes) -> List[str]:
+    return next(csv.reader([line.decode()]), [])
+
+
+def _fold(result: TripAggregates, block: bytes, header: List[str]) -> int:
+    table = scan_block(block, header, AGGREGATE_COLUMNS)
+    result.update(table)
+    return len(table)
+
+
+async def _parse_file(queue: asyncio.Queue, pool: ThreadPoolExecutor, result: TripAggregates,
+                      report: FileReport, on_progress: Optional[Callable[[FileReport], None]]) -> None:
+    #Consumer: folds the blocks of one file in order into its TripAggregates
+    loop = asyncio.get_running_loop()
+    header = await queue.get()
+    if header is None:
+        return
+    while (block := await queue.get()) is not None:
+        report.rows += await loop.run_in_executor(pool, _fold, result, block, header)
+        report.blocks += 1
+        report._tick()
+        if on_progress is not None:
+            on_progress(report)
+
+
+async def _run_file(file_path: str, pool: ThreadPoolExecutor, slots: asyncio.Semaphore, queue_blocks: int,
+                    block_bytes: int, on_progress, on_done) -> tuple:
+    async with slots:
+        with stage("pipeline.file") as current:
+            report = FileReport(file_path)
+            result = TripAggregates()
+            queue = asyncio.Queue(maxsize=queue_blocks)
+            reader = asyncio.ensure_future(_read_file(file_path, queue, pool, block_bytes, report))
+            try:
+                await _parse_file(queue, pool, result, report, on_progress)
+            except BaseException:
+                reader.cancel()
+                raise
+            await reader
+            report._tick()
+            report.done = True
+            current.add_rows(report.rows)
+    if on_done is not None:
+        on_done(report)
+    return result, report
+
+
+async def _run_file_in_process(file_path: str, pool: ProcessPoolExecutor, block_bytes: int, on_progress,
+                               on_done) -> tuple:
+    loop = asyncio.get_running_loop()
+    with stage("pipeline.file") as current:
+        (result, report), stages = await loop.run_in_executor(pool, run_traced, worker_settings(), _aggregate_file,
+                                                              file_path, block_bytes)
+        #The stages of the worker continue this one in the trace
+        add_records(stages)
+        current.add_rows(report.rows)
+    #The blocks are parsed in the worker, the progress is only known once the file is done
+    if on_progress is not None:
+        on_progress(report)
+    if on_done is not None:
+        on_done(report)
+    return result, report
+
+
+async def aggregate_files_async(paths: Sequence[str], workers: Optional[int] = None,
+                                files_in_flight: int = DEFAULT_FILES_IN_FLIGHT,
+                                queue_blocks: int = DEFAULT_QUEUE_BLOCKS, block_bytes: int = DEFAULT_SCAN_BYTES,
+                                on_progress: Optional[Callable[[FileReport], None]] = None,
+                                on_done: Optional[Callable[[FileReport], None]] = None,
+                                processes: Optional[int] = None) -> PipelineResult:
+    """
+    Same as aggregate_files, for callers already running an event loop.
+    """
+    start = time.perf_counter()
+    if processes:
+        #The pool size bounds the files in flight
+        with ProcessPoolExecutor(max_workers=min(processes, max(1, len(paths)))) as pool:
+            done = await asyncio.gather(*(_run_file_in_process(path, pool, block_bytes, on_progress, on_done)
+                                          for path in paths))
+    else:
+        #Every file in flight has a reader and a parser step, one thread each keeps them both busy
+        workers = workers or max(2, min(2 * files_in_flight, (os.cpu_count() or 1) + 1))
+        slots = asyncio.Semaphore(max(1, files_in_flight))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nyctaxi-pipeline") as pool:
+            done = await asyncio.gather(*(_run_file(path, pool, slots, max(1, queue_blocks), block_bytes,
+                                                    on_progress, on_done) for path in paths))
+    merged = TripAggregates()
+    for result, _ in done:
+        merged.merge(result)
+    return PipelineResult(merged, [result for result, _ in done], [report for _, report in done],
+                          time.perf_counter() - start)
+
+
+@traced(rows=lambda result, *args, **kwargs: result.aggregates.rows)
+def aggregate_files(paths: Sequence[str], workers: Optional[int] = None,
+                    files_in_flight: int = DEFAULT_FILES_IN_FLIGHT, queue_blocks: int = DEFAULT_QUEUE_BLOCKS,
+                    block_bytes: int = DEFAULT_SCAN_BYTES,
+                    on_progress: Optional[Callable[[FileReport], None]] = None,
+                    on_done: Optional[Callable[[FileReport], None]] = None,
+                    processes: Optional[int] = None) -> PipelineResult:
+    """
+    This function aggregates many trip files, overlapping the reading and decompression
+    of the files with the parsing of the blocks already read.
+
+    Parameters:
+    :paths: The trip files, csv text optionally compressed with gzip, bz2, xz or zstd
+    :workers: The size of the thread pool, enough for every file in flight if None
+    :files_in_flight: How many files are read and parsed at the same time
+    :queue_blocks: How many blocks a reader may read ahead of its parser
+    :block_bytes: The approximate size of a block of decompressed csv
+    :on_progress: Called with the FileReport of a file after each of its blocks
+        (once, when the file is done, with 'processes')
+    :on_done: Called with the FileReport of a file once it is aggregated
+    :processes: If set, every file is aggregated whole in one of that many worker
+        processes instead of the threads; workers, files_in_flight and queue_blocks are then unused
+
+    @return: A PipelineResult; its 'aggregates' give the stats (.stats), the trips per
+        pickup zone (.count_trips) and the OD matrix (.od_matrix, .graph_data) of all the files
+    """
+    return asyncio.run(aggregate_files_async(paths, workers, files_in_flight, queue_blocks, block_bytes,
+                                             on_progress, on_done, processes))
+
+
+@traced(rows=lambda result, *args, **kwargs: result.aggregates.rows)
+def aggregate_files_sequential(paths: Sequence[str], block_bytes: int = DEFAULT_SCAN_BYTES,
+                               on_done: Optional[Callable[[FileReport], None]] = None) -> PipelineResult:
+    """
+    The same aggregation without any overlap: every file is read, decompressed and
+    parsed block by block, one file after the other. It gives the same result as
+    aggregate_files and is the baseline of benchmarks/bench_pipeline.py.
+    """
+    start = time.perf_counter()
+    per_file, reports = [], []
+    for file_path in paths:
+        result, report = _aggregate_file(file_path, block_bytes)
+        if on_done is not None:
+            on_done(report)
+        per_file.append(result)
+        reports.append(report)
+    merged = TripAggregates()
+    for result in per_file:
+        merged.merge(result)
+    return PipelineResult(merged, per_file, reports, time.perf_counter() - start)
+
+
+@traced(rows=lambda result, *args, **kwargs: result[1].rows)
+def _aggregate_file(file_path: str, block_bytes: int) -> tuple:
+    #Reads, decompresses and parses one file block by block; also the task of a worker process
+    report, result = FileReport(file_path), TripAggregates()
+    with open_trip_stream(file_path) as stream:
+        header = _parse_header(stream.readline())
+        carry, finished = b"", False
+        while not finished:
+            block, carry, finished = _split_lines(stream, block_bytes, carry)
+            if block:
+                report.bytes_decoded += len(block)
+                report.rows += _fold(result, block, header)
+                report.blocks += 1
+    report.bytes_read = os.path.getsize(file_path)
+    report._tick()
+    report.done = True
+    return result, report
@@ -0,0 +1,145 @@
+#Figures of task2 and task3
+#matplotlib is only imported when a figure is drawn; with an output path the figure
+#is saved with the non-interactive Agg backend, so it also works without a display
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .graph_analytics import force_layout, from_od_matrix
+from .profiling import traced
+from .trip_quantiles import quantiles
+
+
+def _pyplot(output: Optional[str]):
+    import matplotlib
+    if output is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _finish(plt, output: Optional[str]) -> None:
+    #Saves the figure when an output path is given, shows it otherwise
+    if output is not None:
+        plt.savefig(output)
+        plt.close()
+    else:
+        plt.show()
+
+
+@traced()
+def plot_sort_times(labels: List[str], sort_times: Dict[str, List[float]], algorithm_labels: Dict[str, str],
+                    output: Optional[str] = None) -> None:
+    """
+    This function draws the bar chart comparing the sorting algorithms.
+
+    Parameters:
+    :labels: The data domains, one group of bars each
+    :sort_times: A dict mapping an algorithm to its time (seconds) on every domain
+    :algorithm_labels: The name shown in the legend for every algorithm
+    :output: Where to save the figure, shown in a window if None
+    """
+    plt = _pyplot(output)
+    algorithms = list(sort_times)
+    x = range(len(labels))  # the label locations
+    width = 0.7 / len(algorithms)  # the width of the bars
+
+    fig, ax = plt.subplots()
+    all_rects = []
+    for i, name in enumerate(algorithms):
+        all_rects.append(ax.bar([p + i * width for p in x], sort_times[name], width, label=algorithm_labels[name]))
+
+    # Adds some text for labels, title and custom x-axis tick labels, etc.
+    ax.set_ylabel('Seconds')
+    ax.set_title('Comparison of Sorting Algorithm Speeds')
+    ax.set_xticks([p + width * (len(algorithms) - 1) / 2 for p in x])
+    ax.set_xticklabels(labels)
+    ax.legend()
+
+    # Function to attach a text label above each bar in rects, displaying its height.
+    # This helps in quickly seeing the numeric values without needing to estimate from the plot scale
+    def autolabel(rects):
+        for rect in rects:
+            height = rect.get_height()
+            ax.annotate(f'{height:.4f}',
+                        xy=(rect.get_x() + rect.get_width() / 2, height),
+                        xytext=(0, 3),  # 3 points vertical offset
+                        textcoords="offset points",
+                        ha='center', va='bottom')
+
+    for rects in all_rects:
+        autolabel(rects)
+
+    fig.tight_layout()
+    _finish(plt, output)
+
+
+@traced()
+def draw_zone_graph(counts: np.ndarray, zone_ids: Optional[List[int]] = None, output: Optional[str] = None,
+                    seed: int = 0) -> None:
+    """
+    This function draws the zone graph of an od_matrix.
+
+    The edge widths are scaled based on the relative number of trips, providing visual emphasis on more
+    frequent routes. Node colors are determined by the quartiles of the trip counts of the nodes, offering
+    an intuitive color-coding to indicate the volume of trips associated with each node.
+
+    Parameters:
+    :counts: An od_matrix of trip counts
+    :zone_ids: The LocationIDs that may be drawn (e.g. those with a name), all of them if None
+    :output: Where to save the figure, shown in a window if None
+    :seed: Seed of the force-directed layout
+    """
+    import matplotlib.patches as mpatches
+    from matplotlib.collections import LineCollection
+    plt = _pyplot(output)
+
+    graph = from_od_matrix(counts)
+    drawn = np.ones(len(graph.active), dtype=bool)
+    if zone_ids is not None:
+        drawn[:] = False
+        drawn[[zone_id for zone_id in zone_ids if 0 <= zone_id < len(drawn)]] = True
+    nodes = graph.nodes()
+    nodes = nodes[drawn[nodes]]
+    sources = graph.sources()
+    # Every undirected edge is stored in both directions, one is enough to draw it
+    edges = (sources <= graph.indices) & drawn[sources] & drawn[graph.indices]
+    edge_sources, edge_targets, edge_weights = sources[edges], graph.indices[edges], graph.weights[edges]
+
+    # Define edge widths based on their relative weights
+    edge_widths = edge_weights * 50 / edge_weights.sum() * 10
+
+    # Count trips associated with each node, as pickup and as dropoff
+    node_trips = (counts.sum(axis=1) + counts.sum(axis=0))[nodes]
+
+    # Identify the quartiles of the trip counts to determine color thresholds,
+    # found by selection without sorting the counts (see trip_quantiles.py)
+    min_trips = int(node_trips.min())
+    max_trips = int(node_trips.max())
+    q1_threshold, q2_threshold, q3_threshold = quantiles(node_trips, [0.25, 0.5, 0.75])
+
+    # Assign colors to nodes based on the number of trips
+    node_colors = np.select([node_trips <= q1_threshold, node_trips <= q2_threshold, node_trips <= q3_threshold],
+                            ['yellowgreen', 'green', 'blue'], 'purple')
+
+    # Position the nodes with a force-directed layout computed on arrays
+    pos = force_layout(graph, seed=seed)
+    xy = np.array([pos[node] for node in nodes.tolist()])
+    edge_xy = np.array([[pos[u], pos[v]] for u, v in zip(edge_sources.tolist(), edge_targets.tolist())])
+
+    # Plotting the graph with colored nodes according to trip counts
+    plt.figure(figsize=(12, 8))  # Set the size of the figure
+    ax = plt.gca()
+    ax.add_collection(LineCollection(edge_xy, linewidths=edge_widths, colors='black', zorder=1))
+    ax.scatter(xy[:, 0], xy[:, 1], s=200, c=node_colors, zorder=2)
+    ax.set_axis_off()
+
+    # Add a legend to help identify color ranges
+    legend_handles = [
+        mpatches.Patch(color='yellowgreen', label=f'Q1 ({min_trips:.0f}-{q1_threshold:.1f})'),
+        mpatches.Patch(color='green', label=f'Q2 ({q1_threshold:.1f}-{q2_threshold:.1f})'),
+        mpatches.Patch(color='blue', label=f'Q3 ({q2_threshold:.1f}-{q3_threshold:.1f})'),
+        mpatches.Patch(color='purple', label=f'Q4 ({q3_threshold:.0f}-{max_trips:.0f})')
+    ]
+    plt.legend(handles=legend_handles, loc='upper left')
+    _finish(plt, output)
@@ -0,0 +1,357 @@
+#Instrumentation of the analysis stages
+#A stage records its wall time, CPU time, rows processed and, when asked, the peak
+#memory traced by tracemalloc while it runs. Stages nest (a stage opened inside
+#another one is its child) and are written as a JSON trace that chrome://tracing
+#or Perfetto can open. Tracing is off by default: a traced function then only
+#checks one flag before running, and stage() returns a shared no-op object.
+#
+#Enabled from code (enable/write_trace), from the CLI (--trace, --trace-memory,
+#--profile) or, for the task scripts, from the environment:
+#    NYCTAXI_TRACE=trace.json NYCTAXI_TRACE_MEMORY=1 NYCTAXI_PROFILE=run.prof python task3_project.py
+#Only the main process reads the environment. Worker processes record their stages
+#when their task is run through run_traced, and the parent adds them to its trace.
+import atexit
+import contextvars
+import functools
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+TRACE_FORMAT = 1
+
+_enabled = False
+_memory = False
+_origin_ns = time.perf_counter_ns()
+_records: List[dict] = []
+#Innermost open stage of the current thread or asyncio task
+_current: contextvars.ContextVar = contextvars.ContextVar("nyctaxi_stage", default=None)
+
+
+class Stage:
+    """
+    A timed stage, used as a context manager: 'with stage("parse") as s: ...; s.add_rows(n)'.
+
+    :name: The name of the stage
+    :rows: The rows processed, added with add_rows
+    """
+
+    def __init__(self, name: str, rows: int = 0):
+        self.name = name
+        self.rows = rows
+        self.peak = 0
+
+    def add_rows(self, rows: int) -> None:
+        self.rows += int(rows)
+
+    def __enter__(self) -> "Stage":
+        self.parent = _current.get()
+        self.path = self.name if self.parent is None else f"{self.parent.path}/{self.name}"
+        if _memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            #The peak reached so far belongs to the parent, the child measures from here
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = current
+        self.token = _current.set(self)
+        self.start_cpu = time.process_time()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        wall_ns = time.perf_counter_ns() - self.start_ns
+        cpu_s = time.process_time() - self.start_cpu
+        _current.reset(self.token)
+        wall_s = wall_ns / 1e9
+        record = {
+            "name": self.name,
+            "path": self.path,
+            "start_s": (self.start_ns - _origin_ns) / 1e9,
+            "wall_s": wall_s,
+            "cpu_s": cpu_s,
+            "rows": self.rows,
+            "rows_per_s": self.rows / wall_s if self.rows and wall_s > 0 else None,
+            "pid": os.getpid(),
+        }
+        if _memory:
+            import tracemalloc
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            record["memory_peak_bytes"] = max(self.peak - self.start_memory, 0)
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, self.peak)
+            tracemalloc.reset_peak()
+        _records.append(record)
+
+
+class _NullStage:
+    #Returned by stage() while tracing is off
+    rows = 0
+
+    def add_rows(self, rows: int) -> None:
+        pass
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name: str, rows: int = 0):
+    """
+    Returns a context manager timing the code it wraps as the stage 'name' (a no-op when tracing is off).
+    """
+    return Stage(name, rows) if _enabled else _NULL_STAGE
+
+
+def result_rows(result, *args, **kwargs) -> int:
+    #rows= of traced for functions returning a TripTable (or anything with a length)
+    return len(result)
+
+
+def input_rows(result, data, *args, **kwargs) -> int:
+    #rows= of traced for functions taking the TripTable as first argument
+    return len(data)
+
+
+def traced(name: Optional[str] = None, rows: Optional[Callable[..., int]] = None):
+    """
+    This decorator records every call of a function as a stage.
+
+    Parameters:
+    :name: The name of the stage, 'module.function' if None
+    :rows: Called as rows(result, *args, **kwargs) after the call to count the rows
+        processed, e.g. result_rows or input_rows; rows are not counted if None
+
+    @return: The decorator
+    """
+    def decorate(function):
+        stage_name = name or f"{function.__module__.rsplit('.', 1)[-1]}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with Stage(stage_name) as current:
+                result = function(*args, **kwargs)
+                if rows is not None:
+                    current.add_rows(rows(result, *args, **kwargs))
+            return result
+        return wrapper
+    return decorate
+
+
+def enable(memory: bool = False) -> None:
+    """
+    Starts recording the stages; with memory=True tracemalloc also measures their peak
+    memory, which slows down the code that allocates many small objects.
+    """
+    global _enabled, _memory
+    _enabled, _memory = True, memory
+    if memory:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def disable() -> None:
+    """
+    Stops recording; the stages already recorded are kept until reset().
+    """
+    global _enabled, _memory
+    if _memory:
+        import tracemalloc
+        tracemalloc.stop()
+    _enabled, _memory = False, False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """
+    Forgets the recorded stages.
+    """
+    global _origin_ns
+    _records.clear()
+    _origin_ns = time.perf_counter_ns()
+
+
+def records() -> List[dict]:
+    """
+    Returns the finished stages in the order they ended (children before their parent).
+    """
+    return list(_records)
+
+
+def summary(stages: Optional[List[dict]] = None) -> Dict[str, dict]:
+    """
+    Totals of the stages by path: calls, wall and CPU time, rows, rows/sec and the largest peak memory.
+    The paths are listed in the order they first started, so a parent comes before its children.
+    """
+    totals = {}
+    for record in sorted(stages if stages is not None else _records, key=lambda record: record["start_s"]):
+        total = totals.setdefault(record["path"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": 0})
+        total["calls"] += 1
+        total["wall_s"] += record["wall_s"]
+        total["cpu_s"] += record["cpu_s"]
+        total["rows"] += record["rows"]
+        if "memory_peak_bytes" in record:
+            total["memory_peak_bytes"] = max(total.get("memory_peak_bytes", 0), record["memory_peak_bytes"])
+    for total in totals.values():
+        total["rows_per_s"] = total["rows"] / total["wall_s"] if total["rows"] and total["wall_s"] > 0 else None
+    return totals
+
+
+def format_summary(totals: Optional[Dict[str, dict]] = None) -> str:
+    """
+    Returns the summary as a text table, one line per stage path.
+    """
+    totals = summary() if totals is None else totals
+    width = max([48] + [len(path) + 2 for path in totals])
+    lines = [f"{'stage':<{width}}{'calls':>6}{'wall s':>10}{'cpu s':>10}{'rows':>11}{'rows/s':>12}{'peak MB':>9}"]
+    for path, total in totals.items():
+        rate = f"{total['rows_per_s']:.0f}" if total["rows_per_s"] else "-"
+        peak = f"{total['memory_peak_bytes'] / 1e6:.1f}" if "memory_peak_bytes" in total else "-"
+        lines.append(f"{path:<{width}}{total['calls']:>6}{total['wall_s']:>10.4f}{total['cpu_s']:>10.4f}"
+                     f"{total['rows']:>11}{rate:>12}{peak:>9}")
+    return "\n".join(lines)
+
+
+def write_trace(path: str) -> None:
+    """
+    Writes the recorded stages, their summary and the same stages as Chrome trace
+    events ('traceEvents', complete events in microseconds) to a JSON file.
+    """
+    stages = records()
+    events = [{"name": record["name"], "ph": "X", "ts": record["start_s"] * 1e6, "dur": record["wall_s"] * 1e6,
+               "pid": record["pid"], "tid": 0,
+               "args": {key: record[key] for key in ("path", "cpu_s", "rows", "rows_per_s", "memory_peak_bytes")
+                        if key in record}}
+              for record in stages]
+    trace = {
+        "format": TRACE_FORMAT,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "memory": any("memory_peak_bytes" in record for record in stages),
+        "stages": stages,
+        "summary": summary(stages),
+        "traceEvents": events,
+    }
+    with open(path, "w") as f:
+        json.dump(trace, f, indent=1)
+
+
+@contextmanager
+def profile(path: Optional[str]):
+    """
+    Runs the wrapped code under cProfile and dumps the statistics to 'path'
+    (readable with pstats or snakeviz); does nothing if path is None.
+    """
+    if path is None:
+        yield None
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+class _RemoteParent:
+    #Stands for the stage of the parent process a worker task was submitted from
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.peak = 0
+
+
+def worker_settings() -> Optional[dict]:
+    """
+    Returns what a task sent to a worker process needs to record its stages into this
+    trace (see run_traced), or None while tracing is off.
+    """
+    if not _enabled:
+        return None
+    current = _current.get()
+    return {"memory": _memory, "origin_ns": _origin_ns, "path": current.path if current is not None else None}
+
+
+def run_traced(settings: Optional[dict], function: Callable, *args, **kwargs) -> tuple:
+    """
+    This function runs a task in a worker process and collects the stages it records.
+
+    Parameters:
+    :settings: The worker_settings() of the parent, nothing is recorded if None
+    :function: The task, called as function(*args, **kwargs)
+
+    @return: The result of the task and the list of its stage records, to be passed to
+        add_records in the parent; their paths continue the stage the task was submitted from
+    """
+    global _enabled, _memory, _origin_ns
+    if settings is None:
+        return function(*args, **kwargs), []
+    previous = (_enabled, _memory, _origin_ns)
+    first = len(_records)
+    _enabled, _memory, _origin_ns = True, settings["memory"], settings["origin_ns"]
+    started = False
+    if _memory:
+        import tracemalloc
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+    token = _current.set(_RemoteParent(settings["path"]) if settings["path"] is not None else None)
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        _current.reset(token)
+        if started:
+            import tracemalloc
+            tracemalloc.stop()
+        _enabled, _memory, _origin_ns = previous
+        recorded = _records[first:]
+        del _records[first:]
+    return result, recorded
+
+
+def add_records(stages: List[dict]) -> None:
+    """
+    Adds the stages recorded by a worker process (see run_traced) to this trace.
+    """
+    if _enabled:
+        _records.extend(stages)
+
+
+def _configure_from_environment() -> None:
+    #NYCTAXI_TRACE / NYCTAXI_TRACE_MEMORY / NYCTAXI_PROFILE, written when the interpreter exits
+    trace_path = os.environ.get("NYCTAXI_TRACE")
+    profile_path = os.environ.get("NYCTAXI_PROFILE")
+    if not (trace_path or profile_path):
+        return
+    import multiprocessing
+    if multiprocessing.parent_process() is not None:
+        #A worker (e.g. started with 'spawn') must not write the files of the main process again
+        return
+    if trace_path:
+        enable(memory=os.environ.get("NYCTAXI_TRACE_MEMORY", "") not in ("", "0"))
+        atexit.register(write_trace, trace_path)
+    if profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def dump() -> None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        atexit.register(dump)
+
+
+_configure_from_environment()
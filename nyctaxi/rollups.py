@@ -0,0 +1,293 @@
+#Hourly rollups of the trips
+#The trips are pre-aggregated into (pickup hour, PULocationID, DOLocationID) buckets
+#holding the number of trips and the count, sum, min and max of a few fields, so that
+#per hour/day/zone questions are answered without reading the trips again.
+#A RollupStore keeps one partition per trip file, named by the digest of the file;
+#appending a new file never touches the partitions already written, and concurrent
+#appends take turns on the manifest only
+import os
+import shutil
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .fileutil import file_digest, locked, read_json, write_json
+from .od_matrix import ZONE_SLOTS
+from .trip_loader import TripTable, load_trips
+
+#Fields summarised in every bucket; duration_s comes from the two timestamps
+ROLLUP_FIELDS = ("passenger_count", "fare_amount", "tip_amount", "total_amount", "trip_distance", "duration_s")
+
+#Trip columns read to build the rollups
+ROLLUP_COLUMNS = ("tpep_pickup_datetime", "tpep_dropoff_datetime", "PULocationID", "DOLocationID",
+                  "passenger_count", "fare_amount", "tip_amount", "total_amount", "trip_distance")
+
+#Bucket of the trips without a pickup time; no time window ever includes it
+NO_HOUR = np.iinfo(np.int64).min
+
+#Trips whose zone is missing or out of range are kept under LocationID 0, which is never used
+UNKNOWN_ZONE = 0
+
+#Bumped whenever the layout of the stored partitions changes
+ROLLUP_FORMAT = 1
+
+_MANIFEST_FILE = "manifest.json"
+_LOCK_FILE = "manifest.lock"
+_US_PER_HOUR = 3600 * 10 ** 6
+
+#Something that names an hour: a datetime64, an ISO string such as '2022-07-18T16' or an int hour since the epoch
+HourLike = Union[int, str, np.datetime64]
+
+
+def to_hour(value: HourLike) -> int:
+    """
+    Returns the number of hours since the epoch of a datetime64, an ISO date/time string or an int.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(np.datetime64(value, "h").astype(np.int64))
+
+
+def _field_values(data: TripTable, field: str) -> Tuple[np.ndarray, np.ndarray]:
+    #Values of a field and the mask of the trips where it is known
+    if field == "duration_s":
+        pickup, dropoff = "tpep_pickup_datetime", "tpep_dropoff_datetime"
+        return (data[dropoff] - data[pickup]) / 1e6, ~(data.nulls[pickup] | data.nulls[dropoff])
+    return data[field].astype(np.float64), ~data.nulls[field]
+
+
+def _zone(data: TripTable, column: str) -> np.ndarray:
+    zone = data[column].astype(np.int64)
+    return np.where(data.nulls[column] | (zone < 0) | (zone >= ZONE_SLOTS), UNKNOWN_ZONE, zone)
+
+
+class Rollup:
+    """
+    Trip buckets sorted by (hour, pickup, dropoff).
+
+    :hours: Pickup hour of every bucket, in hours since the epoch (NO_HOUR if unknown)
+    :pickup: PULocationID of every bucket (UNKNOWN_ZONE if unknown)
+    :dropoff: DOLocationID of every bucket (UNKNOWN_ZONE if unknown)
+    :trips: Number of trips of every bucket
+    :fields: For each of ROLLUP_FIELDS a dict of 'count' (trips where it is known), 'sum', 'min' and 'max' arrays
+
+    The same (hour, pickup, dropoff) can appear once per partition; every query adds them up.
+    """
+
+    def __init__(self, hours: np.ndarray, pickup: np.ndarray, dropoff: np.ndarray, trips: np.ndarray,
+                 fields: Dict[str, Dict[str, np.ndarray]]):
+        self.hours = hours
+        self.pickup = pickup
+        self.dropoff = dropoff
+        self.trips = trips
+        self.fields = fields
+
+    def __len__(self) -> int:
+        return len(self.hours)
+
+    @classmethod
+    def build(cls, data: TripTable) -> "Rollup":
+        """
+        Aggregates a table of trips (holding the ROLLUP_COLUMNS) into buckets.
+        """
+        pickup_time = data["tpep_pickup_datetime"]
+        hours = np.where(data.nulls["tpep_pickup_datetime"], NO_HOUR, pickup_time // _US_PER_HOUR)
+        pickup, dropoff = _zone(data, "PULocationID"), _zone(data, "DOLocationID")
+        order = np.lexsort((dropoff, pickup, hours))
+        hours, pickup, dropoff = hours[order], pickup[order], dropoff[order]
+        #A new bucket starts wherever the key changes
+        new_bucket = np.ones(len(order), dtype=bool)
+        new_bucket[1:] = (hours[1:] != hours[:-1]) | (pickup[1:] != pickup[:-1]) | (dropoff[1:] != dropoff[:-1])
+        starts = np.flatnonzero(new_bucket)
+        bucket = np.cumsum(new_bucket) - 1
+        fields = {}
+        for field in ROLLUP_FIELDS:
+            values, known = _field_values(data, field)
+            values, known = values[order], known[order]
+            fields[field] = {
+                "count": np.bincount(bucket, weights=known, minlength=len(starts)).astype(np.int64),
+                "sum": np.bincount(bucket, weights=np.where(known, values, 0.0), minlength=len(starts)),
+                "min": np.minimum.reduceat(np.where(known, values, np.inf), starts) if len(starts) else np.empty(0),
+                "max": np.maximum.reduceat(np.where(known, values, -np.inf), starts) if len(starts) else np.empty(0),
+            }
+        trips = np.diff(np.append(starts, len(order))).astype(np.int64)
+        return cls(hours[starts], pickup[starts], dropoff[starts], trips, fields)
+
+    @classmethod
+    def concat(cls, rollups: Sequence["Rollup"]) -> "Rollup":
+        """
+        Puts several rollups (e.g. one per month) together, sorted by hour.
+        """
+        if not rollups:
+            return cls.build(TripTable({name: np.empty(0, dtype=np.int64) for name in ROLLUP_COLUMNS},
+                                       {name: np.empty(0, dtype=bool) for name in ROLLUP_COLUMNS}))
+        hours = np.concatenate([rollup.hours for rollup in rollups])
+        order = np.argsort(hours, kind="stable")
+        join = lambda arrays: np.concatenate(arrays)[order]
+        return cls(hours[order], join([r.pickup for r in rollups]), join([r.dropoff for r in rollups]),
+                   join([r.trips for r in rollups]),
+                   {field: {key: join([r.fields[field][key] for r in rollups]) for key in ("count", "sum", "min", "max")}
+                    for field in ROLLUP_FIELDS})
+
+    def _select(self, mask: np.ndarray) -> "Rollup":
+        return Rollup(self.hours[mask], self.pickup[mask], self.dropoff[mask], self.trips[mask],
+                      {field: {key: array[mask] for key, array in arrays.items()}
+                       for field, arrays in self.fields.items()})
+
+    def window(self, start: Optional[HourLike] = None, end: Optional[HourLike] = None) -> "Rollup":
+        """
+        Returns the buckets whose pickup hour is in [start, end). Either bound may be None;
+        with any bound the trips without a pickup time are left out.
+        """
+        if start is None and end is None:
+            return self
+        #The hours are sorted, the window is found by binary search
+        first = np.searchsorted(self.hours, to_hour(start) if start is not None else NO_HOUR + 1, side="left")
+        last = np.searchsorted(self.hours, to_hour(end), side="left") if end is not None else len(self.hours)
+        return self._select(slice(first, max(first, last)))
+
+    def where(self, pickup: Optional[Iterable[int]] = None, dropoff: Optional[Iterable[int]] = None) -> "Rollup":
+        """
+        Returns the buckets whose pickup (and/or dropoff) zone is one of the given LocationIDs.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if pickup is not None:
+            mask &= np.isin(self.pickup, list(pickup))
+        if dropoff is not None:
+            mask &= np.isin(self.dropoff, list(dropoff))
+        return self._select(mask)
+
+    def total_trips(self) -> int:
+        return int(self.trips.sum())
+
+    def count_trips(self, zones: Dict[int, str]) -> Dict[str, int]:
+        """
+        Number of trips leaving each of the zones, the dict of task1_project.count_trips
+        (in the order of 'zones' rather than of first appearance in the file).
+        """
+        counts = np.bincount(self.pickup, weights=self.trips, minlength=ZONE_SLOTS)
+        trip_count = {}
+        for zone_id, zone_name in zones.items():
+            if 0 <= zone_id < ZONE_SLOTS and counts[zone_id] > 0:
+                trip_count[zone_name] = trip_count.get(zone_name, 0) + int(counts[zone_id])
+        return trip_count
+
+    def count_trips_by(self, catalog, by: str = "borough") -> Dict[str, int]:
+        """
+        Number of trips leaving every borough (or service_zone) of a zones.ZoneCatalog.
+        """
+        return catalog.group(np.bincount(self.pickup, weights=self.trips, minlength=ZONE_SLOTS).astype(np.int64), by)
+
+    def stats(self, fields: Iterable[str] = ("passenger_count", "fare_amount", "total_amount", "tip_amount"),
+              default=0.0) -> Dict[str, Dict[str, float]]:
+        """
+        The {'min', 'max', 'avg'} dict of calculate_stats for the trips of the buckets
+        (the averages add per-bucket sums, so the last digits may differ from a scan).
+        """
+        result = {}
+        for field in fields:
+            arrays = self.fields[field]
+            count = int(arrays["count"].sum())
+            if count == 0:
+                result[field] = {"min": default, "max": default, "avg": default}
+            else:
+                result[field] = {"min": float(arrays["min"].min()), "max": float(arrays["max"].max()),
+                                 "avg": float(arrays["sum"].sum() / count)}
+        return result
+
+    def od_matrix(self, weight: Optional[str] = None) -> np.ndarray:
+        """
+        The od_matrix of the trips of the buckets: trip counts, or the sum of one of ROLLUP_FIELDS.
+        Trips with an unknown zone are left out, as od_matrix does.
+        """
+        cells = self.pickup * ZONE_SLOTS + self.dropoff
+        values = self.trips if weight is None else self.fields[weight]["sum"]
+        matrix = np.bincount(cells, weights=values, minlength=ZONE_SLOTS * ZONE_SLOTS).reshape(ZONE_SLOTS, ZONE_SLOTS)
+        matrix[UNKNOWN_ZONE, :] = 0
+        matrix[:, UNKNOWN_ZONE] = 0
+        return matrix.astype(np.int64) if weight is None else matrix
+
+    def per_hour(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the hours (as datetime64) that have trips and the number of trips of each.
+        """
+        known = self.hours != NO_HOUR
+        hours, inverse = np.unique(self.hours[known], return_inverse=True)
+        return hours.astype("datetime64[h]"), np.bincount(inverse, weights=self.trips[known]).astype(np.int64)
+
+
+class RollupStore:
+    """
+    Directory of rollups with one partition per trip file appended.
+
+    :path: The directory, created on the first append
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _manifest(self) -> dict:
+        return read_json(os.path.join(self.path, _MANIFEST_FILE)) or {"format": ROLLUP_FORMAT, "partitions": []}
+
+    def partitions(self) -> list:
+        """
+        Returns the manifest entry (source, digest, rows, buckets) of every partition.
+        """
+        return self._manifest()["partitions"]
+
+    def append(self, file_path: str, data: Optional[TripTable] = None) -> bool:
+        """
+        This function adds the rollups of a new trip file as a new partition.
+
+        Parameters:
+        :file_path: The trip file, e.g. a new month
+        :data: Its trips if they are already loaded, read from file_path otherwise
+
+        @return: False if a file with the same content was already appended (nothing is done)
+        """
+        manifest = self._manifest()
+        if manifest.get("format") != ROLLUP_FORMAT:
+            raise ValueError(f"{self.path} holds rollups of format {manifest.get('format')}, expected {ROLLUP_FORMAT}")
+        digest = file_digest(file_path)
+        if any(partition["digest"] == digest for partition in manifest["partitions"]):
+            return False
+        rollup = Rollup.build(data if data is not None else load_trips(file_path, columns=ROLLUP_COLUMNS))
+        #Named by digest, so a concurrent append of another file never writes the same partition
+        name = digest
+        _save_rollup(rollup, os.path.join(self.path, name))
+        #The manifest is read again and written last under the lock, a partition only counts once it is listed
+        with locked(os.path.join(self.path, _LOCK_FILE)):
+            manifest = self._manifest()
+            if any(partition["digest"] == digest for partition in manifest["partitions"]):
+                return False
+            manifest["partitions"].append({"name": name, "source": os.path.abspath(file_path), "digest": digest,
+                                           "rows": rollup.total_trips(), "buckets": len(rollup)})
+            write_json(os.path.join(self.path, _MANIFEST_FILE), manifest)
+        return True
+
+    def load(self) -> Rollup:
+        """
+        Returns the rollups of every partition together, memory-mapped from the store.
+        """
+        return Rollup.concat([_open_rollup(os.path.join(self.path, partition["name"]))
+                              for partition in self.partitions()])
+
+
+def _save_rollup(rollup: Rollup, directory: str) -> None:
+    temporary = f"{directory}.{os.getpid()}.tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    arrays = {"hours": rollup.hours, "pickup": rollup.pickup, "dropoff": rollup.dropoff, "trips": rollup.trips}
+    for field, stats in rollup.fields.items():
+        arrays.update({f"{field}.{key}": array for key, array in stats.items()})
+    for name, array in arrays.items():
+        np.save(os.path.join(temporary, f"{name}.npy"), np.ascontiguousarray(array))
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(temporary, directory)
+
+
+def _open_rollup(directory: str) -> Rollup:
+    load = lambda name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+    return Rollup(load("hours"), load("pickup"), load("dropoff"), load("trips"),
+                  {field: {key: load(f"{field}.{key}") for key in ("count", "sum", "min", "max")}
+                   for field in ROLLUP_FIELDS})
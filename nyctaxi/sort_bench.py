@@ -0,0 +1,180 @@
+#Benchmark harness for the sorting algorithms of task2_project (see sorting.py)
+#Every measurement uses time.perf_counter_ns, runs a few warm-up rounds, repeats the
+#timing and gives every algorithm a fresh copy of exactly the same input
+import csv
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .trip_loader import TripTable
+
+#Trip columns the inputs are sampled from, by the names used in task2_project
+SORT_COLUMNS = {
+    "num_passengers": "passenger_count",
+    "fare_amounts": "fare_amount",
+    "total_amounts": "total_amount",
+    "tips_amounts": "tip_amount",
+}
+
+#Largest input given to the O(n^2) algorithms, larger inputs would take minutes
+SIZE_LIMITS = {"bubble": 5000}
+
+RESULT_FIELDS = ["column", "size", "algorithm", "repeats", "min_ns", "median_ns", "p95_ns", "mean_ns", "sorted_ok"]
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile (q between 0 and 100) of a list of samples.
+    """
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def measure(sort: Callable[[list], object], data: Sequence, warmup: int = 1, repeats: int = 5) -> Dict[str, float]:
+    """
+    This function times a sorting algorithm on a given input.
+
+    Parameters:
+    :sort: The algorithm, called with a list it is allowed to modify. It may return the
+        sorted list, a (sorted list, time) tuple like the task2 algorithms, or None if it sorts in place
+    :data: The input, copied before every run so that each run sorts the same values
+    :warmup: The number of runs that are not timed
+    :repeats: The number of timed runs
+
+    @return: A dict with the min, median, p95 and mean time in nanoseconds, the number of
+        repeats and whether the last run returned the sorted input
+    """
+    expected = sorted(data)
+    for _ in range(warmup):
+        sort(list(data))
+    samples = []
+    output = None
+    for _ in range(repeats):
+        #The copy is made outside of the timed region
+        run_input = list(data)
+        start = time.perf_counter_ns()
+        output = sort(run_input)
+        samples.append(time.perf_counter_ns() - start)
+        if output is None:
+            output = run_input
+    if isinstance(output, tuple):
+        output = output[0]
+    return {
+        "repeats": repeats,
+        "min_ns": min(samples),
+        "median_ns": statistics.median(samples),
+        "p95_ns": percentile(samples, 95),
+        "mean_ns": statistics.fmean(samples),
+        "sorted_ok": list(output) == expected,
+    }
+
+
+def sample_column(data: TripTable, column: str, size: int, seed: int = 0) -> list:
+    """
+    Draws 'size' non-blank values of a trip column at random (with replacement
+    only when the column is smaller than 'size'). The same seed gives the same input.
+    Values that are inf or nan are left out: they have no place in a sorted order.
+    """
+    values = data.valid(SORT_COLUMNS.get(column, column))
+    if values.dtype.kind == "f":
+        values = values[np.isfinite(values)]
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(values), size=size, replace=size > len(values))
+    sample = values[picks]
+    if column == "num_passengers":
+        sample = sample.astype(np.int64)
+    return sample.tolist()
+
+
+def run_benchmark(data: TripTable, algorithms: Dict[str, Callable[[list], object]],
+                  columns: Iterable[str] = SORT_COLUMNS, sizes: Iterable[int] = (100, 1000, 10000),
+                  warmup: int = 1, repeats: int = 5, seed: int = 0,
+                  size_limits: Optional[Dict[str, int]] = None) -> List[Dict[str, object]]:
+    """
+    This function benchmarks every algorithm on inputs of several sizes sampled from the trip columns.
+
+    Parameters:
+    :data: The TripTable the inputs are sampled from
+    :algorithms: A dict mapping a name to a sorting algorithm (see measure)
+    :columns: The columns to sample, names of SORT_COLUMNS or trip column names
+    :sizes: The input sizes
+    :warmup: The number of untimed runs per measurement
+    :repeats: The number of timed runs per measurement
+    :seed: Seed of the sampling, so that runs on different commits use the same inputs
+    :size_limits: Optional largest input size per algorithm, e.g. {"bubble": 5000} for O(n^2) sorts
+
+    Algorithms raising ValueError or OverflowError on an input (it is not of the type they
+    handle) are skipped for it.
+
+    @return: One dict per (column, size, algorithm) with the RESULT_FIELDS
+    """
+    size_limits = size_limits or {}
+    results = []
+    for column in columns:
+        for size in sizes:
+            sample = sample_column(data, column, size, seed)
+            for name, sort in algorithms.items():
+                if size > size_limits.get(name, size):
+                    continue
+                row = {"column": column, "size": size, "algorithm": name}
+                try:
+                    row.update(measure(sort, sample, warmup, repeats))
+                except (ValueError, OverflowError):
+                    #Type-specialized sorts (counting, radix) reject inputs they cannot handle
+                    continue
+                results.append(row)
+    return results
+
+
+def format_table(results: List[Dict[str, object]]) -> str:
+    """
+    Returns the results as a text table, one line per measurement.
+    """
+    lines = [f"{'column':<16}{'size':>8}  {'algorithm':<10}{'median ms':>12}{'p95 ms':>12}  ok"]
+    for row in results:
+        lines.append(f"{row['column']:<16}{row['size']:>8}  {row['algorithm']:<10}"
+                     f"{row['median_ns'] / 1e6:>12.3f}{row['p95_ns'] / 1e6:>12.3f}  {row['sorted_ok']}")
+    return "\n".join(lines)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_csv(results: List[Dict[str, object]], path: str) -> None:
+    """
+    Writes the results as a csv file with one row per measurement.
+    """
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        for row in results:
+            writer.writerow({field: row[field] for field in RESULT_FIELDS})
+
+
+def write_json(results: List[Dict[str, object]], path: str) -> None:
+    """
+    Writes the results as json together with the commit and the machine they come
+    from, so that runs of different commits can be compared.
+    """
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1)
@@ -0,0 +1,300 @@
+#Sorting algorithms compared in task2_project
+#Every algorithm takes a list, sorts it and returns (sorted list, seconds spent)
+import math
+import random
+import time
+from collections import Counter
+from itertools import accumulate
+
+import numpy as np
+
+
+def bubbleSort(toBeSorted: list) -> list:
+
+    '''The bubble_sort function is a straightforward implementation of the bubble sort 
+    algorithm which is O(n^2) in complexity. This sorting method is more suitable for 
+    small datasets'''
+
+    start_time = time.perf_counter() # Start timer
+    n = len(toBeSorted) 
+    swapped = True # Flag to indicate if any elements were swapped during a pass
+    while swapped:
+        swapped = False # Resets the flag for each pass
+        for i in range(1, n):
+            if toBeSorted[i - 1] > toBeSorted[i]: # Compares the current element with its previous element
+                toBeSorted[i - 1], toBeSorted[i] = toBeSorted[i], toBeSorted[i - 1] # Swaps the elements if they are in the wrong order
+                swapped = True
+        n -= 1  # Each pass finds the largest item and puts it at the end, so we can ignore the end in subsequent passes
+    end_time = time.perf_counter() #Ends timer
+    return toBeSorted, end_time - start_time
+
+def quickSort(toBeSorted: list) -> list:
+
+    '''The quick_sort function is implemented as a typical recursive sort with a random 
+    pivot selection to help avoid worst-case performance on sorted datasets. It generally 
+    performs with O(n log n) complexity, making it more suitable for larger datasets.'''
+
+    start_time = time.perf_counter() # Start timer, the recursion itself is not timed
+    sorted_list = _quickSort(toBeSorted)
+    end_time = time.perf_counter() # End timer
+    return sorted_list, end_time - start_time
+
+def _quickSort(toBeSorted: list) -> list:
+    #Base case: If the list has one or fewer elements, it is already sorted
+    if len(toBeSorted) <= 1:
+        return toBeSorted
+
+    pivot_index = random.randint(0, len(toBeSorted) - 1)
+    pivot = toBeSorted[pivot_index]
+    left = [x for x in toBeSorted if x < pivot]  # Values smaller than pivot
+    right = [x for x in toBeSorted if x > pivot]  # Values larger than pivot
+    equal = [x for x in toBeSorted if x == pivot]  # Equal to pivot
+
+    # Recursively sort the left and right partitions, then merge them with the equal elements
+    return _quickSort(left) + equal + _quickSort(right)
+
+
+def introSort(toBeSorted: list) -> list:
+
+    '''The intro_sort function sorts the list in place. It is a quick sort using Hoare's
+    partition scheme with a median-of-three pivot, driven by an explicit stack instead of
+    recursion so it can never hit Python's recursion limit. Ranges that get partitioned too
+    many times (adversarial inputs) are finished with heap sort, keeping the worst case at
+    O(n log n), and small ranges with insertion sort. Extra memory is O(log n).'''
+
+    start_time = time.perf_counter() # Start timer
+    n = len(toBeSorted)
+    if n > 1:
+        # Each entry of the stack is a range (lo, hi) still to be sorted and the partitions it may still use
+        stack = [(0, n - 1, 2 * n.bit_length())]
+        while stack:
+            lo, hi, depth = stack.pop()
+            while hi - lo > _SMALL_RANGE:
+                if depth == 0: # Too many partitions, the pivots are bad: switch to heap sort
+                    _heapSort(toBeSorted, lo, hi)
+                    break
+                depth -= 1
+                split = _hoarePartition(toBeSorted, lo, hi)
+                # The larger side goes on the stack, the loop goes on with the smaller one
+                if split - lo < hi - split:
+                    stack.append((split + 1, hi, depth))
+                    hi = split
+                else:
+                    stack.append((lo, split, depth))
+                    lo = split + 1
+            else:
+                _insertionSort(toBeSorted, lo, hi)
+    end_time = time.perf_counter() # End timer
+    return toBeSorted, end_time - start_time
+
+#Ranges up to this length are finished with insertion sort
+_SMALL_RANGE = 16
+
+def _hoarePartition(values: list, lo: int, hi: int) -> int:
+    # Orders the first, middle and last values and takes the middle one as the pivot
+    mid = (lo + hi) // 2
+    if values[mid] < values[lo]:
+        values[mid], values[lo] = values[lo], values[mid]
+    if values[hi] < values[lo]:
+        values[hi], values[lo] = values[lo], values[hi]
+    if values[hi] < values[mid]:
+        values[hi], values[mid] = values[mid], values[hi]
+    pivot = values[mid]
+    i, j = lo - 1, hi + 1
+    while True:
+        i += 1
+        while values[i] < pivot:
+            i += 1
+        j -= 1
+        while values[j] > pivot:
+            j -= 1
+        if i >= j:
+            return j # values[lo..j] <= pivot <= values[j+1..hi]
+        values[i], values[j] = values[j], values[i]
+
+def _insertionSort(values: list, lo: int, hi: int) -> None:
+    for i in range(lo + 1, hi + 1):
+        current = values[i]
+        j = i - 1
+        while j >= lo and values[j] > current:
+            values[j + 1] = values[j]
+            j -= 1
+        values[j + 1] = current
+
+def _heapSort(values: list, lo: int, hi: int) -> None:
+    # Max-heap over values[lo..hi], then the largest value is moved to the end one at a time
+    n = hi - lo + 1
+    for root in range(n // 2 - 1, -1, -1):
+        _siftDown(values, lo, root, n)
+    for end in range(n - 1, 0, -1):
+        values[lo], values[lo + end] = values[lo + end], values[lo]
+        _siftDown(values, lo, 0, end)
+
+def _siftDown(values: list, lo: int, root: int, size: int) -> None:
+    current = values[lo + root]
+    while True:
+        child = 2 * root + 1
+        if child >= size:
+            break
+        if child + 1 < size and values[lo + child + 1] > values[lo + child]:
+            child += 1
+        if values[lo + child] <= current:
+            break
+        values[lo + root] = values[lo + child]
+        root = child
+    values[lo + root] = current
+
+def mergeSort(toBeSorted: list) -> list:
+
+    '''The merge_sort function is a bottom-up (iterative) merge sort. Runs of _SMALL_RANGE
+    values are first sorted with insertion sort, then runs are merged pairwise, doubling
+    their width, back and forth between the list and a single buffer allocated once.
+    It is stable and always O(n log n), with O(n) extra memory.'''
+
+    start_time = time.perf_counter() # Start timer
+    n = len(toBeSorted)
+    for lo in range(0, n, _SMALL_RANGE):
+        _insertionSort(toBeSorted, lo, min(lo + _SMALL_RANGE, n) - 1)
+    source, target = toBeSorted, [None] * n # The buffer is reused by every pass
+    width = _SMALL_RANGE
+    while width < n:
+        for lo in range(0, n, 2 * width):
+            mid, hi = min(lo + width, n), min(lo + 2 * width, n)
+            i, j, k = lo, mid, lo
+            while i < mid and j < hi:
+                if source[j] < source[i]:
+                    target[k] = source[j]
+                    j += 1
+                else: # Ties are taken from the left run, which keeps the sort stable
+                    target[k] = source[i]
+                    i += 1
+                k += 1
+            # One of the runs is exhausted, the rest of the other is copied as it is
+            target[k:hi] = source[i:mid] if i < mid else source[j:hi]
+        source, target = target, source
+        width *= 2
+    if source is not toBeSorted:
+        toBeSorted[:] = source
+    end_time = time.perf_counter() # End timer
+    return toBeSorted, end_time - start_time
+
+def countingSort(toBeSorted: list) -> list:
+
+    '''The counting_sort function is meant for small integers such as passenger_count.
+    It counts how many times each value occurs and rewrites the list in place in O(n + k),
+    where k is the range of the values. Raises ValueError for non-integer values (inf and
+    nan included) or a range wider than _MAX_COUNTING_RANGE.'''
+
+    start_time = time.perf_counter() # Start timer
+    if toBeSorted:
+        counts = Counter(toBeSorted) # Number of occurrences of every distinct value
+        lowest, highest = min(counts), max(counts)
+        if any(not math.isfinite(value) or value != int(value) for value in counts) \
+                or highest - lowest >= _MAX_COUNTING_RANGE:
+            raise ValueError("countingSort needs integer values within a small range")
+        position = 0
+        for value in range(int(lowest), int(highest) + 1):
+            count = counts.get(value, 0)
+            if count: # Writes the value 'count' times
+                toBeSorted[position:position + count] = [value] * count
+                position += count
+    end_time = time.perf_counter() # End timer
+    return toBeSorted, end_time - start_time
+
+#Widest range of values countingSort accepts
+_MAX_COUNTING_RANGE = 1 << 20
+
+def radixSort(toBeSorted: list, decimals: int = 2) -> list:
+
+    '''The radix_sort function is meant for money columns (fare, tip, total amounts), whose
+    values are whole cents. The values are replaced in place by integer keys (cents, shifted
+    so the smallest is 0), the keys are sorted in place with an MSD radix sort (American flag
+    sort), one byte per level, and turned back into the values. At each level the keys of a
+    range are counted per byte, swapped into their bucket, then every bucket is sorted on the
+    next byte; small buckets are finished with insertion sort. O(n * bytes) time; the extra
+    memory is the 256 counters of a level and the stack of buckets left (at most 255 per
+    level), never a copy of the list.
+    Raises ValueError if a value is inf or nan or has more than 'decimals' decimal digits.'''
+
+    start_time = time.perf_counter() # Start timer
+    if toBeSorted:
+        integers = all(isinstance(value, int) for value in toBeSorted)
+        scale = 1 if integers else 10 ** decimals
+        # Every value must come back exactly from its key, otherwise the order could be wrong
+        if not integers and any(not math.isfinite(value) or round(value * scale) / scale != value
+                                for value in toBeSorted):
+            raise ValueError(f"radixSort needs values with at most {decimals} decimals")
+        lowest = round(min(toBeSorted) * scale)
+        for i, value in enumerate(toBeSorted):
+            toBeSorted[i] = round(value * scale) - lowest
+        largest = max(toBeSorted)
+        # Each entry of the stack is a range [lo, hi) still to be sorted on the byte at 'shift'
+        stack = [(0, len(toBeSorted), 8 * ((largest.bit_length() - 1) // 8))] if largest else []
+        while stack:
+            lo, hi, shift = stack.pop()
+            if hi - lo <= _SMALL_RANGE:
+                _insertionSort(toBeSorted, lo, hi - 1)
+                continue
+            counts = [0] * 256
+            for i in range(lo, hi):
+                counts[(toBeSorted[i] >> shift) & 255] += 1
+            # Bucket b is toBeSorted[bounds[b]:bounds[b + 1]], filled from nexts[b]
+            bounds = list(accumulate(counts, initial=lo))
+            nexts = bounds[:256]
+            for bucket in range(256):
+                end = bounds[bucket + 1]
+                while nexts[bucket] < end:
+                    key = toBeSorted[nexts[bucket]]
+                    digit = (key >> shift) & 255
+                    # Swaps the key into its bucket until one belonging to this bucket comes back
+                    while digit != bucket:
+                        position = nexts[digit]
+                        nexts[digit] += 1
+                        key, toBeSorted[position] = toBeSorted[position], key
+                        digit = (key >> shift) & 255
+                    toBeSorted[nexts[bucket]] = key
+                    nexts[bucket] += 1
+            if shift:
+                stack += [(bounds[b], bounds[b + 1], shift - 8) for b in range(256) if bounds[b + 1] - bounds[b] > 1]
+        for i, key in enumerate(toBeSorted):
+            toBeSorted[i] = key + lowest if integers else (key + lowest) / scale
+    end_time = time.perf_counter() # End timer
+    return toBeSorted, end_time - start_time
+
+def pythonSort(toBeSorted: list) -> list:
+    # Baseline: Python's built-in Timsort
+    start_time = time.perf_counter()
+    toBeSorted.sort()
+    end_time = time.perf_counter()
+    return toBeSorted, end_time - start_time
+
+def numpySort(toBeSorted: list) -> list:
+    # Baseline: numpy.sort, including the conversion from and back to a list
+    start_time = time.perf_counter()
+    toBeSorted[:] = np.sort(np.asarray(toBeSorted)).tolist()
+    end_time = time.perf_counter()
+    return toBeSorted, end_time - start_time
+
+
+#Sorting algorithms that can be compared by name
+sorting_algorithms = {
+    "quick": quickSort,
+    "bubble": bubbleSort,
+    "intro": introSort,
+    "merge": mergeSort,
+    "counting": countingSort,
+    "radix": radixSort,
+    "python": pythonSort,
+    "numpy": numpySort,
+}
+
+algorithm_labels = {
+    "quick": "Quick Sort",
+    "bubble": "Bubble Sort",
+    "intro": "Intro Sort",
+    "merge": "Merge Sort",
+    "counting": "Counting Sort",
+    "radix": "Radix Sort",
+    "python": "sorted()",
+    "numpy": "numpy.sort",
+}
@@ -0,0 +1,210 @@
+#Synthetic trip files at any scale, drawn from the sample files
+#Every generated trip copies a trip of the samples (its vendor, passengers, distance,
+#zones, payment and amounts, blank cells included), so the skew of the pickup ->
+#dropoff pairs and the relations between distance, fare and tip are the ones of the
+#samples. Its pickup time is drawn anew: the month with the weight it has in the
+#samples, a day of that month, then the hour with the weight it has on that weekday.
+#The dropoff comes from the duration of the copied trip, spread by a log-normal
+#factor so durations and speeds are not mere repeats.
+#The file is written block by block; block i only depends on the seed and on i, so
+#a file of 10M rows starts with the rows of the 1M file of the same seed.
+import os
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .profiling import traced
+from .trip_loader import load_trips
+
+DEFAULT_SAMPLES = ("nyc_dataset_small.txt", "nyc_dataset_medium.txt")
+
+#Rows generated at once, part of the seed of every block
+BLOCK_ROWS = 1 << 18
+
+#Sigma of the log-normal factor applied to the durations
+DEFAULT_DURATION_SPREAD = 0.1
+
+_US_PER_DAY = 86_400_000_000
+_US_PER_HOUR = 3_600_000_000
+
+
+class TripModel:
+    """
+    What the generator draws from, fitted on the sample files.
+
+    :header: The header line of the samples
+    :heads: The VendorID cell of every sample trip
+    :tails: Every cell after the dropoff timestamp of every sample trip, line end included
+    :durations_us: The duration of every sample trip in microseconds
+    :missing_times: True for the sample trips with a blank pickup or dropoff
+    :days: First day (datetime64[D]) of every day of the period
+    :day_weights: Probability of every day of the period
+    :hour_weights: Probability of every hour (7 x 24) of every weekday (Monday first)
+    """
+
+    def __init__(self, header: str, heads: np.ndarray, tails: np.ndarray, durations_us: np.ndarray,
+                 missing_times: np.ndarray, days: np.ndarray, day_weights: np.ndarray, hour_weights: np.ndarray):
+        self.header = header
+        self.heads = heads
+        self.tails = tails
+        self.durations_us = durations_us
+        self.missing_times = missing_times
+        self.days = days
+        self.day_weights = day_weights
+        self.hour_weights = hour_weights
+
+    @classmethod
+    def fit(cls, samples: Sequence[str] = DEFAULT_SAMPLES, start: Optional[str] = None,
+            end: Optional[str] = None) -> "TripModel":
+        """
+        This function reads the sample trip files and fits the model.
+
+        Parameters:
+        :samples: The sample csv trip files, with the same header
+        :start: First day of the generated pickups (e.g. '2022-01-01'), the first day of the samples if None
+        :end: Day after the last generated pickup, the day after the last day of the samples if None
+
+        @return: A TripModel
+        """
+        header, heads, tails, pickups, dropoffs, missing = None, [], [], [], [], []
+        for path in samples:
+            with open(path, "r", newline="") as f:
+                first = f.readline()
+                header = header or first
+                if first != header:
+                    raise ValueError(f"{path} does not have the header of {samples[0]}")
+                #The first three cells (VendorID and the two timestamps) are never quoted
+                for line in f:
+                    if not line.endswith("\n"):
+                        line += header[len(header.rstrip("\r\n")):]
+                    head, _, _, tail = line.split(",", 3)
+                    heads.append(head)
+                    tails.append(tail)
+            data = load_trips(path, ["tpep_pickup_datetime", "tpep_dropoff_datetime"])
+            pickups.append(data["tpep_pickup_datetime"])
+            dropoffs.append(data["tpep_dropoff_datetime"])
+            missing.append(data.nulls["tpep_pickup_datetime"] | data.nulls["tpep_dropoff_datetime"])
+        pickup, dropoff, missing = np.concatenate(pickups), np.concatenate(dropoffs), np.concatenate(missing)
+        if len(heads) != len(pickup):
+            raise ValueError("the sample files have lines the trip loader does not count as trips")
+        if not len(pickup) or missing.all():
+            raise ValueError("the sample files have no trips with both timestamps")
+        known = pickup[~missing]
+
+        #Days of the period, weighted by the share of the samples in their month and in their weekday
+        first_day = np.datetime64(start, "D") if start else known.min().astype("datetime64[us]").astype("datetime64[D]")
+        last_day = np.datetime64(end, "D") if end else known.max().astype("datetime64[us]").astype("datetime64[D]") + 1
+        days = np.arange(first_day, last_day, dtype="datetime64[D]")
+        if not len(days):
+            raise ValueError(f"empty period {first_day} - {last_day}")
+        sample_months = known.astype("datetime64[us]").astype("datetime64[M]").astype(np.int64) % 12
+        month_share = np.bincount(sample_months, minlength=12) + 1.0
+        months = days.astype("datetime64[M]").astype(np.int64) % 12
+        #1970-01-01 was a Thursday (weekday 3)
+        sample_days = known // _US_PER_DAY
+        weekday = (sample_days + 3) % 7
+        weekday_share = np.bincount(weekday, minlength=7) + 1.0
+        weekdays = (days.astype(np.int64) + 3) % 7
+        day_weights = month_share[months] / np.bincount(months, minlength=12)[months]
+        day_weights *= weekday_share[weekdays] / np.bincount(weekdays, minlength=7)[weekdays]
+        day_weights /= day_weights.sum()
+
+        #Hours of every weekday
+        hour = (known - sample_days * _US_PER_DAY) // _US_PER_HOUR
+        hour_weights = np.bincount(weekday * 24 + hour, minlength=7 * 24).reshape(7, 24) + 1.0
+        hour_weights /= hour_weights.sum(axis=1, keepdims=True)
+
+        return cls(header, np.array(heads, dtype=object), np.array(tails, dtype=object),
+                   np.where(missing, 0, dropoff - pickup), missing, days, day_weights, hour_weights)
+
+    def block(self, rows: int, rng: np.random.Generator, duration_spread: float = DEFAULT_DURATION_SPREAD) -> str:
+        """
+        Returns 'rows' (at most BLOCK_ROWS) generated csv lines. BLOCK_ROWS trips are always
+        drawn, so the lines do not depend on 'rows' and a shorter block is a prefix of a longer one.
+        """
+        donors = rng.integers(0, len(self.heads), size=BLOCK_ROWS)[:rows]
+        day = self.days[rng.choice(len(self.days), size=BLOCK_ROWS, p=self.day_weights)[:rows]].astype(np.int64)
+        weekday = (day + 3) % 7
+        #The cumulative weights of weekday w go from w to w + 1, one search finds the hour of every row
+        cumulative = (np.cumsum(self.hour_weights, axis=1) + np.arange(7)[:, None]).ravel()
+        found = np.searchsorted(cumulative, weekday + rng.random(BLOCK_ROWS)[:rows], side="right")
+        hour = np.minimum(found - weekday * 24, 23)
+        second = rng.integers(0, 3600, size=BLOCK_ROWS)[:rows]
+        pickup = day * _US_PER_DAY + hour * _US_PER_HOUR + second * 1_000_000
+        spread = rng.lognormal(0.0, duration_spread, size=BLOCK_ROWS)[:rows] if duration_spread else 1.0
+        #Whole seconds, like the samples; a negative duration of the samples stays negative
+        duration = np.round(self.durations_us[donors] * spread / 1e6).astype(np.int64) * 1_000_000
+        missing = self.missing_times[donors]
+        pickup_text = np.where(missing, "", np.datetime_as_string(pickup.astype("datetime64[us]"), unit="ms"))
+        dropoff_text = np.where(missing, "",
+                                np.datetime_as_string((pickup + duration).astype("datetime64[us]"), unit="ms"))
+        return "".join([f"{head},{start},{stop},{tail}" for head, start, stop, tail
+                        in zip(self.heads[donors], pickup_text.tolist(), dropoff_text.tolist(), self.tails[donors])])
+
+
+def iter_trip_blocks(model: TripModel, rows: int, seed: int = 0,
+                     duration_spread: float = DEFAULT_DURATION_SPREAD) -> Iterator[str]:
+    """
+    Yields the generated csv lines, BLOCK_ROWS at a time (the header is not included).
+    """
+    for index, first in enumerate(range(0, rows, BLOCK_ROWS)):
+        rng = np.random.default_rng([seed, index])
+        yield model.block(min(BLOCK_ROWS, rows - first), rng, duration_spread)
+
+
+@traced()
+def generate_trips(target: str, rows: int, seed: int = 0, samples: Sequence[str] = DEFAULT_SAMPLES,
+                   start: Optional[str] = None, end: Optional[str] = None,
+                   duration_spread: float = DEFAULT_DURATION_SPREAD) -> str:
+    """
+    This function writes a synthetic trip file in the schema of the sample files.
+
+    Parameters:
+    :target: The file to write; it is written as target + '.part' and renamed when complete
+    :rows: The number of trips
+    :seed: The seed; the same seed, samples and period give the same file
+    :samples: The sample trip files the trips are drawn from
+    :start: First day of the pickups, the first day of the samples if None
+    :end: Day after the last pickup, the day after the last day of the samples if None
+    :duration_spread: Sigma of the log-normal factor applied to the durations, 0 to keep them
+
+    @return: The path of the file
+    """
+    return write_trips(TripModel.fit(samples, start, end), target, rows, seed, duration_spread)
+
+
+def write_trips(model: TripModel, target: str, rows: int, seed: int = 0,
+                duration_spread: float = DEFAULT_DURATION_SPREAD) -> str:
+    """
+    Same as generate_trips with a model already fitted.
+    """
+    with open(target + ".part", "w", newline="") as out:
+        out.write(model.header)
+        for block in iter_trip_blocks(model, rows, seed, duration_spread):
+            out.write(block)
+    os.replace(target + ".part", target)
+    return target
+
+
+def synthetic_path(folder: str, rows: int, seed: int = 0) -> str:
+    """
+    Returns the name used for a generated file of the benchmarks: folder/nyc_dataset_synthetic_<rows>[_s<seed>].txt
+    """
+    suffix = f"_s{seed}" if seed else ""
+    return os.path.join(folder, f"nyc_dataset_synthetic_{rows}{suffix}.txt")
+
+
+def ensure_synthetic(folder: str, sizes: Sequence[int], seed: int = 0,
+                     samples: Sequence[str] = DEFAULT_SAMPLES) -> List[str]:
+    """
+    Generates the files of the given sizes that are missing from 'folder', returns their paths.
+    """
+    os.makedirs(folder, exist_ok=True)
+    model, paths = None, []
+    for rows in sizes:
+        path = synthetic_path(folder, rows, seed)
+        if not os.path.exists(path):
+            model = model or TripModel.fit(samples)
+            write_trips(model, path, rows, seed)
+        paths.append(path)
+    return paths
@@ -0,0 +1,153 @@
+#On-disk cache of the parsed trip files
+#The typed columns of a trip file are saved as .npy files in a '.trip_cache'
+#directory next to it; later runs memory-map them instead of parsing the csv again.
+#When that directory cannot be written (e.g. a read-only dataset folder) the file is
+#parsed as load_trips does, without caching
+import hashlib
+import os
+import shutil
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from .fileutil import file_digest, locked, read_json, write_json
+from .profiling import result_rows, traced
+from .trip_loader import TripTable, load_trips
+
+CACHE_DIR_NAME = ".trip_cache"
+
+#Total size of the cached datasets of a directory, least recently used ones are evicted above it
+DEFAULT_CACHE_BYTES = 2 * 1024 ** 3
+
+#Bumped whenever the layout of the cached columns changes
+CACHE_FORMAT = 1
+
+_INDEX_FILE = "index.json"
+_LOCK_FILE = "index.lock"
+_META_FILE = "meta.json"
+
+
+def _entry_name(file_path: str) -> str:
+    #One entry per source file; the path is hashed so equal names in other folders do not collide
+    source = os.path.abspath(file_path)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return f"{stem}-{hashlib.sha1(source.encode()).hexdigest()[:12]}"
+
+
+def _is_fresh(meta: dict, file_path: str, stat: os.stat_result) -> bool:
+    #Size and mtime are checked first, the content hash only when they disagree
+    if meta.get("format") != CACHE_FORMAT or meta.get("size") != stat.st_size:
+        return False
+    if meta.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    return meta.get("digest") == file_digest(file_path)
+
+
+def _save_entry(table: TripTable, entry_dir: str, meta: dict) -> int:
+    #Saves every column and null mask, returns the bytes written
+    temporary = f"{entry_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    try:
+        os.makedirs(temporary)
+        size = 0
+        for i, name in enumerate(table.columns):
+            for suffix, array in (("values", table.columns[name]), ("nulls", table.nulls[name])):
+                path = os.path.join(temporary, f"{i:02d}.{suffix}.npy")
+                np.save(path, np.ascontiguousarray(array))
+                size += os.path.getsize(path)
+        meta = dict(meta, columns=list(table.columns), rows=len(table), bytes=size)
+        write_json(os.path.join(temporary, _META_FILE), meta)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(temporary, entry_dir)
+    except OSError:
+        #A full disk must not leave half an entry behind
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+    return size
+
+
+def _open_entry(entry_dir: str, meta: dict, columns: Optional[Sequence[str]]) -> TripTable:
+    #Memory-maps the requested columns, nothing is read until the arrays are used
+    positions = {name: i for i, name in enumerate(meta["columns"])}
+    wanted = meta["columns"] if columns is None else list(columns)
+    values, nulls = {}, {}
+    for name in wanted:
+        prefix = os.path.join(entry_dir, f"{positions[name]:02d}")
+        values[name] = np.load(f"{prefix}.values.npy", mmap_mode="r")
+        nulls[name] = np.load(f"{prefix}.nulls.npy", mmap_mode="r")
+    return TripTable(values, nulls)
+
+
+def _evict(cache_dir: str, index: Dict[str, dict], max_bytes: int, keep: str) -> None:
+    #Removes the least recently used datasets until the cache fits in max_bytes
+    total = sum(entry.get("bytes", 0) for entry in index.values())
+    for name in sorted(index, key=lambda n: index[n].get("last_used", 0)):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= index.pop(name).get("bytes", 0)
+
+
+@traced(rows=result_rows)
+def cached_load_trips(file_path: str, columns: Optional[Sequence[str]] = None,
+                      cache_dir: Optional[str] = None, max_bytes: int = DEFAULT_CACHE_BYTES) -> TripTable:
+    """
+    This function returns the same TripTable as load_trips, parsing the file only
+    the first time and memory-mapping the cached columns afterwards.
+
+    The cache of a file is rebuilt when its size, mtime and content hash no longer
+    match the source. Above max_bytes the least recently used datasets are evicted.
+
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :columns: The names of the columns to load, all of them if None
+    :cache_dir: Where the cache lives, a '.trip_cache' folder next to the file if None
+    :max_bytes: The size cap of the whole cache directory
+
+    @return: A TripTable whose arrays are read-only memory maps of the cache
+    """
+    from .trip_columnar import is_columnar
+    if is_columnar(file_path):
+        #Parquet and Arrow datasets are already typed columns, they are read directly
+        return load_trips(file_path, columns)
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(file_path)), CACHE_DIR_NAME)
+    name = _entry_name(file_path)
+    entry_dir = os.path.join(cache_dir, name)
+    stat = os.stat(file_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        meta = read_json(os.path.join(entry_dir, _META_FILE))
+
+        if meta and _is_fresh(meta, file_path, stat):
+            if meta["mtime_ns"] != stat.st_mtime_ns:
+                #Same content with a new mtime (e.g. the file was copied), only the key is refreshed
+                meta["mtime_ns"] = stat.st_mtime_ns
+                write_json(os.path.join(entry_dir, _META_FILE), meta)
+        else:
+            #Every column is cached so that any later projection is a hit
+            meta = {
+                "format": CACHE_FORMAT,
+                "source": os.path.abspath(file_path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "digest": file_digest(file_path),
+            }
+            meta["bytes"] = _save_entry(load_trips(file_path), entry_dir, meta)
+            meta = read_json(os.path.join(entry_dir, _META_FILE))
+
+        #Processes sharing the cache take turns on the index, so none loses the entries of another
+        with locked(os.path.join(cache_dir, _LOCK_FILE)):
+            index_path = os.path.join(cache_dir, _INDEX_FILE)
+            index = read_json(index_path)
+            index[name] = {"source": meta["source"], "bytes": meta["bytes"], "last_used": time.time()}
+            #Entries removed by hand are forgotten
+            index = {n: entry for n, entry in index.items() if os.path.isdir(os.path.join(cache_dir, n))}
+            _evict(cache_dir, index, max_bytes, keep=name)
+            write_json(index_path, index)
+    except OSError:
+        #The cache directory cannot be created or written, the file is parsed without it
+        return load_trips(file_path, columns)
+    return _open_entry(entry_dir, meta, columns)
@@ -0,0 +1,214 @@
+#Parquet and Arrow IPC (Feather) trip datasets
+#The same TripTable as the csv loader is built from a Parquet file, a directory of
+#Parquet files (e.g. partitioned by pickup month) or an Arrow IPC/Feather file.
+#Only the requested columns are read, and the predicates are handed to pyarrow so that
+#row groups whose statistics cannot match are skipped.
+#pyarrow is an optional dependency, imported only when such a dataset is used
+import os
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .profiling import result_rows, traced
+from .trip_loader import DEFAULT_BLOCK_ROWS, TRIP_SCHEMA, TripTable, load_trips
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+
+#Rows per Parquet row group written by the converter
+DEFAULT_ROW_GROUP_ROWS = 128 * 1024
+
+#Name of the partition column written by write_partitioned
+PARTITION_COLUMN = "pickup_month"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError("reading or writing Parquet/Arrow trip files needs pyarrow (pip install pyarrow)") from error
+    return pyarrow
+
+
+def is_columnar(file_path: str) -> bool:
+    """
+    True for a Parquet or Arrow IPC/Feather file, or a directory holding Parquet files.
+    """
+    if os.path.isdir(file_path):
+        return True
+    return file_path.lower().endswith(PARQUET_SUFFIXES + ARROW_SUFFIXES)
+
+
+def _dataset(file_path: str):
+    pa = _pyarrow()
+    if file_path.lower().endswith(ARROW_SUFFIXES):
+        return pa.dataset.dataset(file_path, format="ipc")
+    return pa.dataset.dataset(file_path, format="parquet", partitioning="hive")
+
+
+def _resolve_columns(schema_names: List[str], columns: Optional[Sequence[str]]) -> List[str]:
+    #Names of the dataset matching the requested trip columns; the published TLC files
+    #spell some of them differently (e.g. 'Airport_fee'), so the match ignores case
+    by_lower = {name.lower(): name for name in schema_names if name != PARTITION_COLUMN}
+    wanted = [name for name in schema_names if name != PARTITION_COLUMN] if columns is None else list(columns)
+    missing = [name for name in wanted if name.lower() not in by_lower]
+    if missing:
+        raise KeyError(f"columns {missing} are not in the dataset")
+    return [by_lower[name.lower()] for name in wanted]
+
+
+def _expression(schema_names: List[str], where: Sequence[tuple]):
+    #The scanner's (column, operator, value) predicates as one pyarrow expression
+    pa = _pyarrow()
+    expression = None
+    for name, op, value in where:
+        field = pa.dataset.field(_resolve_columns(schema_names, [name])[0])
+        if op == "in":
+            term = field.isin(list(value))
+        elif op == "not in":
+            term = ~field.isin(list(value))
+        else:
+            term = {"==": field == value, "!=": field != value, "<": field < value, "<=": field <= value,
+                    ">": field > value, ">=": field >= value}[op]
+        #Blank cells never match, as in the scanner
+        term = term & field.is_valid()
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def _to_numpy(array, kind) -> tuple:
+    #Converts one arrow column into (typed array, null mask) following TRIP_SCHEMA
+    pa = _pyarrow()
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks() if array.num_chunks != 1 else array.chunk(0)
+    nulls = array.is_null().to_numpy(zero_copy_only=False)
+    if kind == "timestamp":
+        if not pa.types.is_timestamp(array.type):
+            array = array.cast(pa.string())
+            from .trip_loader import parse_timestamps
+            values, text_nulls = parse_timestamps(array.fill_null("").to_numpy(zero_copy_only=False).astype(str))
+            return values, nulls | text_nulls
+        values = array.cast(pa.timestamp("us")).cast(pa.int64()).fill_null(0).to_numpy()
+        return values, nulls
+    if kind == "flag":
+        values = array.cast(pa.string()).fill_null("").to_numpy(zero_copy_only=False).astype("U1")
+        return values, nulls
+    dtype = np.dtype(kind)
+    placeholder = np.nan if dtype.kind == "f" else 0
+    values = array.cast(pa.float64()).fill_null(placeholder).to_numpy() if dtype.kind == "f" \
+        else array.fill_null(0).to_numpy(zero_copy_only=False)
+    return values.astype(dtype, copy=False), nulls
+
+
+def to_trip_table(table, columns: Sequence[str]) -> TripTable:
+    """
+    Converts a pyarrow Table into a TripTable with the given trip column names.
+    """
+    names = _resolve_columns(table.column_names, columns)
+    table_columns, table_nulls = {}, {}
+    for name, source in zip(columns, names):
+        table_columns[name], table_nulls[name] = _to_numpy(table.column(source), TRIP_SCHEMA.get(name, np.float64))
+    return TripTable(table_columns, table_nulls)
+
+
+def _columns(dataset, columns: Optional[Sequence[str]]) -> List[str]:
+    names = [name for name in dataset.schema.names if name != PARTITION_COLUMN]
+    return list(names) if columns is None else list(columns)
+
+
+@traced(rows=result_rows)
+def read_columnar(file_path: str, columns: Optional[Sequence[str]] = None, where: Sequence[tuple] = ()) -> TripTable:
+    """
+    This function loads a Parquet or Arrow dataset into a TripTable.
+
+    Parameters:
+    :file_path: A Parquet file, a directory of Parquet files or an Arrow IPC/Feather file
+    :columns: The names of the columns to load, all of them if None (only these are read)
+    :where: Predicates every returned row satisfies, as in trip_scanner.iter_scan;
+        row groups that cannot match are skipped using their statistics
+
+    @return: A TripTable with the same arrays and null masks the csv loader gives
+    """
+    dataset = _dataset(file_path)
+    wanted = _columns(dataset, columns)
+    table = dataset.to_table(columns=_resolve_columns(dataset.schema.names, wanted),
+                             filter=_expression(dataset.schema.names, where))
+    return to_trip_table(table, wanted)
+
+
+def iter_columnar_chunks(file_path: str, columns: Optional[Sequence[str]] = None, where: Sequence[tuple] = (),
+                         chunk_rows: int = DEFAULT_BLOCK_ROWS) -> Iterator[TripTable]:
+    """
+    Same as read_columnar, one TripTable of at most 'chunk_rows' rows at a time.
+    """
+    dataset = _dataset(file_path)
+    wanted = _columns(dataset, columns)
+    for batch in dataset.to_batches(columns=_resolve_columns(dataset.schema.names, wanted),
+                                    filter=_expression(dataset.schema.names, where), batch_size=chunk_rows):
+        if batch.num_rows:
+            yield to_trip_table(batch, wanted)
+
+
+def to_arrow(data: TripTable):
+    """
+    Converts a TripTable into a pyarrow Table, blank cells becoming nulls.
+    """
+    pa = _pyarrow()
+    arrays = []
+    for name, values in data.columns.items():
+        nulls = np.asarray(data.nulls[name])
+        kind = TRIP_SCHEMA.get(name, np.float64)
+        if kind == "timestamp":
+            array = pa.array(np.asarray(values, dtype=np.int64), mask=nulls).cast(pa.timestamp("us"))
+        elif kind == "flag":
+            array = pa.array(np.asarray(values, dtype=str), mask=nulls)
+        else:
+            array = pa.array(np.asarray(values), mask=nulls)
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, names=list(data.columns))
+
+
+def write_arrow(data: TripTable, file_path: str) -> None:
+    """
+    Writes a TripTable as an uncompressed Arrow IPC (Feather v2) file, which can be memory-mapped.
+    """
+    _pyarrow().feather.write_feather(to_arrow(data), file_path, compression="uncompressed")
+
+
+def write_partitioned(source: str, target_dir: str, row_group_rows: int = DEFAULT_ROW_GROUP_ROWS,
+                      compression: str = "zstd") -> List[str]:
+    """
+    This function converts a trip file (e.g. nyc_dataset_medium.txt) into Parquet
+    files partitioned by pickup month: target_dir/pickup_month=2022-07/part-0.parquet.
+
+    Parameters:
+    :source: The trip file, in any format load_trips reads
+    :target_dir: The directory of the dataset, created if needed; the months written replace
+        the ones already there
+    :row_group_rows: Rows per row group, the unit the readers can skip
+    :compression: The Parquet compression codec
+
+    @return: The paths of the files written
+    """
+    pa = _pyarrow()
+    data = load_trips(source)
+    table = to_arrow(data)
+    pickup = data["tpep_pickup_datetime"]
+    months = np.where(data.nulls["tpep_pickup_datetime"], "unknown",
+                      pickup.astype("datetime64[us]").astype("datetime64[M]").astype(str))
+    #The trips of a month keep their order in the source file; when the months are interleaved
+    #in the source the rows come back grouped by month (the exact sums of TripStats do not change)
+    table = table.append_column(PARTITION_COLUMN, pa.array(months))
+    written = []
+    pa.dataset.write_dataset(table, target_dir, format="parquet",
+                             partitioning=pa.dataset.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]),
+                                                                  flavor="hive"),
+                             existing_data_behavior="delete_matching", basename_template="part-{i}.parquet",
+                             max_rows_per_group=row_group_rows, min_rows_per_group=max(1, min(row_group_rows, len(table))),
+                             file_options=pa.dataset.ParquetFileFormat().make_write_options(compression=compression),
+                             file_visitor=lambda written_file: written.append(written_file.path))
+    return sorted(written)
@@ -0,0 +1,329 @@
+#Columnar loader for the nyc_dataset_*.txt trip files
+#Every column is parsed exactly once into a typed NumPy array, so the analyses
+#never have to call float()/strptime on the raw strings again
+import csv
+import warnings
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from .profiling import result_rows, traced
+
+#Storage type of every column of the trip files.
+#Amounts and distances are float64, location IDs int16, small codes int8 and
+#the two timestamps int64 microseconds since the epoch
+TRIP_SCHEMA = {
+    "VendorID": np.int8,
+    "tpep_pickup_datetime": "timestamp",
+    "tpep_dropoff_datetime": "timestamp",
+    "passenger_count": np.float64,
+    "trip_distance": np.float64,
+    "RatecodeID": np.float64,
+    "store_and_fwd_flag": "flag",
+    "PULocationID": np.int16,
+    "DOLocationID": np.int16,
+    "payment_type": np.int8,
+    "fare_amount": np.float64,
+    "extra": np.float64,
+    "mta_tax": np.float64,
+    "tip_amount": np.float64,
+    "tolls_amount": np.float64,
+    "improvement_surcharge": np.float64,
+    "total_amount": np.float64,
+    "congestion_surcharge": np.float64,
+    "airport_fee": np.float64,
+}
+
+#Number of rows converted at once, keeps the temporary string lists small
+DEFAULT_BLOCK_ROWS = 65536
+
+
+class TripTable:
+    """
+    Column store holding the parsed trips.
+
+    :columns: A dict mapping every column name to its typed NumPy array.
+    :nulls: A dict mapping every column name to a boolean array that is True
+        where the original cell was blank (or could not be parsed).
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], nulls: Dict[str, np.ndarray]):
+        self.columns = columns
+        self.nulls = nulls
+
+    def __len__(self) -> int:
+        for values in self.columns.values():
+            return len(values)
+        return 0
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def valid(self, name: str) -> np.ndarray:
+        """
+        Returns the values of a column without its null cells.
+        """
+        mask = self.nulls[name]
+        values = self.columns[name]
+        return values[~mask] if mask.any() else values
+
+    def take(self, rows: np.ndarray) -> "TripTable":
+        """
+        Returns a new TripTable holding only the given rows (a boolean mask or indices) of every column.
+        """
+        return TripTable({name: values[rows] for name, values in self.columns.items()},
+                         {name: mask[rows] for name, mask in self.nulls.items()})
+
+
+def _parse_column(values: Sequence[str], kind) -> tuple:
+    #Converts one column of raw strings, returning (array, null mask)
+    raw = np.array(values, dtype=str)
+    if kind == "flag":
+        return raw.astype("U1"), raw == ""
+    nulls = raw == ""
+    if kind == "timestamp":
+        return parse_timestamps(raw)
+    dtype = np.dtype(kind)
+    placeholder = "nan" if dtype.kind == "f" else "0"
+    try:
+        parsed = np.where(nulls, placeholder, raw).astype(dtype)
+    except (ValueError, OverflowError):
+        #Malformed cells (e.g. '1.0' in an integer column) are parsed one by one
+        parsed, nulls = _parse_slow(raw, float, dtype)
+    return parsed, nulls
+
+
+def _parse_slow(raw: np.ndarray, convert, dtype) -> tuple:
+    #Per-cell fallback used only when a whole column failed to convert,
+    #cells that still cannot be parsed become nulls
+    parsed = np.zeros(len(raw), dtype=dtype)
+    nulls = np.zeros(len(raw), dtype=bool)
+    for i, cell in enumerate(raw.tolist()):
+        try:
+            parsed[i] = convert(cell)
+        except (ValueError, OverflowError):
+            nulls[i] = True
+    return parsed, nulls
+
+
+def _to_epoch_us(cell: str) -> int:
+    with warnings.catch_warnings():
+        #Timezone suffixes are accepted as UTC
+        warnings.simplefilter("ignore")
+        value = np.datetime64(cell, "us")
+    if np.isnat(value):
+        raise ValueError(f"not a timestamp: {cell!r}")
+    return int(value.view(np.int64))
+
+
+def _digits(digits: np.ndarray, start: int, stop: int) -> np.ndarray:
+    #Integer value of the decimal digits between two character positions
+    weights = 10 ** np.arange(stop - start - 1, -1, -1, dtype=np.int64)
+    return digits[:, start:stop] @ weights
+
+
+def _days_from_civil(year: np.ndarray, month: np.ndarray, day: np.ndarray) -> np.ndarray:
+    #Days since 1970-01-01 of a proleptic Gregorian date (H. Hinnant's algorithm)
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def parse_timestamps(values: Sequence[str]) -> tuple:
+    """
+    This function parses a whole column of ISO timestamps at once
+    ('YYYY-MM-DDTHH:MM:SS.fff' in the trip files).
+
+    numpy's datetime64 conversion handles a clean column in one call. When a
+    column holds malformed cells the fixed-width fields of every cell are
+    sliced and validated together instead, so a single bad cell does not
+    send the whole column through a per-cell loop.
+
+    Parameters:
+    :values: The raw cells of the column
+
+    @return: The int64 microseconds since the epoch of every cell and the null mask,
+        True for blank or malformed cells
+    """
+    raw = np.asarray(values, dtype=str)
+    nulls = raw == ""
+    try:
+        #'NaT' is the blank placeholder understood by datetime64
+        parsed = np.where(nulls, "NaT", raw).astype("datetime64[us]").view(np.int64)
+    except ValueError:
+        return _parse_fixed_width(raw, nulls)
+    nulls = nulls | (parsed == np.iinfo(np.int64).min)
+    return np.where(nulls, 0, parsed), nulls
+
+
+def _parse_fixed_width(raw: np.ndarray, nulls: np.ndarray) -> tuple:
+    #Accepts 'YYYY-MM-DDTHH:MM:SS' or 'YYYY-MM-DD HH:MM:SS', optionally followed
+    #by up to 6 fraction digits, by slicing the character positions of all cells
+    n = len(raw)
+    parsed = np.zeros(n, dtype=np.int64)
+    width = raw.dtype.itemsize // 4
+    if width < 19:
+        #No cell is long enough to hold a timestamp, only the odd ones are parsed one by one
+        return _parse_timestamps_slow(raw, ~nulls, parsed, nulls)
+    #One row of unicode code points per cell, shorter cells are padded with 0
+    codes = raw.view(np.uint32).reshape(n, width)
+    digit_positions = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+    is_digit = (codes[:, digit_positions] >= 48) & (codes[:, digit_positions] <= 57)
+    fits = (is_digit.all(axis=1) & (codes[:, 4] == 45) & (codes[:, 7] == 45)
+            & ((codes[:, 10] == 84) | (codes[:, 10] == 32)) & (codes[:, 13] == 58) & (codes[:, 16] == 58))
+    fraction = 0
+    if width > 19:
+        #Optional '.ffffff', the digits missing on the right count as zeros
+        tail = codes[:, 20:min(width, 26)]
+        has_fraction = codes[:, 19] == 46
+        fits &= has_fraction | (codes[:, 19] == 0)
+        tail_digit = (tail >= 48) & (tail <= 57)
+        tail_blank = tail == 0
+        #The fraction digits must come first, then only padding
+        fits &= (tail_digit | tail_blank).all(axis=1) & ~(tail_blank[:, :-1] & tail_digit[:, 1:]).any(axis=1)
+        fits &= has_fraction | tail_blank.all(axis=1)
+        if width > 26:
+            fits &= (codes[:, 26:] == 0).all(axis=1)
+        tail_values = np.where(tail_digit, tail.astype(np.int64) - 48, 0)
+        fraction = tail_values @ (10 ** np.arange(5, 5 - tail.shape[1], -1, dtype=np.int64))
+
+    digits = codes[:, :19].astype(np.int64) - 48
+    year, month, day = _digits(digits, 0, 4), _digits(digits, 5, 7), _digits(digits, 8, 10)
+    hour, minute, second = _digits(digits, 11, 13), _digits(digits, 14, 16), _digits(digits, 17, 19)
+    #Day of the month checked against the length of that month
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])[np.clip(month, 0, 12)] + (leap & (month == 2))
+    fits &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days)
+    fits &= (hour < 24) & (minute < 60) & (second < 60)
+
+    days = _days_from_civil(year, month, day)
+    seconds = ((days * 24 + hour) * 60 + minute) * 60 + second
+    parsed = np.where(fits, seconds * 1_000_000 + fraction, 0)
+    #Cells with any other layout go through datetime64 one by one
+    odd = ~fits & ~nulls
+    if odd.any():
+        return _parse_timestamps_slow(raw, odd, parsed, nulls)
+    return parsed, nulls
+
+
+def _parse_timestamps_slow(raw: np.ndarray, odd: np.ndarray, parsed: np.ndarray, nulls: np.ndarray) -> tuple:
+    parsed = parsed.copy()
+    nulls = nulls.copy()
+    for i in np.flatnonzero(odd).tolist():
+        try:
+            parsed[i] = _to_epoch_us(raw[i])
+        except (ValueError, OverflowError):
+            nulls[i] = True
+    return parsed, nulls
+
+
+def iter_row_blocks(rows: Iterable[List[str]], block_rows: int) -> Iterator[List[List[str]]]:
+    #Groups the csv rows into lists of at most 'block_rows' rows
+    rows = iter(rows)
+    while True:
+        block = list(islice(rows, block_rows))
+        if not block:
+            return
+        yield block
+
+
+def parse_rows(rows: List[List[str]], header: List[str], columns: Optional[Sequence[str]] = None) -> TripTable:
+    """
+    This function converts a block of raw csv rows into a TripTable.
+
+    Parameters:
+    :rows: A list of rows, each one the list of strings produced by csv.reader
+    :header: The column names of the file, in file order
+    :columns: The columns to convert, all of them if None
+
+    @return: A TripTable with one typed array and one null mask per column
+    """
+    wanted = list(header) if columns is None else list(columns)
+    positions = {name: header.index(name) for name in wanted}
+    #Short rows are padded with blanks so that the transposition keeps every row
+    width = len(header)
+    if any(len(row) != width for row in rows):
+        rows = [(row + [""] * width)[:width] for row in rows]
+    transposed = list(zip(*rows)) if rows else [()] * width
+    table_columns, table_nulls = {}, {}
+    for name in wanted:
+        values, nulls = _parse_column(transposed[positions[name]], TRIP_SCHEMA.get(name, np.float64))
+        table_columns[name] = values
+        table_nulls[name] = nulls
+    return TripTable(table_columns, table_nulls)
+
+
+def concat_tables(tables: List[TripTable]) -> TripTable:
+    """
+    Concatenates TripTables with the same columns into a single one.
+    """
+    if len(tables) == 1:
+        return tables[0]
+    names = tables[0].columns.keys()
+    columns = {name: np.concatenate([t.columns[name] for t in tables]) for name in names}
+    nulls = {name: np.concatenate([t.nulls[name] for t in tables]) for name in names}
+    return TripTable(columns, nulls)
+
+
+def iter_trip_chunks(file_path: str, columns: Optional[Sequence[str]] = None,
+                     chunk_rows: int = DEFAULT_BLOCK_ROWS) -> Iterator[TripTable]:
+    """
+    This function reads the dataset in fixed-size chunks, so that memory stays
+    flat however large the file is. The file is memory-mapped and only the
+    requested columns are decoded (see trip_scanner.py).
+
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :columns: The names of the columns to load, all of them if None
+    :chunk_rows: The maximum number of rows of every chunk
+
+    @return: An iterator of TripTables, one per chunk, in file order
+    """
+    from .trip_scanner import scan_chunks
+    return scan_chunks(file_path, columns, chunk_rows=chunk_rows)
+
+
+def iter_csv_chunks(file_path: str, columns: Optional[Sequence[str]] = None,
+                    chunk_rows: int = DEFAULT_BLOCK_ROWS) -> Iterator[TripTable]:
+    """
+    Same as iter_trip_chunks, splitting every row with csv.reader. Kept as the
+    reference the scanner is checked and benchmarked against.
+    """
+    with open(file_path, "r", newline="") as dataset:
+        reader = csv.reader(dataset)
+        header = next(reader)
+        for block in iter_row_blocks(reader, chunk_rows):
+            yield parse_rows(block, header, columns)
+
+
+@traced(rows=result_rows)
+def load_trips(file_path: str, columns: Optional[Sequence[str]] = None,
+               block_rows: int = DEFAULT_BLOCK_ROWS) -> TripTable:
+    """
+    This function reads the dataset containing all the information about the
+    trips and parses every requested column once into a typed array.
+    Parquet and Arrow IPC/Feather datasets are read too (see trip_columnar.py).
+
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :columns: The names of the columns to load, all of them if None
+    :block_rows: How many rows are converted at once
+
+    @return: A TripTable with the parsed columns and their null masks
+    """
+    from .trip_columnar import is_columnar, read_columnar
+    if is_columnar(file_path):
+        return read_columnar(file_path, columns)
+    tables = list(iter_trip_chunks(file_path, columns, block_rows))
+    if not tables:
+        with open(file_path, "r", newline="") as dataset:
+            header = next(csv.reader(dataset))
+        return parse_rows([], header, columns)
+    return concat_tables(tables)
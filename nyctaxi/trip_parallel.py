@@ -0,0 +1,197 @@
+#Multi-core aggregation of a trip file
+#The file is split into newline-aligned byte ranges (shards), every shard is
+#parsed and aggregated in its own process and the partial results are merged
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .profiling import add_records, run_traced, traced, worker_settings
+from .trip_columnar import is_columnar
+from .trip_loader import DEFAULT_BLOCK_ROWS, TripTable
+from .trip_scanner import scan_chunks
+from .trip_stats import SPEED_COLUMNS, STATS_FIELDS, TripStats
+from .od_matrix import OD_COLUMNS, ZONE_SLOTS, od_matrix, to_nested_dict
+
+#Size of a shard, the shards only depend on the file and on this value so the
+#merged results are the same whatever the number of workers
+DEFAULT_SHARD_BYTES = 32 * 1024 * 1024
+
+#Columns a TripAggregates needs
+AGGREGATE_COLUMNS = tuple(dict.fromkeys(STATS_FIELDS + SPEED_COLUMNS + OD_COLUMNS))
+
+
+def shard_ranges(file_path: str, shard_bytes: int = DEFAULT_SHARD_BYTES) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    This function splits a trip file into byte ranges that start and end on a line boundary.
+
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :shard_bytes: The approximate size in bytes of every range
+
+    @return: The header of the file and the list of (start, end) byte offsets, header excluded
+    """
+    size = os.path.getsize(file_path)
+    ranges = []
+    with open(file_path, "rb") as f:
+        header = next(csv.reader([f.readline().decode()]))
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + shard_bytes, size))
+            #Move the boundary to the end of the line it falls in
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def trips_in_order(zone_counts: np.ndarray, first_seen: np.ndarray, zones: Dict[int, str]) -> Dict[str, int]:
+    """
+    Returns the number of trips of the requested zones, by zone name, in order of the
+    first trip of every zone (the dict of task1_project.count_trips).
+    """
+    trip_count = {}
+    for zone_id in np.argsort(first_seen, kind="stable").tolist():
+        if zone_counts[zone_id] > 0 and zone_id in zones:
+            zone_name = zones[zone_id]
+            trip_count[zone_name] = trip_count.get(zone_name, 0) + int(zone_counts[zone_id])
+    return trip_count
+
+
+class TripAggregates:
+    """
+    Mergeable aggregates of a set of trips: the statistics of calculate_stats and
+    calculate_speed, the number of trips per pickup zone and the pickup->dropoff matrix.
+
+    :stats: A TripStats
+    :zone_counts: Number of trips per pickup LocationID (array of ZONE_SLOTS)
+    :first_seen: Position of the first trip of every pickup zone, used to keep
+        count_trips in order of appearance
+    :od_matrix: Number of trips per (PULocationID, DOLocationID) pair
+    """
+
+    def __init__(self):
+        self.stats = TripStats(STATS_FIELDS, speed=True)
+        self.zone_counts = np.zeros(ZONE_SLOTS, dtype=np.int64)
+        self.first_seen = np.full(ZONE_SLOTS, np.iinfo(np.int64).max, dtype=np.int64)
+        self.od_matrix = np.zeros((ZONE_SLOTS, ZONE_SLOTS), dtype=np.int64)
+        self.rows = 0
+
+    def update(self, data: TripTable) -> "TripAggregates":
+        """
+        Folds in a chunk of trips that comes after the ones already aggregated.
+        """
+        self.stats.update(data)
+        pickup = data['PULocationID'].astype(np.int64)
+        known_pickup = ~data.nulls['PULocationID'] & (pickup >= 0) & (pickup < ZONE_SLOTS)
+
+        self.zone_counts += np.bincount(pickup[known_pickup], minlength=ZONE_SLOTS)
+        rows = np.flatnonzero(known_pickup)
+        zones, first = np.unique(pickup[rows], return_index=True)
+        self.first_seen[zones] = np.minimum(self.first_seen[zones], rows[first] + self.rows)
+
+        self.od_matrix += od_matrix(data)
+        self.rows += len(data)
+        return self
+
+    def merge(self, other: "TripAggregates") -> "TripAggregates":
+        """
+        Combines the aggregates of the trips that come after these ones in the file.
+        """
+        self.stats.merge(other.stats)
+        self.zone_counts += other.zone_counts
+        #Positions of 'other' are relative to its own first trip
+        shifted = np.where(other.zone_counts > 0, other.first_seen + self.rows, other.first_seen)
+        self.first_seen = np.minimum(self.first_seen, shifted)
+        self.od_matrix += other.od_matrix
+        self.rows += other.rows
+        return self
+
+    def count_trips(self, zones: Dict[int, str]) -> Dict[str, int]:
+        #Same dict as task1_project.count_trips
+        return trips_in_order(self.zone_counts, self.first_seen, zones)
+
+    def count_trips_by(self, catalog, by: str = "borough") -> Dict[str, int]:
+        #Trips leaving every borough (or service_zone) of a zones.ZoneCatalog
+        return catalog.group(self.zone_counts, by)
+
+    def graph_data(self, zone_names: Dict[str, str]) -> Dict[str, Dict[str, int]]:
+        #Same nested dict as task3_project.preparation_data
+        return to_nested_dict(self.od_matrix, zone_names)
+
+
+@traced(rows=lambda result, *args, **kwargs: result.rows)
+def aggregate_shard(file_path: str, start: Optional[int], end: Optional[int],
+                    block_rows: int = DEFAULT_BLOCK_ROWS) -> TripAggregates:
+    """
+    This function parses and aggregates the trips stored between two byte offsets of a file.
+
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :start: The offset of the first byte of the range (start of a line), None for the whole file
+    :end: The offset after the last byte of the range (end of a line), None for the whole file
+    :block_rows: How many rows are converted at once
+
+    @return: The TripAggregates of the range
+    """
+    result = TripAggregates()
+    for chunk in scan_chunks(file_path, AGGREGATE_COLUMNS, chunk_rows=block_rows, start=start, end=end):
+        result.update(chunk)
+    return result
+
+
+def _aggregate_shard_args(args) -> TripAggregates:
+    return aggregate_shard(*args)
+
+
+def _aggregate_shard_traced(args) -> tuple:
+    #Task of a worker process: the partial result and the stages it recorded
+    settings, task = args
+    return run_traced(settings, aggregate_shard, *task)
+
+
+def _merge_traced(partials) -> Iterator[TripAggregates]:
+    for partial, stages in partials:
+        add_records(stages)
+        yield partial
+
+
+@traced(rows=lambda result, *args, **kwargs: result.rows)
+def parallel_aggregate(file_path: str, workers: Optional[int] = None,
+                       shard_bytes: int = DEFAULT_SHARD_BYTES) -> TripAggregates:
+    """
+    This function aggregates a trip file using several processes.
+
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :workers: The number of worker processes, os.cpu_count() if None.
+        With 1 worker the shards are aggregated one after the other in this process
+    :shard_bytes: The approximate size in bytes of the range given to a worker at a time
+
+    @return: The merged TripAggregates of the whole file. The sums are exact (see trip_stats.exact_sum),
+        so for every shard size and number of workers they equal the serial calculate_stats/calculate_speed
+    """
+    if is_columnar(file_path):
+        #Parquet/Arrow datasets have no byte ranges to split, pyarrow decodes them on its own threads
+        return aggregate_shard(file_path, None, None)
+    _, ranges = shard_ranges(file_path, shard_bytes)
+    tasks = [(file_path, start, end) for start, end in ranges]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        partials = map(_aggregate_shard_args, tasks)
+        return _merge_in_order(partials)
+    settings = worker_settings()
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        #map() returns the shards in file order, so the first-seen order of the zones never changes
+        partials = pool.map(_aggregate_shard_traced, [(settings, task) for task in tasks])
+        return _merge_in_order(_merge_traced(partials))
+
+
+def _merge_in_order(partials) -> TripAggregates:
+    result = TripAggregates()
+    for partial in partials:
+        result.merge(partial)
+    return result
@@ -0,0 +1,193 @@
+#Order statistics of the trip columns without sorting them
+#Exact quantiles use selection (introselect through numpy.partition, O(n));
+#approximate ones use a KLL sketch, mergeable and of bounded size
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from .trip_loader import DEFAULT_BLOCK_ROWS, TripTable, iter_trip_chunks
+
+
+def select(values: np.ndarray, k: int) -> float:
+    """
+    Returns the k-th smallest value (0-based) of an array in O(n), without sorting it.
+    The input array is not modified.
+    """
+    values = np.asarray(values)
+    if not 0 <= k < len(values):
+        raise IndexError(f"k={k} out of range for {len(values)} values")
+    return np.partition(values, k)[k].item()
+
+
+def quantiles(values: np.ndarray, qs: Sequence[float]) -> list:
+    """
+    This function calculates exact quantiles by selection.
+
+    Parameters:
+    :values: The values, blank cells already left out
+    :qs: The quantiles wanted, each between 0 and 1 (0.5 is the median)
+
+    @return: One value per quantile, interpolated linearly between the two closest
+        order statistics (the same definition as numpy.quantile)
+    """
+    values = np.asarray(values)
+    if len(values) == 0:
+        return [0.0 for _ in qs]
+    positions = [q * (len(values) - 1) for q in qs]
+    #Every order statistic needed is placed in one partition call
+    kth = sorted({int(np.floor(p)) for p in positions} | {int(np.ceil(p)) for p in positions})
+    partitioned = np.partition(values, kth)
+    result = []
+    for position in positions:
+        below, above = int(np.floor(position)), int(np.ceil(position))
+        low, high = partitioned[below].item(), partitioned[above].item()
+        result.append(low + (high - low) * (position - below))
+    return result
+
+
+def median(values: np.ndarray) -> float:
+    return quantiles(values, [0.5])[0]
+
+
+def column_quantiles(data: TripTable, column: str, qs: Sequence[float] = (0.25, 0.5, 0.75)) -> list:
+    """
+    Exact quantiles of a trip column, its blank cells left out.
+    """
+    return quantiles(data.valid(column), qs)
+
+
+class KLLSketch:
+    """
+    KLL sketch (Karnin, Lang, Liberty 2016) for approximate quantiles of a stream.
+
+    The values are kept in levels; a level that grows beyond its capacity is sorted
+    and every other value is promoted to the next level, where each value stands for
+    twice as many. Memory stays below 3k values whatever the length of the stream;
+    the rank error is about 1.7/k, at most 3/k over the quantiles of a stream. Sketches of different chunks, files or months
+    can be combined with merge().
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        #Lower levels get geometrically smaller capacities (factor 2/3)
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values: np.ndarray) -> "KLLSketch":
+        """
+        Adds a chunk of values to the sketch.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return self
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate((self.levels[0], values))
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """
+        Combines another sketch into this one.
+        """
+        if other.count == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate((self.levels[level], items))
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(self.levels[level])
+                #An odd item stays behind so that the total weight is kept exactly
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                pairs = items[:len(items) - len(keep)]
+                promoted = pairs[self._rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+                #The capacities depend on the number of levels, start over from the bottom
+                level = 0
+                continue
+            level += 1
+
+    def _weighted(self) -> tuple:
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items_), 2 ** level, dtype=np.int64)
+                                  for level, items_ in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns an approximate q-quantile (q between 0 and 1).
+        """
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: Iterable[float]) -> list:
+        qs = list(qs)
+        if self.count == 0:
+            return [0.0 for _ in qs]
+        items, cumulative = self._weighted()
+        result = []
+        for q in qs:
+            if q <= 0:
+                result.append(self.min)
+            elif q >= 1:
+                result.append(self.max)
+            else:
+                index = int(np.searchsorted(cumulative, q * cumulative[-1], side="left"))
+                result.append(float(items[min(index, len(items) - 1)]))
+        return result
+
+    def rank(self, value: float) -> float:
+        """
+        Returns the approximate fraction of the values that are <= value.
+        """
+        if self.count == 0:
+            return 0.0
+        items, cumulative = self._weighted()
+        index = int(np.searchsorted(items, value, side="right"))
+        return float(cumulative[index - 1] / cumulative[-1]) if index else 0.0
+
+    def __len__(self) -> int:
+        #Number of values kept, not the number of values seen (see .count)
+        return sum(len(items) for items in self.levels)
+
+
+def stream_quantiles(file_path: str, columns: Sequence[str], k: int = 200,
+                     chunk_rows: int = DEFAULT_BLOCK_ROWS, seed: Optional[int] = 0) -> Dict[str, KLLSketch]:
+    """
+    This function reads a trip file in chunks and builds one KLL sketch per column.
+
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :columns: The trip columns to sketch
+    :k: Accuracy of the sketches, the rank error is about 1.7/k
+    :chunk_rows: The number of trips read at once
+    :seed: Seed of the random compactions, for reproducible results
+
+    @return: A dict mapping each column to its KLLSketch
+    """
+    sketches = {column: KLLSketch(k, seed) for column in columns}
+    for chunk in iter_trip_chunks(file_path, columns, chunk_rows):
+        for column, sketch in sketches.items():
+            sketch.update(chunk.valid(column))
+    return sketches
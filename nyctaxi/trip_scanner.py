@@ -0,0 +1,294 @@
+#Memory-mapped scanner of the trip files
+#The file is mapped, not read: newlines and commas of a whole block are located
+#with one comparison over its bytes, and only the requested columns are decoded,
+#straight from the bytes of their fields. Rows failing the predicates are dropped
+#before the other columns are converted. Blocks the fast path cannot handle
+#(quotes, rows with a different number of fields) go through csv.reader instead
+import csv
+import io
+import mmap
+import operator
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .profiling import result_rows, traced
+from .trip_loader import DEFAULT_BLOCK_ROWS, TRIP_SCHEMA, TripTable, _parse_column, parse_rows
+
+#Bytes of the file handled at a time
+DEFAULT_SCAN_BYTES = 8 * 1024 * 1024
+
+#Comparisons allowed in the predicates, e.g. ("PULocationID", "in", {1, 132}) or ("fare_amount", ">", 0)
+PREDICATE_OPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda values, allowed: np.isin(values, list(allowed)),
+    "not in": lambda values, allowed: ~np.isin(values, list(allowed)),
+}
+
+#A predicate is (column, operator, value); rows where the column is blank never match
+Predicate = Tuple[str, str, object]
+
+_NEWLINE, _COMMA, _QUOTE, _CR = ord("\n"), ord(","), ord('"'), ord("\r")
+_MINUS, _PLUS, _DOT, _ZERO = ord("-"), ord("+"), ord("."), ord("0")
+
+#Largest number of digits whose integer value is exact in a float64
+_MAX_EXACT_DIGITS = 15
+
+
+def _field_bytes(buffer: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    #One row of bytes per field, zero padded on the right
+    lengths = ends - starts
+    width = max(int(lengths.max()) if len(lengths) else 0, 1)
+    positions = np.arange(width)
+    inside = positions < lengths[:, None]
+    index = np.where(inside, starts[:, None] + positions, 0)
+    return np.where(inside, buffer[index], 0).astype(np.uint8)
+
+
+def _decode_number(buffer: np.ndarray, starts: np.ndarray, ends: np.ndarray, dtype: np.dtype) -> Optional[tuple]:
+    #Decodes integers and plain decimals ('-104.5', '0.27') from the bytes of their fields,
+    #one character position at a time for all the fields (Horner's rule).
+    #Returns None when a cell has any other form, the column is then parsed as strings.
+    #A decimal is rebuilt as (all its digits) / 10**(digits after the point): both are
+    #exact integers, so the division rounds like float() does on the text
+    lengths = ends - starts
+    nulls = lengths == 0
+    first = buffer[np.minimum(starts, len(buffer) - 1)] if len(buffer) else np.zeros(len(starts), dtype=np.uint8)
+    negative = ~nulls & (first == _MINUS)
+    signed = negative | (~nulls & (first == _PLUS))
+    integers = np.zeros(len(starts), dtype=np.int64)
+    digit_count = np.zeros(len(starts), dtype=np.int64)
+    fraction_digits = np.zeros(len(starts), dtype=np.int64)
+    seen_dot = np.zeros(len(starts), dtype=bool)
+    for position in range(int(lengths.max()) if len(lengths) else 0):
+        inside = (position < lengths) & ~(signed & (position == 0))
+        code = buffer[np.where(inside, starts + position, 0)]
+        is_digit = inside & (code >= _ZERO) & (code <= _ZERO + 9)
+        is_dot = inside & (code == _DOT)
+        if (inside & ~is_digit & ~is_dot).any() or (dtype.kind != "f" and is_dot.any()) or (is_dot & seen_dot).any():
+            return None
+        integers = np.where(is_digit, integers * 10 + (code.astype(np.int64) - _ZERO), integers)
+        digit_count += is_digit
+        fraction_digits += is_digit & seen_dot
+        seen_dot |= is_dot
+    if ((digit_count == 0) & ~nulls).any() or (digit_count > _MAX_EXACT_DIGITS).any():
+        return None
+    if dtype.kind == "f":
+        values = integers / 10.0 ** fraction_digits
+        values = np.where(negative, -values, values)
+        return np.where(nulls, np.nan, values).astype(dtype), nulls
+    values = np.where(negative, -integers, integers)
+    info = np.iinfo(dtype)
+    if ((values < info.min) | (values > info.max)).any():
+        return None
+    return np.where(nulls, 0, values).astype(dtype), nulls
+
+
+def _decode_column(buffer: np.ndarray, starts: np.ndarray, ends: np.ndarray, kind) -> tuple:
+    #Converts the fields of one column, returning (array, null mask) like the csv loader
+    if kind not in ("timestamp", "flag"):
+        decoded = _decode_number(buffer, starts, ends, np.dtype(kind))
+        if decoded is not None:
+            return decoded
+    #Anything else goes through the string parsers of trip_loader
+    codes = _field_bytes(buffer, starts, ends)
+    return _parse_column(codes.view(f"S{codes.shape[1]}").ravel().astype(str), kind)
+
+
+def _fast_block(buffer: np.ndarray, header: List[str], columns: Sequence[str],
+                where: Sequence[Predicate]) -> Optional[TripTable]:
+    #Fast path over the complete lines of 'buffer'; None if the block needs csv.reader
+    if (buffer == _QUOTE).any():
+        return None
+    line_ends = np.flatnonzero(buffer == _NEWLINE)
+    if len(buffer) and buffer[-1] != _NEWLINE:
+        line_ends = np.append(line_ends, len(buffer))
+    commas = np.flatnonzero(buffer == _COMMA)
+    width = len(header)
+    if len(commas) != len(line_ends) * (width - 1):
+        return None
+    line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+    commas = commas.reshape(len(line_ends), width - 1) if width > 1 else commas.reshape(len(line_ends), 0)
+    #Every row must hold exactly its own commas
+    if width > 1 and ((commas[:, 0] < line_starts).any() or (commas[:, -1] >= line_ends).any()):
+        return None
+    #Windows line endings: the carriage return is not part of the last field
+    last_ends = line_ends - (buffer[np.maximum(line_ends - 1, 0)] == _CR) * (line_ends > line_starts)
+
+    def bounds(position: int, rows) -> Tuple[np.ndarray, np.ndarray]:
+        start = line_starts[rows] if position == 0 else commas[rows, position - 1] + 1
+        end = last_ends[rows] if position == width - 1 else commas[rows, position]
+        return start, end
+
+    positions = {name: header.index(name) for name in header}
+    rows = slice(None)
+    decoded = {}
+    if where:
+        keep = np.ones(len(line_ends), dtype=bool)
+        for name, op, value in where:
+            if name not in decoded:
+                decoded[name] = _decode_column(buffer, *bounds(positions[name], rows), TRIP_SCHEMA.get(name, np.float64))
+            values, nulls = decoded[name]
+            keep &= ~nulls & PREDICATE_OPS[op](values, value)
+        rows = np.flatnonzero(keep)
+        decoded = {name: (values[rows], nulls[rows]) for name, (values, nulls) in decoded.items()}
+    table_columns, table_nulls = {}, {}
+    for name in columns:
+        if name not in decoded:
+            decoded[name] = _decode_column(buffer, *bounds(positions[name], rows), TRIP_SCHEMA.get(name, np.float64))
+        table_columns[name], table_nulls[name] = decoded[name]
+    return TripTable(table_columns, table_nulls)
+
+
+def _csv_block(buffer: np.ndarray, header: List[str], columns: Sequence[str],
+               where: Sequence[Predicate]) -> TripTable:
+    #Slow path of a block, with the same results as the csv loader
+    lines = io.StringIO(buffer.tobytes().decode(), newline="")
+    table = parse_rows(list(csv.reader(lines)), header, list(dict.fromkeys(list(columns) + [p[0] for p in where])))
+    return _filter(table, columns, where)
+
+
+def _filter(table: TripTable, columns: Sequence[str], where: Sequence[Predicate]) -> TripTable:
+    keep = np.ones(len(table), dtype=bool)
+    for name, op, value in where:
+        keep &= ~table.nulls[name] & PREDICATE_OPS[op](table[name], value)
+    if where:
+        return TripTable({name: table[name][keep] for name in columns},
+                         {name: table.nulls[name][keep] for name in columns})
+    return table
+
+
+def _check_predicates(where: Sequence[Predicate]) -> None:
+    for name, op, _ in where:
+        if op not in PREDICATE_OPS:
+            raise ValueError(f"unknown predicate operator {op!r}, expected one of {list(PREDICATE_OPS)}")
+
+
+def _scan_buffer(buffer: np.ndarray, header: List[str], columns: Sequence[str],
+                 where: Sequence[Predicate]) -> TripTable:
+    table = _fast_block(buffer, header, columns, where)
+    return table if table is not None else _csv_block(buffer, header, columns, where)
+
+
+def scan_block(block: bytes, header: List[str], columns: Optional[Sequence[str]] = None,
+               where: Sequence[Predicate] = ()) -> TripTable:
+    """
+    This function decodes a block of complete lines of a trip file (header excluded)
+    the way iter_scan decodes the blocks of a mapped file, e.g. for data that was
+    decompressed in memory.
+
+    Parameters:
+    :block: The bytes of the lines, the last one may lack its newline
+    :header: The column names of the file (see read_header)
+    :columns: The names of the columns to decode, all of them if None
+    :where: Predicates every returned row satisfies, as in iter_scan
+
+    @return: A TripTable with the rows of the block
+    """
+    _check_predicates(where)
+    columns = list(header) if columns is None else list(columns)
+    if not len(block):
+        return _filter(parse_rows([], header, list(dict.fromkeys(list(columns) + [p[0] for p in where]))),
+                       columns, where)
+    return _scan_buffer(np.frombuffer(block, dtype=np.uint8), header, columns, where)
+
+
+def read_header(file_path: str) -> Tuple[List[str], int]:
+    """
+    Returns the column names of a trip file and the offset of its first data row.
+    """
+    with open(file_path, "rb") as f:
+        line = f.readline()
+        return next(csv.reader([line.decode()])), f.tell()
+
+
+def iter_scan(file_path: str, columns: Optional[Sequence[str]] = None, where: Sequence[Predicate] = (),
+              start: Optional[int] = None, end: Optional[int] = None,
+              block_bytes: int = DEFAULT_SCAN_BYTES) -> Iterator[TripTable]:
+    """
+    This function scans a trip file through a memory map, block by block.
+
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :columns: The names of the columns to decode, all of them if None
+    :where: Predicates every returned row satisfies, e.g. [("PULocationID", "in", {1, 132, 74, 43})].
+        Their columns are decoded first and the other columns only for the matching rows
+    :start: The offset where the scan starts (start of a line), right after the header if None
+    :end: The offset where the scan stops (end of a line), the end of the file if None
+    :block_bytes: The approximate number of bytes decoded at a time
+
+    @return: An iterator of TripTables in file order, one per block
+    """
+    header, data_start = read_header(file_path)
+    columns = list(header) if columns is None else list(columns)
+    _check_predicates(where)
+    with open(file_path, "rb") as f:
+        size = f.seek(0, 2)
+        start = data_start if start is None else start
+        end = size if end is None else min(end, size)
+        if end <= start:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = block = np.frombuffer(mapped, dtype=np.uint8)
+            try:
+                position = start
+                while position < end:
+                    #The block is extended to the end of the line it stops in
+                    stop = min(position + block_bytes, end)
+                    if stop < end:
+                        newline = mapped.find(b"\n", stop - 1, end)
+                        stop = end if newline < 0 else newline + 1
+                    block = data[position:stop]
+                    yield _scan_buffer(block, header, columns, where)
+                    position = stop
+            finally:
+                #The map cannot be closed while views of it exist, also when the scan is stopped early
+                del data, block
+
+
+def scan_chunks(file_path: str, columns: Optional[Sequence[str]] = None, where: Sequence[Predicate] = (),
+                chunk_rows: int = DEFAULT_BLOCK_ROWS, start: Optional[int] = None,
+                end: Optional[int] = None) -> Iterator[TripTable]:
+    """
+    Same as iter_scan, with tables of at most 'chunk_rows' rows. Parquet and Arrow
+    datasets are read through trip_columnar.py (whole datasets only, no byte range).
+    """
+    from .trip_columnar import is_columnar, iter_columnar_chunks
+    if is_columnar(file_path):
+        if start is not None or end is not None:
+            raise ValueError("byte ranges only apply to csv trip files")
+        yield from iter_columnar_chunks(file_path, columns, where, chunk_rows)
+        return
+    block_bytes = max(chunk_rows * 128, 1 << 16)
+    for table in iter_scan(file_path, columns, where, start, end, block_bytes):
+        for first in range(0, len(table), chunk_rows):
+            yield TripTable({name: values[first:first + chunk_rows] for name, values in table.columns.items()},
+                            {name: nulls[first:first + chunk_rows] for name, nulls in table.nulls.items()})
+
+
+@traced(rows=result_rows)
+def scan_trips(file_path: str, columns: Optional[Sequence[str]] = None, where: Sequence[Predicate] = (),
+               block_bytes: int = DEFAULT_SCAN_BYTES) -> TripTable:
+    """
+    This function loads the requested columns of the rows matching the predicates
+    (see iter_scan) into a single TripTable. Parquet and Arrow datasets are read
+    through trip_columnar.py, with the predicates pushed down to their row groups.
+    """
+    from .trip_columnar import is_columnar, read_columnar
+    if is_columnar(file_path):
+        return read_columnar(file_path, columns, where)
+    tables = list(iter_scan(file_path, columns, where, block_bytes=block_bytes))
+    if not tables:
+        header, _ = read_header(file_path)
+        return _filter(parse_rows([], header, list(dict.fromkeys(list(columns or header) + [p[0] for p in where]))),
+                       columns or header, where)
+    if len(tables) == 1:
+        return tables[0]
+    names = tables[0].columns.keys()
+    return TripTable({name: np.concatenate([t.columns[name] for t in tables]) for name in names},
+                     {name: np.concatenate([t.nulls[name] for t in tables]) for name in names})
@@ -0,0 +1,337 @@
+#Streaming statistics over the trip files
+#Each chunk of trips is folded into small mergeable accumulators, so the memory
+#needed does not grow with the number of trips
+#The sums are kept exact and rounded once, so every split of the trips (chunks, shards,
+#files) gives the same averages. They are the exact averages up to that rounding and can
+#differ in the last digits from the value-by-value float sums of the original code
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .profiling import traced
+from .trip_loader import DEFAULT_BLOCK_ROWS, TripTable, iter_trip_chunks
+from .validation import Rule, ValidationReport, iter_validated, rule_columns
+
+#Fields summarised by calculate_stats
+STATS_FIELDS = ("passenger_count", "fare_amount", "total_amount", "tip_amount")
+
+#Columns needed to compute the speed of a trip
+SPEED_COLUMNS = ("tpep_pickup_datetime", "tpep_dropoff_datetime", "trip_distance")
+
+MILES_TO_KM = 1.60934
+
+
+#Every finite float64 is a whole number of units of 2**-_EXACT_SHIFT (its 53-bit mantissa shifted)
+_EXACT_SHIFT = 1126
+
+#Values summed at once by exact_sum; the partial sums of the mantissa halves stay below 2**53
+_EXACT_BLOCK = 1 << 25
+
+
+def exact_sum(values: np.ndarray) -> int:
+    """
+    Returns the exact sum of finite float64 values as an integer number of 2**-1126 units.
+    Exact sums can be added in any order and give the same total, whatever the chunks,
+    shards or files the values came from; exact_to_float rounds the total once.
+    """
+    total = 0
+    for first in range(0, len(values), _EXACT_BLOCK):
+        mantissa, exponent = np.frexp(np.asarray(values[first:first + _EXACT_BLOCK], dtype=np.float64))
+        #value = mantissa * 2**53 * 2**(exponent - 53), an integer times a power of two
+        mantissa = mantissa * 2.0 ** 53
+        shift = (exponent + (_EXACT_SHIFT - 53)).astype(np.int64)
+        #Halves of 27 and 26 bits, so the sums of every exponent are exact in float64
+        high = np.floor(mantissa / 2.0 ** 26)
+        low = mantissa - high * 2.0 ** 26
+        highs = np.bincount(shift, weights=high)
+        lows = np.bincount(shift, weights=low)
+        for position in np.flatnonzero(highs != 0).tolist():
+            total += int(highs[position]) << (position + 26)
+        for position in np.flatnonzero(lows != 0).tolist():
+            total += int(lows[position]) << position
+    return total
+
+
+def exact_to_float(total: int) -> float:
+    """
+    Rounds an exact sum of exact_sum to the nearest float.
+    """
+    try:
+        #int / int is correctly rounded
+        return total / (1 << _EXACT_SHIFT)
+    except OverflowError:
+        return float("inf") if total > 0 else float("-inf")
+
+
+class FieldAccumulator:
+    """
+    Running min, max, count, exact sum and Welford mean/variance of one field.
+
+    Accumulators of different chunks, shards, files or months can be combined
+    with merge(). The sum is kept exact (see exact_sum), so the average is the
+    same however the values were split and in whatever order the parts are merged.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.min = float('inf')
+        self.max = float('-inf')
+        #Exact sum of the finite values, and plain sum of the infinite or NaN ones
+        self.exact = 0
+        self.special = 0.0
+        self.mean = 0.0
+        #Sum of the squared distances from the mean (Welford)
+        self.m2 = 0.0
+
+    @property
+    def sum(self) -> float:
+        return exact_to_float(self.exact) + self.special
+
+    def update(self, values: np.ndarray) -> "FieldAccumulator":
+        """
+        Folds a chunk of values into the accumulator.
+        """
+        n = len(values)
+        if n == 0:
+            return self
+        chunk = FieldAccumulator()
+        chunk.count = n
+        chunk.min = float(values.min())
+        chunk.max = float(values.max())
+        chunk.mean = float(values.mean())
+        chunk.m2 = float(((values - chunk.mean) ** 2).sum())
+        finite = np.isfinite(values)
+        if finite.all():
+            chunk.exact = exact_sum(values)
+        else:
+            chunk.exact = exact_sum(values[finite])
+            chunk.special = float(values[~finite].sum())
+        return self.merge(chunk)
+
+    def merge(self, other: "FieldAccumulator") -> "FieldAccumulator":
+        """
+        Combines another accumulator into this one (Chan et al. update of the variance).
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.min, self.max = other.count, other.min, other.max
+            self.exact, self.special, self.mean, self.m2 = other.exact, other.special, other.mean, other.m2
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.exact += other.exact
+        self.special += other.special
+        self.count = count
+        return self
+
+    @property
+    def variance(self) -> float:
+        #Population variance, 0.0 until there are values
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return self.variance ** 0.5
+
+    def result(self, default=0.0) -> Dict[str, float]:
+        """
+        Returns the {'min', 'max', 'avg'} dict used by calculate_stats.
+        """
+        if self.count == 0:
+            return {"min": default, "max": default, "avg": default}
+        return {"min": self.min, "max": self.max, "avg": self.sum / self.count}
+
+
+class SpeedFilters:
+    """
+    Outlier filters applied to the trips before their speed is summarised.
+    Every filter left to None is switched off; the defaults keep every trip
+    lasting more than 0 seconds, as calculate_speed always did.
+
+    :min_duration_s: Trips lasting this many seconds or less are rejected
+    :max_duration_s: Trips lasting more than this many seconds are rejected
+    :min_distance_miles: Trips shorter than this distance are rejected
+    :max_speed_kmh: Trips faster than this speed are rejected
+    """
+
+    def __init__(self, min_duration_s: Optional[float] = 0.0, max_duration_s: Optional[float] = None,
+                 min_distance_miles: Optional[float] = None, max_speed_kmh: Optional[float] = None):
+        self.min_duration_s = min_duration_s
+        self.max_duration_s = max_duration_s
+        self.min_distance_miles = min_distance_miles
+        self.max_speed_kmh = max_speed_kmh
+
+    def masks(self, duration_s: np.ndarray, distance: np.ndarray, speed: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Returns, for every active filter, the boolean mask of the trips it rejects.
+        """
+        masks = {}
+        if self.min_duration_s is not None:
+            masks["non_positive_duration" if self.min_duration_s == 0 else "too_short"] = duration_s <= self.min_duration_s
+        if self.max_duration_s is not None:
+            masks["too_long"] = duration_s > self.max_duration_s
+        if self.min_distance_miles is not None:
+            masks["too_close"] = distance < self.min_distance_miles
+        if self.max_speed_kmh is not None:
+            #NaN speeds (zero duration) are left to the duration filters
+            masks["too_fast"] = speed > self.max_speed_kmh
+        return masks
+
+
+def trip_durations(data: TripTable) -> np.ndarray:
+    """
+    Returns the duration in seconds of every trip (meaningless where a timestamp is null).
+    """
+    #Timestamps are stored in microseconds
+    return (data['tpep_dropoff_datetime'] - data['tpep_pickup_datetime']) / 1e6
+
+
+def compute_speeds(data: TripTable, filters: Optional[SpeedFilters] = None,
+                   duration_s: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    This function calculates the speed in km/h of every trip of the table as array
+    operations, dropping the trips rejected by the filters.
+
+    Parameters:
+    :data: A TripTable holding the pickup timestamp, dropoff timestamp and distance in miles
+    :filters: The SpeedFilters to apply, SpeedFilters() if None
+    :duration_s: The duration of every trip in seconds when already computed (see trip_durations)
+
+    @return: The speed of every kept trip and a dict with the number of trips rejected
+        by each filter ('missing' counts blank or malformed cells); a trip can be
+        rejected by several filters at once
+    """
+    filters = filters or SpeedFilters()
+    missing = data.nulls['tpep_pickup_datetime'] | data.nulls['tpep_dropoff_datetime'] | data.nulls['trip_distance']
+    if duration_s is None:
+        duration_s = trip_durations(data)
+    duration_hours = duration_s / 3600
+    distance = data['trip_distance']
+    speed = np.full(len(distance), np.nan)
+    np.divide(distance * MILES_TO_KM, duration_hours, out=speed, where=duration_hours > 0)
+
+    rejected = missing.copy()
+    rejections = {"missing": int(missing.sum())}
+    for name, mask in filters.masks(duration_s, distance, speed).items():
+        mask &= ~missing
+        rejections[name] = int(mask.sum())
+        rejected |= mask
+    #Without a duration filter a trip of 0 seconds still has no speed
+    rejected |= np.isnan(speed)
+    return speed[~rejected], rejections
+
+
+def trip_speeds(data: TripTable, filters: Optional[SpeedFilters] = None) -> np.ndarray:
+    """
+    Returns the speed in km/h of every trip kept by the filters (see compute_speeds).
+    """
+    return compute_speeds(data, filters)[0]
+
+
+class TripStats:
+    """
+    Mergeable statistics of the trips: one FieldAccumulator per field of
+    STATS_FIELDS plus one for the speed of the trips.
+    """
+
+    def __init__(self, fields: Iterable[str] = STATS_FIELDS, speed: bool = True,
+                 speed_filters: Optional[SpeedFilters] = None):
+        self.fields = {key: FieldAccumulator() for key in fields}
+        self.speed = FieldAccumulator() if speed else None
+        self.speed_filters = speed_filters
+        #Number of trips rejected by each speed filter
+        self.speed_rejections = {}
+        self.rows = 0
+
+    def update(self, data: TripTable) -> "TripStats":
+        """
+        Folds a chunk of trips into the statistics.
+        """
+        self.rows += len(data)
+        for key, accumulator in self.fields.items():
+            accumulator.update(data.valid(key))
+        if self.speed is not None:
+            self.update_speeds(*compute_speeds(data, self.speed_filters))
+        return self
+
+    def update_speeds(self, speeds: np.ndarray, rejections: Dict[str, int]) -> "TripStats":
+        """
+        Folds in the speeds (and rejection counts) of a chunk already computed by compute_speeds.
+        """
+        self.speed.update(speeds)
+        self._count_rejections(rejections)
+        return self
+
+    def _count_rejections(self, rejections: Dict[str, int]) -> None:
+        for name, count in rejections.items():
+            self.speed_rejections[name] = self.speed_rejections.get(name, 0) + count
+
+    def merge(self, other: "TripStats") -> "TripStats":
+        """
+        Combines the statistics of another chunk, file or month into these.
+        """
+        self.rows += other.rows
+        for key, accumulator in other.fields.items():
+            self.fields.setdefault(key, FieldAccumulator()).merge(accumulator)
+        if other.speed is not None:
+            if self.speed is None:
+                self.speed = FieldAccumulator()
+            self.speed.merge(other.speed)
+            self._count_rejections(other.speed_rejections)
+        return self
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        #Same dict as calculate_stats
+        return {key: accumulator.result() for key, accumulator in self.fields.items()}
+
+    def speed_summary(self) -> Tuple:
+        #Same tuple as calculate_speed
+        summary = self.speed.result(default=0) if self.speed is not None else FieldAccumulator().result(default=0)
+        return "min speed:", summary["min"], "max speed:", summary["max"], "avg speed:", summary["avg"]
+
+    def columns(self) -> Tuple[str, ...]:
+        #Columns that have to be read from the trip file
+        needed = list(self.fields)
+        if self.speed is not None:
+            needed += [name for name in SPEED_COLUMNS if name not in needed]
+        return tuple(needed)
+
+
+@traced(rows=lambda result, *args, **kwargs: result.rows)
+def stream_stats(file_path: str, chunk_rows: int = DEFAULT_BLOCK_ROWS,
+                 fields: Iterable[str] = STATS_FIELDS, speed: bool = True,
+                 into: Optional[TripStats] = None,
+                 speed_filters: Optional[SpeedFilters] = None, rules: Optional[Sequence[Rule]] = None,
+                 report: Optional[ValidationReport] = None) -> TripStats:
+    """
+    This function computes the statistics of a trip file reading it in fixed-size
+    chunks, so that only one chunk is in memory at a time.
+
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :chunk_rows: The number of trips read at once
+    :fields: The fields to summarise
+    :speed: Whether to summarise the speed of the trips as well
+    :into: Optional TripStats of other files to merge the result into
+    :speed_filters: The outlier filters applied to the speeds, SpeedFilters() if None
+    :rules: Optional validation Rules (see validation.py); the trips they reject are left out
+    :report: Optional ValidationReport the rejection counts of the rules are added to
+
+    @return: A TripStats; .stats() and .speed_summary() give the same results as
+        calculate_stats and calculate_speed
+    """
+    result = TripStats(fields, speed, speed_filters)
+    columns = result.columns()
+    if rules:
+        chunks = iter_trip_chunks(file_path, tuple(dict.fromkeys(columns + rule_columns(rules))), chunk_rows)
+        chunks = iter_validated(chunks, rules, report)
+    else:
+        chunks = iter_trip_chunks(file_path, columns, chunk_rows)
+    for chunk in chunks:
+        result.update(chunk)
+    return into.merge(result) if into is not None else result
@@ -0,0 +1,231 @@
+#Data-quality rules of the trips
+#A rule names the columns it reads and returns, for a whole TripTable at once, the
+#mask of the trips it rejects. validate() evaluates every rule over the table and
+#keeps the trips no rule rejects, counting the rejections of each rule, so the
+#analyses run on the same cleaned trips without any per-row checks.
+#Rules are built with not_null, in_range, ordered and known_zone, or from a spec:
+#    {"fare_amount": {"min": 0}, "passenger_count": {"min": 0, "max": 9, "required": true},
+#     "PULocationID": {"required": true, "known_zone": true},
+#     "ordered": [["tpep_pickup_datetime", "tpep_dropoff_datetime"]]}
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .od_matrix import ZONE_SLOTS
+from .profiling import input_rows, traced
+from .trip_loader import TripTable
+
+
+class Rule:
+    """
+    A data-quality rule.
+
+    :name: The name its rejections are counted under
+    :columns: The columns it reads
+    :reject: Called with a TripTable, returns the boolean mask of the trips the rule rejects
+    """
+
+    def __init__(self, name: str, columns: Sequence[str], reject: Callable[[TripTable], np.ndarray]):
+        self.name = name
+        self.columns = tuple(columns)
+        self.reject = reject
+
+    def __repr__(self) -> str:
+        return f"Rule({self.name!r}, {list(self.columns)})"
+
+
+def not_null(column: str, name: Optional[str] = None) -> Rule:
+    """
+    Rejects the trips whose cell is blank or could not be parsed.
+    """
+    return Rule(name or f"missing_{column}", [column], lambda data: data.nulls[column].copy())
+
+
+def in_range(column: str, low: Optional[float] = None, high: Optional[float] = None,
+             name: Optional[str] = None) -> Rule:
+    """
+    Rejects the trips whose value is below 'low' or above 'high' (both included in the range,
+    None for no bound). Blank cells are left to not_null.
+    """
+    def reject(data: TripTable) -> np.ndarray:
+        values = data[column]
+        mask = np.zeros(len(values), dtype=bool)
+        if low is not None:
+            mask |= values < low
+        if high is not None:
+            mask |= values > high
+        return mask & ~data.nulls[column]
+    if name is None:
+        name = f"negative_{column}" if low == 0 and high is None else f"{column}_out_of_range"
+    return Rule(name, [column], reject)
+
+
+def ordered(before: str, after: str, name: Optional[str] = None) -> Rule:
+    """
+    Rejects the trips whose 'after' value is smaller than their 'before' value
+    (e.g. a dropoff before the pickup). Blank cells are left to not_null.
+    """
+    def reject(data: TripTable) -> np.ndarray:
+        return (data[after] < data[before]) & ~(data.nulls[before] | data.nulls[after])
+    return Rule(name or f"{after}_before_{before}", [before, after], reject)
+
+
+def known_zone(column: str, catalog=None, name: Optional[str] = None) -> Rule:
+    """
+    Rejects the trips whose LocationID is not in the zone catalog (see zones.py), or,
+    without a catalog, outside 1..ZONE_SLOTS-1. Blank cells are left to not_null.
+    """
+    if catalog is not None:
+        known = catalog.known
+    else:
+        known = np.ones(ZONE_SLOTS, dtype=bool)
+        known[0] = False
+
+    def reject(data: TripTable) -> np.ndarray:
+        ids = data[column].astype(np.int64)
+        inside = (ids >= 0) & (ids < len(known))
+        return ~(inside & known[np.where(inside, ids, 0)]) & ~data.nulls[column]
+    return Rule(name or f"unknown_{column}", [column], reject)
+
+
+def rules_from_spec(spec: Dict[str, object], catalog=None) -> List[Rule]:
+    """
+    This function builds the rules described by a dict (e.g. read from a JSON file).
+
+    Parameters:
+    :spec: {column: {"required": bool, "min": number, "max": number, "known_zone": bool}},
+        plus an optional "ordered" entry listing [before, after] column pairs
+    :catalog: The ZoneCatalog checked by "known_zone", LocationIDs 1..ZONE_SLOTS-1 if None
+
+    @return: The rules, in the order of the spec
+    """
+    rules = []
+    for column, checks in spec.items():
+        if column == "ordered":
+            rules += [ordered(before, after) for before, after in checks]
+            continue
+        unknown = set(checks) - {"required", "min", "max", "known_zone"}
+        if unknown:
+            raise ValueError(f"unknown checks {sorted(unknown)} for {column!r}")
+        if checks.get("required"):
+            rules.append(not_null(column))
+        if checks.get("min") is not None or checks.get("max") is not None:
+            rules.append(in_range(column, checks.get("min"), checks.get("max")))
+        if checks.get("known_zone"):
+            rules.append(known_zone(column, catalog))
+    return rules
+
+
+#Trips the analyses cannot use or that the TLC data dictionary rules out
+DEFAULT_RULES = (
+    not_null("tpep_pickup_datetime"),
+    not_null("tpep_dropoff_datetime"),
+    ordered("tpep_pickup_datetime", "tpep_dropoff_datetime", name="dropoff_before_pickup"),
+    not_null("PULocationID"),
+    not_null("DOLocationID"),
+    known_zone("PULocationID"),
+    known_zone("DOLocationID"),
+    in_range("passenger_count", 0, 9),
+    in_range("trip_distance", 0),
+    in_range("fare_amount", 0),
+    in_range("tip_amount", 0),
+    in_range("total_amount", 0),
+)
+
+
+def rule_columns(rules: Iterable[Rule]) -> Tuple[str, ...]:
+    """
+    Returns the columns the rules read, each one once.
+    """
+    return tuple(dict.fromkeys(column for rule in rules for column in rule.columns))
+
+
+class ValidationReport:
+    """
+    Outcome of the rules over one or more tables.
+
+    :rows: Trips checked
+    :kept: Trips no rule rejected
+    :rejections: Number of trips rejected by each rule (a trip can fail several rules)
+    :skipped: Rules not evaluated because the table lacked one of their columns
+    """
+
+    def __init__(self, rules: Iterable[Rule] = ()):
+        self.rows = 0
+        self.kept = 0
+        self.rejections = {rule.name: 0 for rule in rules}
+        self.skipped = []
+
+    @property
+    def rejected(self) -> int:
+        return self.rows - self.kept
+
+    def merge(self, other: "ValidationReport") -> "ValidationReport":
+        """
+        Adds the counts of another report (e.g. of the next chunk of the file).
+        """
+        self.rows += other.rows
+        self.kept += other.kept
+        for name, count in other.rejections.items():
+            self.rejections[name] = self.rejections.get(name, 0) + count
+        self.skipped += [name for name in other.skipped if name not in self.skipped]
+        return self
+
+    def as_dict(self) -> dict:
+        return {"rows": self.rows, "kept": self.kept, "rejected": self.rejected,
+                "rejections": dict(self.rejections), "skipped": list(self.skipped)}
+
+
+class Validation:
+    """
+    Result of validate(): the mask of the kept trips, the cleaned table and the report.
+
+    :keep: True for the trips no rule rejected
+    :clean: The TripTable of the kept trips (the table itself when nothing was rejected)
+    :report: The ValidationReport
+    """
+
+    def __init__(self, keep: np.ndarray, clean: TripTable, report: ValidationReport):
+        self.keep = keep
+        self.clean = clean
+        self.report = report
+
+
+@traced(rows=input_rows)
+def validate(data: TripTable, rules: Sequence[Rule] = DEFAULT_RULES) -> Validation:
+    """
+    This function evaluates every rule over the whole table, each as one array operation.
+
+    Parameters:
+    :data: A TripTable
+    :rules: The Rules to apply, DEFAULT_RULES if not given. Rules reading a column the
+        table does not hold are skipped and listed in the report
+
+    @return: A Validation holding the kept mask, the cleaned TripTable and the rejection counts
+    """
+    report = ValidationReport(rules)
+    keep = np.ones(len(data), dtype=bool)
+    for rule in rules:
+        if not all(column in data for column in rule.columns):
+            report.skipped.append(rule.name)
+            continue
+        rejected = rule.reject(data)
+        report.rejections[rule.name] += int(np.count_nonzero(rejected))
+        keep &= ~rejected
+    report.rows = len(data)
+    report.kept = int(np.count_nonzero(keep))
+    clean = data if report.kept == report.rows else data.take(keep)
+    return Validation(keep, clean, report)
+
+
+def iter_validated(chunks: Iterable[TripTable], rules: Sequence[Rule] = DEFAULT_RULES,
+                   report: Optional[ValidationReport] = None) -> Iterator[TripTable]:
+    """
+    Validates a stream of chunks (e.g. iter_trip_chunks), yielding the cleaned chunks
+    and adding their counts to 'report' when one is given.
+    """
+    for chunk in chunks:
+        result = validate(chunk, rules)
+        if report is not None:
+            report.merge(result.report)
+        yield result.clean
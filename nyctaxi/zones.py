@@ -0,0 +1,185 @@
+#Catalog of the taxi zones of the lookup csv (taxi+_zone_lookup.csv)
+#The file is read once with the csv module (its fields are quoted) into dense
+#arrays indexed by LocationID; borough and service_zone are stored as small
+#integer codes with their labels, so whole columns of LocationIDs are mapped
+#with one gather and per-zone results are grouped with one bincount
+import csv
+import os
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .od_matrix import ZONE_SLOTS
+
+DEFAULT_LOOKUP = "taxi+_zone_lookup.csv"
+
+#Attributes a catalog can group by
+GROUP_BY = ("borough", "service_zone")
+
+#Code of the LocationIDs missing from the lookup file
+NO_CODE = -1
+
+#Catalogs already read, keyed by path and checked against the size and mtime of the file
+_catalogs: Dict[str, tuple] = {}
+
+
+def _categorical(values: Sequence[str]) -> Tuple[np.ndarray, Tuple[str, ...]]:
+    #Codes of the values in order of first appearance, with the labels of the codes
+    labels = tuple(dict.fromkeys(values))
+    position = {label: code for code, label in enumerate(labels)}
+    return np.array([position[value] for value in values], dtype=np.int16), labels
+
+
+class ZoneCatalog:
+    """
+    The zones of a lookup file as dense arrays indexed by LocationID.
+
+    :names: Zone name of every LocationID ('' where the id is not in the file)
+    :known: True for the LocationIDs of the file
+    :borough_codes: Borough code of every LocationID (NO_CODE where unknown), a label of 'boroughs'
+    :service_zone_codes: Same for service_zone, labels in 'service_zones'
+    """
+
+    def __init__(self, location_ids: Sequence[int], names: Sequence[str], boroughs: Sequence[str],
+                 service_zones: Sequence[str]):
+        location_ids = np.asarray(location_ids, dtype=np.int64)
+        slots = max(ZONE_SLOTS, int(location_ids.max()) + 1 if len(location_ids) else 0)
+        self.ids = location_ids
+        self.known = np.zeros(slots, dtype=bool)
+        self.known[location_ids] = True
+        self.names = np.full(slots, "", dtype=object)
+        self.names[location_ids] = list(names)
+        borough_codes, self.boroughs = _categorical(boroughs)
+        service_codes, self.service_zones = _categorical(service_zones)
+        self.borough_codes = np.full(slots, NO_CODE, dtype=np.int16)
+        self.borough_codes[location_ids] = borough_codes
+        self.service_zone_codes = np.full(slots, NO_CODE, dtype=np.int16)
+        self.service_zone_codes[location_ids] = service_codes
+
+    @classmethod
+    def read(cls, lookup_file: str = DEFAULT_LOOKUP) -> "ZoneCatalog":
+        """
+        Reads a lookup csv with the columns LocationID, Borough, Zone and service_zone.
+        """
+        with open(lookup_file, "r", newline="") as f:
+            rows = [row for row in csv.DictReader(f) if row["LocationID"].strip().isdigit()]
+        return cls([int(row["LocationID"]) for row in rows], [row["Zone"] for row in rows],
+                   [row["Borough"] for row in rows], [row["service_zone"] for row in rows])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _slots(self, location_ids) -> Tuple[np.ndarray, np.ndarray]:
+        #LocationIDs as array positions, with the mask of the ones in the catalog
+        location_ids = np.asarray(location_ids, dtype=np.int64)
+        inside = (location_ids >= 0) & (location_ids < len(self.known))
+        slots = np.where(inside, location_ids, 0)
+        return slots, inside & self.known[slots]
+
+    def codes(self, by: str) -> Tuple[np.ndarray, Tuple[str, ...]]:
+        """
+        Returns the code of every LocationID for 'borough' or 'service_zone', with the labels of the codes.
+        """
+        if by == "borough":
+            return self.borough_codes, self.boroughs
+        if by == "service_zone":
+            return self.service_zone_codes, self.service_zones
+        raise ValueError(f"unknown zone attribute {by!r}, expected one of {list(GROUP_BY)}")
+
+    def name_of(self, location_ids, default: str = "") -> np.ndarray:
+        """
+        Returns the zone names of an array of LocationIDs ('default' for the unknown ones).
+        """
+        slots, found = self._slots(location_ids)
+        return np.where(found, self.names[slots], default)
+
+    def code_of(self, location_ids, by: str = "borough") -> np.ndarray:
+        """
+        Returns the borough (or service_zone) codes of an array of LocationIDs, NO_CODE for the unknown ones.
+        """
+        codes, _ = self.codes(by)
+        slots, found = self._slots(location_ids)
+        return np.where(found, codes[slots], NO_CODE)
+
+    def borough_of(self, location_ids, default: str = "") -> np.ndarray:
+        """
+        Returns the borough names of an array of LocationIDs ('default' for the unknown ones).
+        """
+        #NO_CODE (-1) picks the last label, the default
+        labels = np.array(self.boroughs + (default,), dtype=object)
+        return labels[self.code_of(location_ids, "borough")]
+
+    def service_zone_of(self, location_ids, default: str = "") -> np.ndarray:
+        """
+        Returns the service_zone of an array of LocationIDs ('default' for the unknown ones).
+        """
+        labels = np.array(self.service_zones + (default,), dtype=object)
+        return labels[self.code_of(location_ids, "service_zone")]
+
+    def names_dict(self, location_ids: Optional[Iterable[int]] = None) -> Dict[int, str]:
+        """
+        Returns {LocationID: zone name} for the given ids (all of the catalog if None),
+        in the order they are given. Ids missing from the file are left out.
+        """
+        location_ids = self.ids.tolist() if location_ids is None else list(location_ids)
+        return {zone_id: self.names[zone_id] for zone_id in location_ids
+                if 0 <= zone_id < len(self.known) and self.known[zone_id]}
+
+    def group(self, per_zone: np.ndarray, by: str = "borough") -> Dict[str, float]:
+        """
+        This function adds up a result computed per LocationID (e.g. the trips per
+        pickup zone) by borough or service_zone. The trips themselves are not touched
+        again: the per-zone array is folded with one bincount over the codes.
+
+        Parameters:
+        :per_zone: An array indexed by LocationID (e.g. TripAggregates.zone_counts)
+        :by: 'borough' or 'service_zone'
+
+        @return: {label: total}, the labels in the order of the lookup file; the
+            LocationIDs missing from the file are left out
+        """
+        codes, labels = self.codes(by)
+        per_zone = np.asarray(per_zone)
+        size = min(len(per_zone), len(codes))
+        known = codes[:size] != NO_CODE
+        totals = np.bincount(codes[:size][known], weights=per_zone[:size][known], minlength=len(labels))
+        if per_zone.dtype.kind in "iub":
+            totals = totals.astype(np.int64)
+        return dict(zip(labels, totals.tolist()))
+
+    def group_matrix(self, matrix: np.ndarray, by: str = "borough") -> Tuple[np.ndarray, Tuple[str, ...]]:
+        """
+        Folds a pickup x dropoff matrix indexed by LocationID (see od_matrix.py) into a
+        square matrix indexed by borough (or service_zone) codes.
+
+        @return: The grouped matrix and the labels of its rows and columns
+        """
+        codes, labels = self.codes(by)
+        size = min(len(matrix), len(codes))
+        known = np.flatnonzero(codes[:size] != NO_CODE)
+        rows = codes[known].astype(np.int64)
+        cells = (rows[:, None] * len(labels) + rows[None, :]).ravel()
+        values = np.asarray(matrix)[np.ix_(known, known)].ravel()
+        grouped = np.bincount(cells, weights=values, minlength=len(labels) ** 2)
+        if np.asarray(matrix).dtype.kind in "iub":
+            grouped = grouped.astype(np.int64)
+        return grouped.reshape(len(labels), len(labels)), labels
+
+
+def load_catalog(lookup_file: str = DEFAULT_LOOKUP) -> ZoneCatalog:
+    """
+    This function returns the ZoneCatalog of a lookup file, reading the file only the
+    first time; it is read again if its size or modification time changed.
+
+    Parameters:
+    :lookup_file: The path of the zone lookup csv
+
+    @return: The shared ZoneCatalog of the file (it should not be modified)
+    """
+    path = os.path.abspath(lookup_file)
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _catalogs.get(path)
+    if cached is None or cached[0] != key:
+        cached = _catalogs[path] = (key, ZoneCatalog.read(path))
+    return cached[1]
@@ -1,9 +1,18 @@
 # Luiss - Management and Computer Science - Algorithm 2022/2023 
 # Please fill the empty parts with your solution
-from typing import Tuple, List, Dict
-import csv
-
-def read_file(file_path: str) -> any:
+from typing import Tuple, Dict
+import numpy as np
+from nyctaxi.trip_loader import TripTable
+from nyctaxi.trip_cache import cached_load_trips
+from nyctaxi.trip_stats import STATS_FIELDS, SpeedFilters, TripStats
+from nyctaxi.trip_parallel import parallel_aggregate
+from nyctaxi.trip_scanner import scan_trips
+from nyctaxi.zones import ZoneCatalog, load_catalog
+from nyctaxi.analysis_plan import StatsAnalysis, SpeedAnalysis, TripCountAnalysis, run
+from nyctaxi.profiling import input_rows, result_rows, traced
+
+@traced(rows=result_rows)
+def read_file(file_path: str) -> TripTable:
     """
     This function reads the dataset containg all the information about the 
     trips. The information are stored in a .txt file.
@@ -16,159 +25,172 @@ def read_file(file_path: str) -> any:
 
     # TODO: Implement here your solution
    
-    with open(file_path, "r") as dataset:
-        #Initilaize 'csv.DictReader' that converts every line into a dict.
-        #Keys of the dict are obtained from the first row
-        csv_reader = csv.DictReader(dataset) 
-        #List comperhension
-        #each row is added to the list 'data' as a dictionary.
-        data = [row for row in csv_reader]
-    return data
+    #Every column is parsed once into a typed array (see nyctaxi/trip_loader.py),
+    #blank cells are reported in the null masks of the table.
+    #The parsed columns are cached next to the file and memory-mapped on later runs (see nyctaxi/trip_cache.py)
+    #Parquet and Arrow datasets (see nyctaxi/trip_columnar.py) are read the same way
+    return cached_load_trips(file_path)
 
 
 
-def calculate_stats(data: List[Tuple[int, float, float, float]]) -> Tuple[float, float, float]:
+@traced(rows=input_rows)
+def calculate_stats(data: TripTable) -> Dict[str, Dict[str, float]]:
     """
     This function calculates the minimum, maximum, and average values for the number of passengers, fare amount,
     total amount, and tips amount.
     
     Parameters:
-    :data: The data structure used to calculate the statistics. It is a list of tuples, where each tuple contains
-        the number of passengers, fare amount, total amount, and tips amount.
-        An int representing the number of passengers,
-        A float representing the fare amount,
-        Another float representing the total amount, and
-        A float representing the tips amount.
-    If any error occurs, return the default value (0.0, 0.0, 0.0)
-    @return: A tuple containing the minimum, maximum, and average values for the specified statistics in $ where needed.
+    :data: The data structure used to calculate the statistics. It is the TripTable returned by read_file, holding
+        the number of passengers, fare amount, total amount, and tips amount as float columns.
+    If a column has no valid entries, return the default values 0.0 for it
+    @return: A dict containing the minimum, maximum, and average values for the specified statistics in $ where needed.
     """
     #TODO: Implement here your solution
-    #Initialize a dictionary for specified fields
-    stats = {
-        "passenger_count": {"min": float('inf'), "max": float('-inf'), "sum": 0, "count": 0},
-        "fare_amount": {"min": float('inf'), "max": float('-inf'), "sum": 0, "count": 0},
-        "total_amount": {"min": float('inf'), "max": float('-inf'), "sum": 0, "count": 0},
-        "tip_amount": {"min": float('inf'), "max": float('-inf'), "sum": 0, "count": 0},
-    }
-    #Double for loop for each row and each key in the dataset
-    for row in data:
-        for key in stats.keys():
-            try:
-                #Attempt
-                #Convert current value on the row to a float 
-                value = float(row[key])
-                #Update min and  max
-                stats[key]["min"] = min(stats[key]["min"], value)
-                stats[key]["max"] = max(stats[key]["max"], value)
-                #Increment the sum and count for the key by the current value and 1
-                stats[key]["sum"] += value
-                stats[key]["count"] += 1
-                 # In case of error (if conversion to float fails) skip value and continue with the next
-            except ValueError:
-                continue  
-
-    #Once all rows have been processed, iterate through the keys in stats again
-    for key in stats.keys():
-        #If the count for the key is greater than 0, calculate the average
-        if stats[key]["count"] > 0:
-            avg = stats[key]["sum"] / stats[key]["count"]
-            #Update the stats dictionary for the key
-            stats[key] = {"min": stats[key]["min"], "max": stats[key]["max"], "avg": avg}
-        else:
-            #Set min, max, and avg to 0.0, indicating no valid entries were found
-            stats[key] = {"min": 0.0, "max": 0.0, "avg": 0.0}
-    #Return the updated stats dictionary
-    return stats
+    #Blank cells are left out, as the conversion to float used to skip them.
+    #The accumulators (see nyctaxi/trip_stats.py) also back the chunked stream_stats
+    #The sums are exact and rounded once, so the averages can differ from the former running
+    #float sums in the last digits (e.g. 14.77839 instead of 14.778389999999987)
+    summary = TripStats(STATS_FIELDS, speed=False).update(data)
+    #If a field has no valid entries its min, max and avg are 0.0
+    return summary.stats()
 
 
 #Create a function that calculate the speed of a trip in Kmh and calculate same metrics as before
-from datetime import datetime
 
-def calculate_speed(data: List[Tuple[str, str, float]]) -> Tuple[float, float, float]:
+@traced(rows=input_rows)
+def calculate_speed(data: TripTable, filters: SpeedFilters = None) -> Tuple[float, float, float]:
     """
     This function calculates the minimum, maximum, and average speed of trips.
     
     Parameters:
-    :data: The data structure used to calculate the statistics. It is a list of tuples, where each tuple contains
+    :data: The data structure used to calculate the statistics. It is the TripTable returned by read_file, holding
         the pickup timestamp, dropoff timestamp, and distance of the trip in miles.
+    :filters: Optional outlier filters (e.g. SpeedFilters(max_speed_kmh=200)), by default only the trips
+        lasting 0 seconds or less are left out. trip_stats.compute_speeds reports how many trips each filter rejected.
     
     @return: A tuple containing the minimum, maximum, and average speed for the trips in kmh.
     """
-    #Initializing list
-    speeds = [] 
-    
-    for trip in data:
-        #Parse pick up and drop off times
-        pickup_time = datetime.strptime(trip['tpep_pickup_datetime'], "%Y-%m-%dT%H:%M:%S.%f")
-        dropoff_time = datetime.strptime(trip['tpep_dropoff_datetime'], "%Y-%m-%dT%H:%M:%S.%f")
-        distance_miles = float(trip['trip_distance'])
-        
-        #Calculating number of hourse from the drop off and pick up times
-        duration_hours = (dropoff_time - pickup_time).total_seconds() / 3600
-        
-        #If the duration of hours is grearter than 0, claculate the distance for km/h
-        if duration_hours > 0:
-            speed_kmh = (distance_miles * 1.60934) / duration_hours
-            speeds.append(speed_kmh)
-    
-    #Assign variables for print
-    #Default values ('0') are allocated to avoid errors
-    min_speed = min(speeds) if speeds else 0
-    max_speed = max(speeds) if speeds else 0
-    avg_speed = sum(speeds) / len(speeds) if speeds else 0
+    #Speed in km/h of every trip kept by the filters, computed for all trips at once (see nyctaxi.trip_stats.compute_speeds)
+    summary = TripStats(fields=(), speed=True, speed_filters=filters).update(data)
     
-    return "min speed:",min_speed, "max speed:",max_speed, "avg speed:",avg_speed
+    #Default values ('0') are allocated to avoid errors
+    return summary.speed_summary()
    
 
 #Count the number of trips outgoing from the following pickup zones: 1 (Newark), 132 (JFK Airport), 74 (East Harlem Manhattan), 43 (Central Park) 
 #the zones should be expressed in plain text rather than their codified version, you will have CSV with all the codes and their respective zone
-from typing import List, Dict
-
-def count_trips(data: List[int], zones: Dict[int, str]) -> Dict[str, int]:
+@traced(rows=input_rows)
+def count_trips(data: TripTable, zones: Dict[int, str]) -> Dict[str, int]:
     
     """
     This function counts the number of trips outgoing from the specified pickup zones.
     
     Parameters:
-    :data: The data structure used to calculate the statistics. It is a list of integers, where each integer represents
-           the pickup zone ID for a trip.
+    :data: The data structure used to calculate the statistics. It is the TripTable returned by read_file, whose
+           'PULocationID' column holds the pickup zone ID of every trip.
     :zones: A dictionary containing the mapping between the zone code and the zone name.
     
     @return: A dictionary containing the number of trips for each specified zone name.
     """
+    #Pickup zone of every trip that has one
+    zone_ids = data.valid('PULocationID')
+    #Distinct zones, the position where each one first appears and its number of trips
+    found, first_seen, counts = np.unique(zone_ids, return_index=True, return_counts=True)
+
     #Initilizing an empty dictionary
     trip_count = {}
-
-    for row in data:
-        #Extracting and converting 'PULocationID' into an integer if exists
-        zone_id = int(row['PULocationID']) if 'PULocationID' in row and row['PULocationID'].isdigit() else None
-        #Check if the extracted zone_id is in the predefined list of zones
+    #Zones are visited in order of first appearance, like a scan over the trips would
+    for i in np.argsort(first_seen):
+        zone_id = int(found[i])
+        #Check if the zone_id is in the predefined list of zones
         if zone_id in zones:
             #If yes retrieve the zone name using the zone_id from the zones mapping
             zone_name = zones[zone_id]
             # Update the trip count
-            #If zone doesn't exist in the dict, add it to the dict and add 1
-            #If zone exists, add 1
-            trip_count[zone_name] = trip_count.get(zone_name, 0) + 1
+            trip_count[zone_name] = trip_count.get(zone_name, 0) + int(counts[i])
     return trip_count
    
-file_path = 'nyc_dataset_small.txt'  #Change according to the desired dataset to be analysed
+@traced(rows=input_rows)
+def count_trips_by(data: TripTable, catalog: ZoneCatalog, by: str = 'borough') -> Dict[str, int]:
+    """
+    This function counts the number of trips outgoing from every borough (or service zone).
+    
+    Parameters:
+    :data: The TripTable returned by read_file
+    :catalog: The zones of the lookup file, see nyctaxi.zones.load_catalog
+    :by: 'borough' or 'service_zone'
+    
+    @return: A dictionary containing the number of trips for each borough (or service zone).
+    """
+    #The trips are counted per zone ID once, the counts of the zones are then added per borough
+    counts = np.bincount(data.valid('PULocationID').astype(np.int64), minlength=len(catalog.known))
+    return catalog.group(counts, by)
+   
+@traced()
+def count_trips_in_file(file_path: str, zones: Dict[int, str]) -> Dict[str, int]:
+    """
+    This function returns the same dictionary as count_trips straight from a trip file.
+    Only the 'PULocationID' column is decoded and the trips leaving other zones are
+    dropped while scanning (see nyctaxi/trip_scanner.py), the rest of the row is never parsed.
+    
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :zones: A dictionary containing the mapping between the zone code and the zone name.
+    
+    @return: A dictionary containing the number of trips for each specified zone name.
+    """
+    pickups = scan_trips(file_path, ['PULocationID'], where=[('PULocationID', 'in', set(zones))])
+    return count_trips(pickups, zones)
+   
+def analyse_in_parallel(file_path: str, zones: Dict[int, str], workers: int = None) -> tuple:
+    """
+    This function computes calculate_stats, calculate_speed and count_trips in a single
+    pass over the file, using several processes (see nyctaxi/trip_parallel.py).
+    
+    Parameters:
+    :file_path: The current path where the file you want to read is located
+    :zones: A dictionary containing the mapping between the zone code and the zone name.
+    :workers: The number of processes, one per core if None
+    
+    @return: The stats dict, the speed tuple and the trip count dict
+    """
+    result = parallel_aggregate(file_path, workers=workers)
+    return result.stats.stats(), result.stats.speed_summary(), result.count_trips(zones)
+
+def analyse_in_one_pass(data, zones: Dict[int, str]) -> tuple:
+    """
+    This function computes calculate_stats, calculate_speed and count_trips together, reading
+    every column they need only once (see nyctaxi/analysis_plan.py). The results are memoized,
+    so asking again for the same file or TripTable does not read it again.
+    
+    Parameters:
+    :data: The TripTable returned by read_file, or the path of the trip file
+    :zones: A dictionary containing the mapping between the zone code and the zone name.
+    
+    @return: The stats dict, the speed tuple and the trip count dict
+    """
+    results = run(data, [StatsAnalysis(), SpeedAnalysis(), TripCountAnalysis(zones)])
+    return results['stats'], results['speed'], results['trips']
+
+
+if __name__ == "__main__":
+    file_path = 'nyc_dataset_small.txt'  #Change according to the desired dataset to be analysed
+    #Set NYCTAXI_TRACE=trace.json to record the time and rows of every stage (see nyctaxi/profiling.py)
 
-content = read_file(file_path) #Call for read_file
+    content = read_file(file_path) #Call for read_file
+    #Uncomment to drop the trips failing the data-quality rules (see nyctaxi/validation.py)
+    #from nyctaxi.validation import validate
+    #content = validate(content).clean
 
-stats = calculate_stats(content) #Call for calculate_stats
+    stats = calculate_stats(content) #Call for calculate_stats
 
-speed = calculate_speed(content) #Call for calculate_speed
+    speed = calculate_speed(content) #Call for calculate_speed
 
-zone = {
-    1: "Newark",
-    132: "JFK Airport",
-    74: "East Harlem Manhattan",
-    43: "Central Park",
-} #data for 'zones' @ count_trips
-trips = count_trips(content, zone) #Call for count_trips
+    zone = load_catalog('taxi+_zone_lookup.csv').names_dict([1, 132, 74, 43]) #data for 'zones' @ count_trips, named as in the lookup file
+    trips = count_trips(content, zone) #Call for count_trips
+    #stats, speed, trips = analyse_in_one_pass(file_path, zone) #Uncomment to get the three results with a single read of the file
 
-'''Uncomment to print desired algorithm'''
-#print(stats) 
-#print(speed)
-#print(trips)
+    '''Uncomment to print desired algorithm'''
+    #print(stats) 
+    #print(speed)
+    #print(trips)
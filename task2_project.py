@@ -1,52 +1,34 @@
-
-import csv 
-import time 
-import random
-from typing import Tuple, List, Dict
-import matplotlib.pyplot as plt
-
-def read_file(file_path: str) -> any: 
-    data = [] 
-    with open(file_path, 'r') as file:
-        csv_reader = csv.DictReader(file)
-        for row in csv_reader:
-            data.append(row)
-    return data
+from typing import List, Optional
+import numpy as np
+from nyctaxi.trip_loader import TripTable
+from nyctaxi.trip_cache import cached_load_trips
+from nyctaxi.sort_bench import SORT_COLUMNS, measure
+from nyctaxi.sorting import sorting_algorithms, algorithm_labels
+from nyctaxi.profiling import result_rows, traced
+
+@traced(rows=result_rows)
+def read_file(file_path: str) -> TripTable: 
+    # Parses the dataset into typed columns, blank cells are marked in the null masks
+    # Later runs memory-map the columns cached next to the file
+    return cached_load_trips(file_path)
 
 file_path = "nyc_dataset_small.txt" #Change txt file to get the desired data anaylzed
-data = read_file(file_path)
-
-#Stores the needed types of data which is extracted from the dataset
-num_passengers = []
-fare_amounts = []
-total_amounts = []
-tips_amounts = []
+data = None # Read from file_path the first time gatherData needs it
 
+@traced(rows=result_rows)
 def gatherData(toBeGathered: str) -> list:
-   # Returns a list of the predefined data domains
-   #The data is appened into the lists
+   # Returns a new list with the values of one of the predefined data domains
+   # (trip columns listed in sort_bench.SORT_COLUMNS), blank cells are left out.
+   # Every call starts from an empty list
+    global data
     try:
+        if data is None:
+            data = read_file(file_path)
         match toBeGathered:
                 case "num_passengers": # Extract number of passengers
-                    for entry in data:
-                        if entry.get('passenger_count'):
-                            num_passengers.append(int(float(entry.get('passenger_count', 0))))
-                    return num_passengers
-                case "fare_amounts": # Extract fare amounts
-                    for entry in data:
-                        if entry.get('fare_amount'):
-                            fare_amounts.append(float(entry.get('fare_amount', 0.0)))
-                    return fare_amounts
-                case "total_amounts": # Extract total amounts
-                    for entry in data:
-                        if entry.get('total_amount'):
-                            total_amounts.append(float(entry.get('total_amount', 0.0)))
-                    return total_amounts  
-                case "tips_amounts": # Extract tip amounts
-                    for entry in data:
-                        if entry.get('tip_amount'):
-                            tips_amounts.append(float(entry.get('tip_amount', 0.0)))
-                    return tips_amounts 
+                    return data.valid(SORT_COLUMNS[toBeGathered]).astype(np.int64).tolist()
+                case "fare_amounts" | "total_amounts" | "tips_amounts": # Extract fare, total or tip amounts
+                    return data.valid(SORT_COLUMNS[toBeGathered]).tolist()
                 case _: # Default case
                     return []
     except Exception:
@@ -54,133 +36,44 @@ def gatherData(toBeGathered: str) -> list:
         return []
 
 
-def bubbleSort(toBeSorted: list) -> list:
-
-    '''The bubble_sort function is a straightforward implementation of the bubble sort 
-    algorithm which is O(n^2) in complexity. This sorting method is more suitable for 
-    small datasets'''
-
-    start_time = time.time() # Start timer
-    n = len(toBeSorted) 
-    swapped = True # Flag to indicate if any elements were swapped during a pass
-    while swapped:
-        swapped = False # Resets the flag for each pass
-        for i in range(1, n):
-            if toBeSorted[i - 1] > toBeSorted[i]: # Compares the current element with its previous element
-                toBeSorted[i - 1], toBeSorted[i] = toBeSorted[i], toBeSorted[i - 1] # Swaps the elements if they are in the wrong order
-                swapped = True
-        n -= 1  # Each pass finds the largest item and puts it at the end, so we can ignore the end in subsequent passes
-    end_time = time.time() #Ends timer
-    return toBeSorted, end_time - start_time
-
-def quickSort(toBeSorted: list) -> list:
-
-    '''The quick_sort function is implemented as a typical recursive sort with a random 
-    pivot selection to help avoid worst-case performance on sorted datasets. It generally 
-    performs with O(n log n) complexity, making it more suitable for larger datasets.'''
-
-    start_time = time.time() # Start timer
-
-    #Base case: If the list has one or fewer elements, it is already sorted
-    if len(toBeSorted) <= 1:
-        end_time = time.time() # End timer
-        return toBeSorted, end_time - start_time
-
-    else:
-        pivot_index = random.randint(0, len(toBeSorted) - 1)
-        pivot = toBeSorted[pivot_index]
-        left = [x for x in toBeSorted if x < pivot]  # Values smaller than pivot
-        right = [x for x in toBeSorted if x > pivot]  # Values larger than pivot
-        equal = [x for x in toBeSorted if x == pivot]  # Equal to pivot
-
-        # Recursively sort the left and right partitions
-        left_sorted, left_time = quickSort(left)
-        right_sorted, right_time = quickSort(right)
-
-        end_time = time.time() #timer ends
-        execution_time = end_time - start_time + left_time + right_time # Calculate the total execution time including sorting and merging
-
-        return left_sorted + equal + right_sorted, execution_time # Merge the sorted partitions and the equal elements
-
-
-def compare_sorting_algorithms(data_type: str):
+def compare_sorting_algorithms(data_type: str, algorithms: List[str] = ("quick", "bubble"),
+                               warmup: int = 1, repeats: int = 3):
     # Gathers data based on the specified domain
     data = gatherData(data_type)
     
-    # Makes a copy of data for fair comparison
-    data_quick_sort = data.copy()
-    data_bubble_sort = data.copy()
-    
-    # Measures Quick Sort
-    _, quick_sort_time = quickSort(data_quick_sort)
-    print(f"Quick Sort time for {data_type}: {quick_sort_time:.6f} seconds")
-
-    # Measures Bubble Sort
-    _, bubble_sort_time = bubbleSort(data_bubble_sort)
-    print(f"Bubble Sort time for {data_type}: {bubble_sort_time:.6f} seconds")
-
-    # Calculates the difference in time
-    time_difference = quick_sort_time - bubble_sort_time
-    if time_difference < 0:
-        print(f"Quick Sort is faster by {-time_difference:.6f} seconds")
-    else:
-        print(f"Bubble Sort is faster by {time_difference:.6f} seconds")
-
-
-def visual_compare_sorting_algorithms(data_types: List[str]):
-    # Initializes lists to store the sorting times
-    quick_sort_times = []
-    bubble_sort_times = []
+    # Every algorithm sorts its own fresh copy of the same data (see sort_bench.measure)
+    # and the median of the repeated runs is reported
+    times = {}
+    for name in algorithms:
+        times[name] = measure(sorting_algorithms[name], data, warmup, repeats)["median_ns"] / 1e9
+        print(f"{algorithm_labels[name]} time for {data_type}: {times[name]:.6f} seconds")
+
+    # Calculates the difference in time between the fastest algorithm and the others
+    fastest = min(times, key=times.get)
+    for name in algorithms:
+        if name != fastest:
+            time_difference = times[name] - times[fastest]
+            print(f"{algorithm_labels[fastest]} is faster than {algorithm_labels[name]} by {time_difference:.6f} seconds")
+
+
+def visual_compare_sorting_algorithms(data_types: List[str], algorithms: List[str] = ("quick", "bubble"),
+                                      warmup: int = 1, repeats: int = 3, output: Optional[str] = None):
+    from nyctaxi.plots import plot_sort_times # matplotlib is only loaded when plotting
+
+    # Initializes one list of sorting times per algorithm
+    sort_times = {name: [] for name in algorithms}
     labels = []
 
     for data_type in data_types:
         data = gatherData(data_type)
-        data_quick_sort = data.copy()
-        data_bubble_sort = data.copy()
-        
-        # Measures Quick Sort- taken from the Quick Sort function
-        _, quick_sort_time = quickSort(data_quick_sort)
         
-        # Measures Bubble Sort- taken from the Bubble Sort function
-        _, bubble_sort_time = bubbleSort(data_bubble_sort)
-
-        # Stores the results for plotting
-        quick_sort_times.append(quick_sort_time)
-        bubble_sort_times.append(bubble_sort_time)
+        # Median time of every algorithm, each run on a fresh copy of the data
+        for name in algorithms:
+            sort_times[name].append(measure(sorting_algorithms[name], data, warmup, repeats)["median_ns"] / 1e9)
         labels.append(data_type)
 
-    # Plotting the results
-    x = range(len(data_types))  # the label locations
-    width = 0.35  # the width of the bars
-
-    fig, ax = plt.subplots()
-    rects1 = ax.bar(x, quick_sort_times, width, label='Quick Sort')
-    rects2 = ax.bar([p + width for p in x], bubble_sort_times, width, label='Bubble Sort')
-
-    # Adds some text for labels, title and custom x-axis tick labels, etc.
-    ax.set_ylabel('Seconds')
-    ax.set_title('Comparison of Sorting Algorithm Speeds')
-    ax.set_xticks([p + width / 2 for p in x])
-    ax.set_xticklabels(labels)
-    ax.legend()
-
-    # Function to attach a text label above each bar in rects, displaying its height.
-    # This helps in quickly seeing the numeric values without needing to estimate from the plot scale
-    def autolabel(rects):
-        for rect in rects:
-            height = rect.get_height()
-            ax.annotate(f'{height:.4f}',
-                        xy=(rect.get_x() + rect.get_width() / 2, height),
-                        xytext=(0, 3),  # 3 points vertical offset
-                        textcoords="offset points",
-                        ha='center', va='bottom')
-
-    autolabel(rects1)
-    autolabel(rects2)
-
-    fig.tight_layout()
-    # Displays the plot created
-    plt.show()
+    # Plotting the results, saved to 'output' instead of shown when it is given
+    plot_sort_times(labels, sort_times, algorithm_labels, output)
 
 '''
 COMMENTS ON THE SORTING ALGORITHMS
@@ -191,26 +84,36 @@ used for small datasets or those nearly sorted (where its complexity can approac
 its performance on larger, unsorted datasets is impractical. This analysis reinforces the 
 importance of choosing the right algorithm based on data size and expected data order to 
 optimize performance in real-world applications.
+
+Intro Sort and Merge Sort keep the O(n log n) bound without recursion and without the
+extra lists built by Quick Sort at every level; Counting Sort and Radix Sort exploit the
+type of the data (small integers, whole cents) to avoid comparisons altogether. All of
+them remain well behind sorted() and numpy.sort, which run the same ideas in C.
 '''
 
-'''Uncomment to print sorted data for each sorting algorithm'''
-#print(quickSort(gatherData("num_passengers"))) 
-#print(quickSort(gatherData("tips_amounts"))) 
-#print(quickSort(gatherData("total_amounts")))
-#print(quickSort(gatherData("fare_amounts")))
+if __name__ == "__main__":
+    '''Uncomment to print sorted data for each sorting algorithm'''
+    #print(sorting_algorithms["quick"](gatherData("num_passengers"))) 
+    #print(sorting_algorithms["quick"](gatherData("tips_amounts"))) 
+    #print(sorting_algorithms["quick"](gatherData("total_amounts")))
+    #print(sorting_algorithms["quick"](gatherData("fare_amounts")))
+
+    '''Uncomment to print sorted data for each sorting algorithm'''
 
-'''Uncomment to print sorted data for each sorting algorithm'''
+    #print(sorting_algorithms["bubble"](gatherData("num_passengers"))) 
+    #print(sorting_algorithms["bubble"](gatherData("tips_amounts")))
+    #print(sorting_algorithms["bubble"](gatherData("total_amounts")))
+    #print(sorting_algorithms["bubble"](gatherData("fare_amounts")))
 
-#print(bubbleSort(gatherData("num_passengers"))) 
-#print(bubbleSort(gatherData("tips_amounts")))
-#print(bubbleSort(gatherData("total_amounts")))
-#print(bubbleSort(gatherData("fare_amounts")))
+    '''Uncomment to compare sorting methods for individual data domains'''
+    #compare_sorting_algorithms("num_passengers")
+    #compare_sorting_algorithms("tips_amounts")
+    #compare_sorting_algorithms("total_amounts")
+    #compare_sorting_algorithms("fare_amounts")
 
-'''Uncomment to compare sorting methods for individual data domains'''
-#compare_sorting_algorithms("num_passengers")
-#compare_sorting_algorithms("tips_amounts")
-#compare_sorting_algorithms("total_amounts")
-#compare_sorting_algorithms("fare_amounts")
+    '''Uncomment to compare any of the algorithms in 'sorting_algorithms' by name'''
+    #compare_sorting_algorithms("num_passengers", ["intro", "merge", "counting", "radix", "python", "numpy"])
+    #compare_sorting_algorithms("fare_amounts", ["intro", "merge", "radix", "python", "numpy"])
 
-'''Uncomment to compare sorting methods with all data domains'''
-#visual_compare_sorting_algorithms(["num_passengers", "tips_amounts", "total_amounts", "fare_amounts"])
\ No newline at end of file
+    '''Uncomment to compare sorting methods with all data domains'''
+    #visual_compare_sorting_algorithms(["num_passengers", "tips_amounts", "total_amounts", "fare_amounts"])
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def small_path() -> str:
+    return os.path.join(ROOT, "nyc_dataset_small.txt")
+
+
+@pytest.fixture(scope="session")
+def medium_path() -> str:
+    return os.path.join(ROOT, "nyc_dataset_medium.txt")
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from nyctaxi import analysis_plan
+from nyctaxi.analysis_plan import (DURATIONS, ODMatrixAnalysis, Plan, SpeedAnalysis, StatsAnalysis, TripCountAnalysis,
+                                   clear_memo, run)
+from nyctaxi.od_matrix import od_matrix
+from nyctaxi.trip_loader import load_trips
+from nyctaxi.trip_stats import SpeedFilters
+from task1_project import calculate_speed, calculate_stats, count_trips
+
+ZONES = {1: "Newark Airport", 132: "JFK Airport", 74: "East Harlem North", 43: "Central Park"}
+
+
+@pytest.fixture(autouse=True)
+def empty_memo():
+    clear_memo()
+    yield
+    clear_memo()
+
+
+@pytest.fixture
+def scans(monkeypatch) -> list:
+    #Columns of every scan of a file started by run()
+    calls = []
+    iter_trip_chunks = analysis_plan.iter_trip_chunks
+
+    def counting(file_path, columns, chunk_rows):
+        calls.append(tuple(columns))
+        return iter_trip_chunks(file_path, columns, chunk_rows)
+    monkeypatch.setattr(analysis_plan, "iter_trip_chunks", counting)
+    return calls
+
+
+def test_plan_shares_intermediates():
+    plan = Plan([SpeedAnalysis(), SpeedAnalysis(SpeedFilters(max_speed_kmh=200), name="capped"),
+                 TripCountAnalysis(ZONES), ODMatrixAnalysis()])
+    keys = [step.key for step in plan.intermediates]
+    assert len(keys) == len(set(keys))
+    assert keys.count(DURATIONS.key) == 1
+    #Every intermediate comes after the ones it needs
+    for position, step in enumerate(plan.intermediates):
+        assert all(keys.index(need.key) < position for need in step.needs)
+    assert set(plan.columns) == {"tpep_pickup_datetime", "tpep_dropoff_datetime", "trip_distance",
+                                 "PULocationID", "DOLocationID"}
+    with pytest.raises(ValueError):
+        Plan([StatsAnalysis(), StatsAnalysis()])
+
+
+def test_fused_run_scans_once_and_matches_the_separate_functions(medium_path, scans):
+    results = run(medium_path, [StatsAnalysis(), SpeedAnalysis(), TripCountAnalysis(ZONES), ODMatrixAnalysis()],
+                  chunk_rows=5000)
+    assert len(scans) == 1
+    data = load_trips(medium_path)
+    assert results["stats"] == calculate_stats(data)
+    assert results["speed"] == calculate_speed(data)
+    assert results["trips"] == count_trips(data, ZONES)
+    assert np.array_equal(results["od_matrix"], od_matrix(data))
+
+
+def test_file_results_are_memoized(medium_path, scans):
+    first = run(medium_path, [StatsAnalysis(), SpeedAnalysis()])
+    first["stats"]["fare_amount"]["avg"] = -1.0
+    again = run(medium_path, [SpeedAnalysis(), StatsAnalysis()])
+    assert len(scans) == 1
+    assert again["stats"]["fare_amount"]["avg"] != -1.0
+    #Only the missing analysis is computed, reading only its columns
+    run(medium_path, [StatsAnalysis(), TripCountAnalysis(ZONES)])
+    assert scans[1:] == [("PULocationID",)]
+    run(medium_path, [StatsAnalysis()], memo=False)
+    assert len(scans) == 3
+
+
+def test_changed_file_is_analysed_again(tmp_path, small_path, scans):
+    path = tmp_path / "trips.txt"
+    path.write_bytes(open(small_path, "rb").read())
+    before = run(str(path), [StatsAnalysis()])["stats"]
+    with open(path, "ab") as f:
+        f.write(b"1,2022-07-19T10:00:00.000,2022-07-19T10:30:00.000,2.0,5.1,1.0,N,132,74,1,900.0,0,0.5,3,0,0.3,925.3,,\r\n")
+    after = run(str(path), [StatsAnalysis()])["stats"]
+    assert len(scans) == 2
+    assert before["fare_amount"]["max"] < 900.0
+    assert after["fare_amount"]["max"] == 900.0
+
+
+def test_table_intermediates_are_computed_once(small_path, monkeypatch):
+    data = load_trips(small_path)
+    computed = []
+    compute = DURATIONS.compute
+    monkeypatch.setattr(DURATIONS, "compute", lambda chunk, values: computed.append(1) or compute(chunk, values))
+    run(data, [SpeedAnalysis()])
+    run(data, [SpeedAnalysis(SpeedFilters(max_speed_kmh=200), name="capped")])
+    run(data, [SpeedAnalysis()])
+    assert len(computed) == 1
+
+
+def test_memo_keeps_one_entry_per_file_and_the_files_used_last(tmp_path, small_path, monkeypatch):
+    monkeypatch.setattr(analysis_plan, "MEMO_FILES", 2)
+    path = tmp_path / "trips.txt"
+    path.write_bytes(open(small_path, "rb").read())
+    run(str(path), [StatsAnalysis()])
+    with open(path, "ab") as f:
+        f.write(b"1,2022-07-19T10:00:00.000,2022-07-19T10:30:00.000,2.0,5.1,1.0,N,132,74,1,9.0,0,0.5,3,0,0.3,13.3,,\r\n")
+    run(str(path), [StatsAnalysis()])
+    assert list(analysis_plan._file_results) == [str(path)]
+    assert analysis_plan._file_results[str(path)][0][1] == path.stat().st_size
+
+    others = []
+    for name in ("a.txt", "b.txt"):
+        others.append(str(tmp_path / name))
+        (tmp_path / name).write_bytes(open(small_path, "rb").read())
+        run(others[-1], [StatsAnalysis()])
+    assert list(analysis_plan._file_results) == others
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from nyctaxi.cli import main
+from nyctaxi.graph_analytics import from_od_matrix, pagerank
+from nyctaxi.od_matrix import OD_COLUMNS, od_matrix
+from nyctaxi.trip_scanner import scan_trips
+
+
+def run_cli(capsys, *argv):
+    assert main(list(argv)) == 0
+    return json.loads(capsys.readouterr().out)
+
+
+@pytest.mark.parametrize("command", ["stats", "speed"])
+def test_rules_imply_clean(capsys, tmp_path, small_path, command):
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps({"fare_amount": {"min": 0}}))
+    result = run_cli(capsys, command, small_path, "--rules", str(rules))
+    assert list(result["validation"]["rejections"]) == ["negative_fare_amount"]
+    assert result == run_cli(capsys, command, small_path, "--clean", "--rules", str(rules))
+
+
+def test_rules_with_workers_are_rejected(capsys, tmp_path, small_path):
+    rules = tmp_path / "rules.json"
+    rules.write_text("{}")
+    with pytest.raises(SystemExit):
+        main(["stats", small_path, "--workers", "2", "--rules", str(rules)])
+    assert "--rules" in capsys.readouterr().err
+
+
+def test_pagerank_keeps_zones_sharing_a_name(capsys, tmp_path, small_path):
+    #Every zone is called the same, each one must still be listed
+    lookup = tmp_path / "lookup.csv"
+    lookup.write_text('"LocationID","Borough","Zone","service_zone"\n'
+                      + "".join(f'{zone_id},"Queens","Corona","Boro Zone"\n' for zone_id in range(1, 266)))
+    result = run_cli(capsys, "od-graph", small_path, "--lookup", str(lookup), "--top", "5", "--no-plot")
+    rank = pagerank(from_od_matrix(od_matrix(scan_trips(small_path, columns=OD_COLUMNS)), directed=True))
+    assert [zone_id for zone_id, _, _ in result["pagerank"]] == rank.argsort(kind="stable")[::-1][:5].tolist()
+    assert all(name == "Corona" for _, name, _ in result["pagerank"])
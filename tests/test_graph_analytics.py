@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from nyctaxi.graph_analytics import (connected_components, cross_check, degree, force_layout, from_od_matrix,
+                                     load_layout, pagerank, save_layout, strength, top_routes)
+
+
+@pytest.fixture
+def matrix() -> np.ndarray:
+    #1 <-> 2 -> 3 with 5 trips within zone 3, and 5 -> 6 apart; zones 0, 4 and 7 have no trips
+    trips = np.zeros((8, 8), dtype=np.int64)
+    trips[1, 2], trips[2, 1], trips[2, 3], trips[3, 3], trips[5, 6] = 3, 1, 2, 5, 7
+    return trips
+
+
+def edges(graph) -> dict:
+    return {(s, t): w for s, t, w in zip(graph.sources().tolist(), graph.indices.tolist(), graph.weights.tolist())}
+
+
+def test_undirected_graph_adds_both_directions(matrix):
+    graph = from_od_matrix(matrix)
+    assert not graph.directed
+    assert graph.nodes().tolist() == [1, 2, 3, 5, 6]
+    #A trip within a zone counts once
+    assert edges(graph) == {(1, 2): 4, (2, 1): 4, (2, 3): 2, (3, 2): 2, (3, 3): 5, (5, 6): 7, (6, 5): 7}
+    assert degree(graph).tolist() == [0, 1, 2, 2, 0, 1, 1, 0]
+    assert strength(graph).tolist() == [0, 4, 6, 7, 0, 7, 7, 0]
+
+
+def test_directed_graph_keeps_pickup_to_dropoff(matrix):
+    graph = from_od_matrix(matrix, directed=True)
+    assert edges(graph) == {(1, 2): 3, (2, 1): 1, (2, 3): 2, (3, 3): 5, (5, 6): 7}
+    assert graph.nodes().tolist() == [1, 2, 3, 5, 6]
+    assert strength(graph).tolist() == [0, 3, 3, 5, 0, 7, 0, 0]
+
+
+def test_connected_components_largest_first(matrix):
+    components = connected_components(from_od_matrix(matrix))
+    assert [component.tolist() for component in components] == [[1, 2, 3], [5, 6]]
+    #Direction does not split a component
+    assert [c.tolist() for c in connected_components(from_od_matrix(matrix, directed=True))] == [[1, 2, 3], [5, 6]]
+    assert connected_components(from_od_matrix(np.zeros((4, 4), dtype=np.int64))) == []
+
+
+def test_top_routes(matrix):
+    assert top_routes(matrix, 3) == [(5, 6, 7), (3, 3, 5), (1, 2, 3)]
+    #Both directions of 1 <-> 2 together, reported from the smaller ID
+    assert top_routes(matrix, 4, directed=False) == [(5, 6, 7), (3, 3, 5), (1, 2, 4), (2, 3, 2)]
+    assert top_routes(matrix, 100) == top_routes(matrix, 5)
+    assert top_routes(np.zeros((4, 4)), 3) == []
+
+
+def test_pagerank_of_small_graphs():
+    #Equal weights around a cycle: every node gets the same rank
+    cycle = np.zeros((4, 4))
+    cycle[1, 2] = cycle[2, 3] = cycle[3, 1] = 2
+    assert pagerank(from_od_matrix(cycle, directed=True)).tolist() == pytest.approx([0, 1 / 3, 1 / 3, 1 / 3])
+    #1 -> 2 only: the dangling node 2 spreads its rank over both, r1 = (1 - alpha r1) / 2
+    pair = np.zeros((3, 3))
+    pair[1, 2] = 1
+    rank = pagerank(from_od_matrix(pair, directed=True))
+    assert rank[0] == 0
+    assert rank[1] == pytest.approx(1 / (2 + 0.85), abs=1e-6)
+    assert rank[1] + rank[2] == pytest.approx(1.0)
+
+
+def test_pagerank_matches_networkx(matrix):
+    pytest.importorskip("networkx")
+    weighted = matrix.copy()
+    weighted[1, 3], weighted[3, 1], weighted[6, 5] = 10, 4, 1
+    check = cross_check(weighted)
+    assert check["components"] == check["networkx_components"] == 2
+    assert check["strength_max_diff"] == 0
+    assert check["pagerank_max_diff"] < 1e-5
+    rank = pagerank(from_od_matrix(weighted, directed=True))
+    assert rank[[0, 4, 7]].tolist() == [0, 0, 0]
+    assert rank.sum() == pytest.approx(1.0)
+
+
+def test_layout_is_seeded_and_saved(matrix, tmp_path):
+    graph = from_od_matrix(matrix)
+    layout = force_layout(graph, iterations=50, seed=3)
+    assert sorted(layout) == [1, 2, 3, 5, 6]
+    assert layout == force_layout(graph, iterations=50, seed=3)
+    coordinates = np.array(list(layout.values()))
+    assert np.abs(coordinates).max() == pytest.approx(1.0)
+    path = str(tmp_path / "layout.json")
+    save_layout(layout, path)
+    assert load_layout(path) == layout
+    assert force_layout(from_od_matrix(np.zeros((3, 3)))) == {}
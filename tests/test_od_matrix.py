@@ -0,0 +1,96 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from nyctaxi.od_matrix import ZONE_SLOTS, od_cells, od_columns, od_matrix, to_nested_dict, to_sparse
+from nyctaxi.trip_loader import TripTable
+
+#pickup, dropoff, fare, distance, pickup time (s), dropoff time (s); None for a blank cell
+TRIPS = [
+    (132, 74, 52.0, 17.1, 0, 1800),
+    (132, 74, 48.5, 16.0, 60, 2000),
+    (74, 132, 45.0, None, 100, 1900),
+    (1, 1, 20.0, 0.1, 200, None),
+    (43, 265, None, 3.2, 300, 900),
+    (None, 43, 10.0, 1.0, 400, 800),
+    (43, None, 11.0, 1.1, 500, 700),
+    (0, 43, 9.0, 1.2, 600, 1200),
+    (266, 43, 99.0, 9.9, 700, 1300),
+    (43, 1000, 98.0, 9.8, 800, 1400),
+    (-1, 43, 97.0, 9.7, 900, 1500),
+]
+
+
+def table(trips) -> TripTable:
+    columns, nulls = {}, {}
+    specs = [("PULocationID", np.int16), ("DOLocationID", np.int16), ("fare_amount", np.float64),
+             ("trip_distance", np.float64), ("tpep_pickup_datetime", np.int64), ("tpep_dropoff_datetime", np.int64)]
+    for position, (name, dtype) in enumerate(specs):
+        cells = [trip[position] for trip in trips]
+        nulls[name] = np.array([cell is None for cell in cells])
+        scale = 10 ** 6 if name.startswith("tpep") else 1
+        columns[name] = np.array([0 if cell is None else cell * scale for cell in cells], dtype=dtype)
+    return TripTable(columns, nulls)
+
+
+def expected(trips, weight=None) -> Counter:
+    #Trips with a blank or out-of-range zone are left out; a blank weight adds nothing
+    position = {"fare_amount": 2, "trip_distance": 3}
+    totals = Counter()
+    for trip in trips:
+        pickup, dropoff = trip[0], trip[1]
+        if pickup is None or dropoff is None or not (0 <= pickup < ZONE_SLOTS and 0 <= dropoff < ZONE_SLOTS):
+            continue
+        if weight is None:
+            totals[pickup, dropoff] += 1
+        elif weight == "duration_s":
+            totals[pickup, dropoff] += 0.0 if trip[5] is None else trip[5] - trip[4]
+        else:
+            totals[pickup, dropoff] += trip[position[weight]] or 0.0
+    return totals
+
+
+def as_counter(matrix: np.ndarray) -> Counter:
+    pickups, dropoffs = np.nonzero(matrix)
+    return Counter({(p, d): matrix[p, d].item() for p, d in zip(pickups.tolist(), dropoffs.tolist())})
+
+
+@pytest.mark.parametrize("weight", [None, "fare_amount", "trip_distance", "duration_s"])
+def test_od_matrix_matches_a_counter(weight):
+    matrix = od_matrix(table(TRIPS), weight)
+    assert matrix.shape == (ZONE_SLOTS, ZONE_SLOTS)
+    assert matrix.dtype == (np.int64 if weight is None else np.float64)
+    reference = expected(TRIPS, weight)
+    #Pairs whose weights are all blank stay at 0
+    assert as_counter(matrix) == Counter({pair: total for pair, total in reference.items() if total})
+
+
+def test_out_of_range_zones_are_left_out():
+    cells, known = od_cells(table(TRIPS))
+    assert known.tolist() == [True] * 5 + [False, False, True] + [False] * 3
+    assert len(cells) == 6
+    #The shared cells can be reused
+    assert np.array_equal(od_matrix(table(TRIPS), cells=(cells, known)), od_matrix(table(TRIPS)))
+
+
+def test_unknown_weight():
+    with pytest.raises(ValueError):
+        od_matrix(table(TRIPS), "tip_amount")
+    assert od_columns("duration_s") == ("PULocationID", "DOLocationID", "tpep_pickup_datetime", "tpep_dropoff_datetime")
+
+
+def test_to_sparse_keeps_every_pair():
+    pytest.importorskip("scipy")
+    matrix = od_matrix(table(TRIPS), "fare_amount")
+    sparse = to_sparse(matrix)
+    assert sparse.shape == matrix.shape
+    assert sparse.nnz == np.count_nonzero(matrix)
+    assert np.array_equal(sparse.toarray(), matrix)
+
+
+def test_nested_dict_adds_zones_sharing_a_name():
+    matrix = od_matrix(table(TRIPS))
+    names = {"132": "JFK Airport", "74": "East Harlem", "1": "Newark", "43": "Park", "265": "Park"}
+    assert to_nested_dict(matrix, names) == {"JFK Airport": {"East Harlem": 2}, "East Harlem": {"JFK Airport": 1},
+                                             "Newark": {"Newark": 1}, "Park": {"Park": 1}}
@@ -0,0 +1,37 @@
+import gzip
+import shutil
+
+import numpy as np
+import pytest
+
+from nyctaxi.pipeline import aggregate_files, aggregate_files_sequential
+from nyctaxi.trip_parallel import parallel_aggregate
+
+
+@pytest.fixture(scope="module")
+def files(tmp_path_factory, small_path, medium_path) -> list:
+    folder = tmp_path_factory.mktemp("pipeline")
+    compressed = str(folder / "medium.txt.gz")
+    with open(medium_path, "rb") as f_in, gzip.open(compressed, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    return [small_path, compressed]
+
+
+def summary(aggregates) -> tuple:
+    return (aggregates.stats.stats(), aggregates.stats.speed_summary(), aggregates.zone_counts.tolist(),
+            aggregates.od_matrix.tolist(), aggregates.rows)
+
+
+@pytest.mark.parametrize("options", [{}, {"files_in_flight": 1, "queue_blocks": 1}, {"processes": 2}])
+def test_every_mode_matches_the_sequential_run(files, options):
+    expected = aggregate_files_sequential(files, block_bytes=100_000)
+    result = aggregate_files(files, block_bytes=100_000, **options)
+    assert summary(result.aggregates) == summary(expected.aggregates)
+    assert [report.rows for report in result.files] == [report.rows for report in expected.files]
+    assert all(report.done for report in result.files)
+
+
+def test_a_compressed_file_matches_the_plain_one(files, medium_path):
+    result = aggregate_files(files[1:], block_bytes=65536)
+    assert summary(result.aggregates) == summary(parallel_aggregate(medium_path, workers=1))
+    assert np.array_equal(result.per_file[0].zone_counts, result.aggregates.zone_counts)
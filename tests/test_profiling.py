@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from nyctaxi import profiling
+from nyctaxi.pipeline import aggregate_files
+from nyctaxi.trip_parallel import parallel_aggregate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def tracing():
+    profiling.reset()
+    profiling.enable()
+    yield
+    profiling.disable()
+    profiling.reset()
+
+
+def test_worker_stages_reach_the_parent_trace(tracing, medium_path):
+    result = parallel_aggregate(medium_path, workers=2, shard_bytes=500_000)
+    shards = [record for record in profiling.records()
+              if record["path"] == "trip_parallel.parallel_aggregate/trip_parallel.aggregate_shard"]
+    assert len(shards) > 1
+    assert sum(record["rows"] for record in shards) == result.rows
+    assert all(record["pid"] != os.getpid() for record in shards)
+    parent = next(record for record in profiling.records() if record["path"] == "trip_parallel.parallel_aggregate")
+    assert all(parent["start_s"] <= record["start_s"] <= parent["start_s"] + parent["wall_s"] for record in shards)
+
+
+def test_pipeline_processes_ship_their_stages(tracing, small_path, medium_path):
+    with profiling.stage("run"):
+        aggregate_files([small_path, medium_path], processes=2)
+    paths = [record["path"] for record in profiling.records()]
+    assert paths.count("run/pipeline.aggregate_files/pipeline.file/pipeline._aggregate_file") == 2
+
+
+def test_nothing_is_recorded_while_tracing_is_off():
+    assert profiling.worker_settings() is None
+    assert profiling.run_traced(None, sum, [1, 2]) == (3, [])
+
+
+def test_spawned_workers_do_not_configure_the_trace(tmp_path, medium_path):
+    trace = tmp_path / "trace.json"
+    script = f"""
+import multiprocessing, sys
+sys.path.insert(0, {ROOT!r})
+from concurrent.futures import ProcessPoolExecutor
+from nyctaxi import profiling
+from nyctaxi.trip_parallel import parallel_aggregate
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method("spawn")
+    with ProcessPoolExecutor(1) as pool:
+        assert pool.submit(profiling.is_enabled).result() is False
+    parallel_aggregate({medium_path!r}, workers=2, shard_bytes=1_000_000)
+"""
+    subprocess.run([sys.executable, "-c", script], check=True, env=dict(os.environ, NYCTAXI_TRACE=str(trace)))
+    with open(trace) as f:
+        stages = json.load(f)["stages"]
+    assert [record["path"] for record in stages].count("trip_parallel.parallel_aggregate") == 1
+    assert len({record["pid"] for record in stages}) > 1
@@ -0,0 +1,101 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from nyctaxi.od_matrix import ZONE_SLOTS
+from nyctaxi import rollups
+from nyctaxi.fileutil import file_digest
+from nyctaxi.rollups import ROLLUP_COLUMNS, Rollup, RollupStore
+from nyctaxi.trip_loader import concat_tables, load_trips
+from nyctaxi.trip_stats import STATS_FIELDS, TripStats
+
+
+@pytest.fixture(scope="module")
+def trips(small_path, medium_path):
+    return [load_trips(path, ROLLUP_COLUMNS) for path in (small_path, medium_path)]
+
+
+@pytest.fixture
+def store(tmp_path, small_path, medium_path) -> RollupStore:
+    store = RollupStore(str(tmp_path / "rollups"))
+    assert store.append(small_path)
+    assert store.append(medium_path)
+    return store
+
+
+def assert_same_stats(result, expected):
+    assert result.keys() == expected.keys()
+    for field, values in expected.items():
+        assert result[field]["min"] == values["min"]
+        assert result[field]["max"] == values["max"]
+        assert result[field]["avg"] == pytest.approx(values["avg"], rel=1e-12)
+
+
+def test_duplicate_append_is_skipped(store, tmp_path, small_path, medium_path):
+    copy = tmp_path / "same_content.txt"
+    copy.write_bytes(open(small_path, "rb").read())
+    assert not store.append(small_path)
+    assert not store.append(str(copy))
+    assert [partition["name"] for partition in store.partitions()] == [file_digest(small_path),
+                                                                       file_digest(medium_path)]
+
+
+def test_concurrent_appends_keep_both_partitions(tmp_path, small_path, medium_path, monkeypatch):
+    store = RollupStore(str(tmp_path / "rollups"))
+    other = RollupStore(store.path)
+    load_trips_of = rollups.load_trips
+    appended = []
+
+    def load_during_other_append(path, columns=None):
+        #The other append starts and ends while this one is building its partition
+        if path == small_path:
+            appended.append(other.append(medium_path))
+        return load_trips_of(path, columns)
+    monkeypatch.setattr(rollups, "load_trips", load_during_other_append)
+    assert store.append(small_path)
+    assert appended == [True]
+    names = [partition["name"] for partition in store.partitions()]
+    assert sorted(names) == sorted([file_digest(small_path), file_digest(medium_path)])
+    assert store.load().total_trips() == sum(partition["rows"] for partition in store.partitions())
+
+
+def test_store_keeps_every_trip(store, trips):
+    rollup = store.load()
+    assert rollup.total_trips() == sum(len(table) for table in trips)
+    assert np.all(np.diff(rollup.hours) >= 0)
+    assert_same_stats(rollup.stats(), TripStats(STATS_FIELDS, speed=False).update(concat_tables(trips)).stats())
+
+
+@pytest.mark.parametrize("start, end", [("2022-03-01", "2022-04-01"), ("2022-07-18T16", "2022-07-19T02"),
+                                        (None, "2022-02-01"), ("2022-12-01", None)])
+def test_windowed_stats(store, trips, start, end):
+    table = concat_tables(trips)
+    pickup = table["tpep_pickup_datetime"]
+    inside = ~table.nulls["tpep_pickup_datetime"]
+    if start is not None:
+        inside &= pickup >= np.datetime64(start, "us").view(np.int64)
+    if end is not None:
+        inside &= pickup < np.datetime64(end, "us").view(np.int64)
+    window = store.load().window(start, end)
+    assert window.total_trips() == int(inside.sum())
+    assert_same_stats(window.stats(), TripStats(STATS_FIELDS, speed=False).update(table.take(inside)).stats())
+
+
+def test_od_matrix_matches_a_direct_count(trips):
+    table = trips[1]
+    rollup = Rollup.build(table)
+    expected = Counter()
+    fares = Counter()
+    for pickup, dropoff, pickup_null, dropoff_null, fare, fare_null in zip(
+            table["PULocationID"].tolist(), table["DOLocationID"].tolist(), table.nulls["PULocationID"].tolist(),
+            table.nulls["DOLocationID"].tolist(), table["fare_amount"].tolist(), table.nulls["fare_amount"].tolist()):
+        if not (pickup_null or dropoff_null) and 0 < pickup < ZONE_SLOTS and 0 < dropoff < ZONE_SLOTS:
+            expected[pickup, dropoff] += 1
+            fares[pickup, dropoff] += 0.0 if fare_null else fare
+    matrix = rollup.od_matrix()
+    assert matrix.sum() == sum(expected.values())
+    assert {cell: int(matrix[cell]) for cell in zip(*np.nonzero(matrix))} == expected
+    weighted = rollup.od_matrix("fare_amount")
+    for cell, total in fares.items():
+        assert weighted[cell] == pytest.approx(total, rel=1e-12, abs=1e-9)
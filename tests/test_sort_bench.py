@@ -0,0 +1,86 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from nyctaxi.sort_bench import RESULT_FIELDS, format_table, run_benchmark, sample_column, write_csv, write_json
+from nyctaxi.sorting import sorting_algorithms
+from nyctaxi.trip_loader import TripTable
+
+ALGORITHMS = {name: sorting_algorithms[name] for name in ("python", "counting", "radix", "bubble")}
+
+
+@pytest.fixture(scope="module")
+def trips() -> TripTable:
+    rng = np.random.default_rng(0)
+    fares = rng.integers(250, 9000, 400) / 100
+    fares[[3, 50, 51]] = [np.inf, -np.inf, np.nan]
+    passengers = rng.integers(0, 7, 400).astype(np.float64)
+    nulls = np.zeros(400, dtype=bool)
+    nulls[::10] = True
+    return TripTable({"fare_amount": fares, "passenger_count": passengers},
+                     {"fare_amount": nulls, "passenger_count": nulls.copy()})
+
+
+def test_samples_leave_out_blank_and_non_finite_values(trips):
+    sample = sample_column(trips, "fare_amounts", 1000, seed=1)
+    assert len(sample) == 1000
+    assert all(np.isfinite(sample))
+    assert set(sample) <= set(trips["fare_amount"][~trips.nulls["fare_amount"]].tolist())
+    assert sample == sample_column(trips, "fare_amounts", 1000, seed=1)
+    assert all(type(value) is int for value in sample_column(trips, "num_passengers", 50))
+
+
+def test_run_benchmark(trips):
+    results = run_benchmark(trips, ALGORITHMS, ["num_passengers", "fare_amounts"], sizes=(10, 200),
+                            warmup=0, repeats=3, size_limits={"bubble": 100})
+    measured = [(row["column"], row["size"], row["algorithm"]) for row in results]
+    #countingSort rejects fares and bubble is limited to 100 values
+    assert measured == [("num_passengers", 10, "python"), ("num_passengers", 10, "counting"),
+                        ("num_passengers", 10, "radix"), ("num_passengers", 10, "bubble"),
+                        ("num_passengers", 200, "python"), ("num_passengers", 200, "counting"),
+                        ("num_passengers", 200, "radix"),
+                        ("fare_amounts", 10, "python"), ("fare_amounts", 10, "radix"), ("fare_amounts", 10, "bubble"),
+                        ("fare_amounts", 200, "python"), ("fare_amounts", 200, "radix")]
+    for row in results:
+        assert set(row) == set(RESULT_FIELDS)
+        assert row["repeats"] == 3
+        assert 0 <= row["min_ns"] <= row["median_ns"] <= row["p95_ns"]
+        assert row["sorted_ok"]
+
+
+def test_run_benchmark_skips_failing_algorithms(trips):
+    def overflow(values):
+        raise OverflowError("cannot convert float infinity to integer")
+
+    def wrong(values):
+        return list(reversed(sorted(values)))
+
+    results = run_benchmark(trips, {"overflow": overflow, "wrong": wrong}, ["fare_amounts"], sizes=(20,),
+                            warmup=0, repeats=1)
+    assert [(row["algorithm"], row["sorted_ok"]) for row in results] == [("wrong", False)]
+
+
+def test_format_table():
+    results = [{"column": "fare_amounts", "size": 1000, "algorithm": "radix", "repeats": 5, "min_ns": 1000000,
+                "median_ns": 1500000, "p95_ns": 2250000, "mean_ns": 1600000.0, "sorted_ok": True}]
+    lines = format_table(results).splitlines()
+    assert lines[0].split() == ["column", "size", "algorithm", "median", "ms", "p95", "ms", "ok"]
+    assert lines[1].split() == ["fare_amounts", "1000", "radix", "1.500", "2.250", "True"]
+    assert len(format_table([]).splitlines()) == 1
+
+
+def test_write_csv_and_json(trips, tmp_path):
+    results = run_benchmark(trips, {"python": sorting_algorithms["python"]}, ["fare_amounts"], sizes=(10, 20),
+                            warmup=0, repeats=2)
+    write_csv(results, str(tmp_path / "results.csv"))
+    with open(tmp_path / "results.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [list(row) for row in rows] == [RESULT_FIELDS] * 2
+    assert [(row["size"], row["sorted_ok"]) for row in rows] == [("10", "True"), ("20", "True")]
+    write_json(results, str(tmp_path / "results.json"))
+    with open(tmp_path / "results.json") as f:
+        report = json.load(f)
+    assert report["results"] == results
+    assert {"commit", "python", "machine", "created"} <= set(report)
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from nyctaxi.sorting import radixSort, sorting_algorithms
+
+
+@pytest.mark.parametrize("name", sorted(sorting_algorithms))
+def test_every_algorithm_sorts(name):
+    rng = random.Random(0)
+    values = [rng.randint(0, 9) for _ in range(300)] if name == "counting" else \
+        [rng.randint(-500, 20000) / 100 for _ in range(300)]
+    result, seconds = sorting_algorithms[name](list(values))
+    assert result == sorted(values)
+    assert seconds >= 0
+
+
+@pytest.mark.parametrize("values", [[], [7.5], [3, 3, 3], [2 ** 40, 0, 2 ** 33 + 5, 1],
+                                    [random.Random(1).randint(-10 ** 6, 10 ** 6) for _ in range(5000)],
+                                    [random.Random(2).randint(0, 10 ** 7) / 100 for _ in range(5000)]])
+def test_radix_sort_in_place(values):
+    given = list(values)
+    assert radixSort(given)[0] is given
+    assert given == sorted(values)
+    assert [type(value) for value in given] == [type(value) for value in sorted(values)]
+
+
+def test_radix_sort_rejects_extra_decimals():
+    with pytest.raises(ValueError):
+        radixSort([1.234])
+    assert radixSort([1.234, 0.5], decimals=3)[0] == [0.5, 1.234]
+
+
+@pytest.mark.parametrize("name", ["counting", "radix"])
+@pytest.mark.parametrize("values", [[float("inf")], [1.0, float("inf")], [float("-inf"), 2.0], [float("nan"), 1.0]])
+def test_non_finite_values_are_rejected(name, values):
+    with pytest.raises(ValueError):
+        sorting_algorithms[name](list(values))
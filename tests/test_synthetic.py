@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from nyctaxi import synthetic
+from nyctaxi.synthetic import TripModel, write_trips
+from nyctaxi.trip_loader import load_trips
+
+
+@pytest.fixture(scope="module")
+def model(small_path) -> TripModel:
+    return TripModel.fit([small_path])
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    #Files of a few blocks stay small
+    monkeypatch.setattr(synthetic, "BLOCK_ROWS", 1000)
+
+
+def generate(model, folder, rows: int, seed: int = 0) -> bytes:
+    folder.mkdir(exist_ok=True)
+    path = write_trips(model, str(folder / f"trips_{rows}_{seed}.txt"), rows, seed)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_same_seed_same_file(model, tmp_path, small_blocks):
+    assert generate(model, tmp_path / "first", 2500) == generate(model, tmp_path / "second", 2500)
+    assert generate(model, tmp_path, 2500, seed=1) != generate(model, tmp_path, 2500)
+
+
+@pytest.mark.parametrize("rows", [1, 999, 1000, 1001, 2500])
+def test_smaller_file_is_a_prefix(model, tmp_path, small_blocks, rows):
+    larger = generate(model, tmp_path, 3200)
+    smaller = generate(model, tmp_path, rows)
+    assert larger.startswith(smaller)
+    assert smaller.count(b"\n") == rows + 1
+
+
+def test_generated_trips_follow_the_samples(model, tmp_path, small_path):
+    path = write_trips(model, str(tmp_path / "trips.txt"), 20_000, seed=3)
+    data = load_trips(path)
+    samples = load_trips(small_path)
+    assert len(data) == 20_000
+    assert list(data.columns) == list(samples.columns)
+    known = ~(data.nulls["tpep_pickup_datetime"] | data.nulls["tpep_dropoff_datetime"])
+    pickup = data["tpep_pickup_datetime"][known].astype("datetime64[us]")
+    assert pickup.min() >= np.datetime64("2022-01-01") and pickup.max() < np.datetime64("2023-01-01")
+    #Every trip copies the zones of a sample trip
+    assert set(zip(data["PULocationID"].tolist(), data["DOLocationID"].tolist())) <= set(
+        zip(samples["PULocationID"].tolist(), samples["DOLocationID"].tolist()))
+    assert np.mean(data["fare_amount"]) == pytest.approx(np.mean(samples["fare_amount"]), rel=0.05)
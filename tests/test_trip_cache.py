@@ -0,0 +1,136 @@
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from nyctaxi import trip_cache
+from nyctaxi.trip_cache import cached_load_trips
+from nyctaxi.trip_loader import load_trips
+
+
+@pytest.fixture
+def trips(tmp_path, small_path) -> str:
+    path = str(tmp_path / "trips.txt")
+    shutil.copyfile(small_path, path)
+    return path
+
+
+@pytest.fixture
+def parses(monkeypatch) -> list:
+    #Paths parsed from the csv, a cache hit adds nothing
+    calls = []
+
+    def counting_load_trips(file_path, *args, **kwargs):
+        calls.append(file_path)
+        return load_trips(file_path, *args, **kwargs)
+    monkeypatch.setattr(trip_cache, "load_trips", counting_load_trips)
+    return calls
+
+
+def read_index(cache_dir: str) -> dict:
+    with open(os.path.join(cache_dir, "index.json")) as f:
+        return json.load(f)
+
+
+def assert_same_table(table, reference):
+    assert list(table.columns) == list(reference.columns)
+    for name in reference.columns:
+        assert np.array_equal(table[name], reference[name], equal_nan=reference[name].dtype.kind == "f"), name
+        assert np.array_equal(table.nulls[name], reference.nulls[name]), name
+
+
+def test_hit_returns_the_parsed_table(trips, parses):
+    first = cached_load_trips(trips)
+    second = cached_load_trips(trips, ["fare_amount", "PULocationID"])
+    assert parses == [trips]
+    assert_same_table(first, load_trips(trips))
+    assert list(second.columns) == ["fare_amount", "PULocationID"]
+    assert isinstance(second["fare_amount"], np.memmap)
+
+
+def test_size_change_rebuilds(trips, parses):
+    cached_load_trips(trips)
+    with open(trips, "a", newline="") as f:
+        f.write("1,2022-07-19T10:00:00.000,2022-07-19T10:30:00.000,2.0,5.1,1.0,N,132,74,1,21.5,0,0.5,3,0,0.3,25.3,,\r\n")
+    table = cached_load_trips(trips)
+    assert len(parses) == 2
+    assert table["fare_amount"][-1] == 21.5
+
+
+def test_new_mtime_with_the_same_content_is_a_hit(trips, parses):
+    cached_load_trips(trips)
+    stat = os.stat(trips)
+    os.utime(trips, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    cached_load_trips(trips)
+    cached_load_trips(trips)
+    assert parses == [trips]
+
+
+def test_same_size_with_new_content_rebuilds(trips, parses):
+    before = cached_load_trips(trips)["fare_amount"][0]
+    with open(trips, "rb") as f:
+        content = f.read()
+    #Same length, first fare 4.0 -> 5.0, and a new mtime
+    content = content.replace(b",4.0,1.0,0.5,", b",5.0,1.0,0.5,", 1)
+    stat = os.stat(trips)
+    with open(trips, "wb") as f:
+        f.write(content)
+    os.utime(trips, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert os.path.getsize(trips) == stat.st_size
+    assert (before, cached_load_trips(trips)["fare_amount"][0]) == (4.0, 5.0)
+    assert len(parses) == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, small_path):
+    paths = []
+    for name in ("a.txt", "b.txt", "c.txt"):
+        paths.append(str(tmp_path / name))
+        shutil.copyfile(small_path, paths[-1])
+    cache_dir = str(tmp_path / "cache")
+    cached_load_trips(paths[0], cache_dir=cache_dir)
+    limit = 2 * next(iter(read_index(cache_dir).values()))["bytes"]
+    cached_load_trips(paths[1], cache_dir=cache_dir, max_bytes=limit)
+    #a is used again, so b is the least recently used one when c comes in
+    cached_load_trips(paths[0], cache_dir=cache_dir, max_bytes=limit)
+    cached_load_trips(paths[2], cache_dir=cache_dir, max_bytes=limit)
+    index = read_index(cache_dir)
+    assert sorted(entry["source"] for entry in index.values()) == [paths[0], paths[2]]
+    assert sorted(os.listdir(cache_dir)) == sorted(list(index) + ["index.json", "index.lock"])
+
+
+def test_unwritable_cache_falls_back_to_parsing(trips, tmp_path, parses):
+    #A cache directory that cannot be created, as in a read-only dataset folder
+    blocker = tmp_path / "not_a_directory"
+    blocker.write_text("")
+    table = cached_load_trips(trips, ["fare_amount"], cache_dir=str(blocker / "cache"))
+    assert list(table.columns) == ["fare_amount"]
+    assert_same_table(table, load_trips(trips, ["fare_amount"]))
+    assert parses == [trips]
+
+
+def test_failed_cache_write_falls_back_to_parsing(trips, monkeypatch):
+    def no_space(path, content):
+        raise OSError(28, "No space left on device")
+    monkeypatch.setattr(trip_cache, "write_json", no_space)
+    assert_same_table(cached_load_trips(trips), load_trips(trips))
+    cache_dir = os.path.join(os.path.dirname(trips), trip_cache.CACHE_DIR_NAME)
+    assert os.listdir(cache_dir) == []
+
+
+def _load_into(arguments):
+    path, cache_dir = arguments
+    return len(cached_load_trips(path, ["fare_amount"], cache_dir=cache_dir))
+
+
+def test_processes_sharing_a_cache_keep_every_entry(tmp_path, small_path):
+    paths = []
+    for i in range(8):
+        paths.append(str(tmp_path / f"trips{i}.txt"))
+        shutil.copyfile(small_path, paths[-1])
+    cache_dir = str(tmp_path / "cache")
+    with ProcessPoolExecutor(4) as pool:
+        list(pool.map(_load_into, [(path, cache_dir) for path in paths]))
+    assert sorted(entry["source"] for entry in read_index(cache_dir).values()) == sorted(paths)
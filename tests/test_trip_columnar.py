@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.dataset  # noqa: E402
+import pyarrow.parquet  # noqa: E402
+
+from nyctaxi.trip_columnar import _expression, read_columnar, to_arrow, write_arrow, write_partitioned  # noqa: E402
+from nyctaxi.trip_loader import load_trips  # noqa: E402
+from nyctaxi.trip_scanner import scan_trips  # noqa: E402
+
+
+def assert_same_table(table, reference):
+    assert list(table.columns) == list(reference.columns)
+    for name in reference.columns:
+        assert table[name].dtype == reference[name].dtype, name
+        assert np.array_equal(table.nulls[name], reference.nulls[name]), name
+        known = ~reference.nulls[name]
+        assert np.array_equal(table[name][known], reference[name][known]), name
+
+
+def months(table) -> np.ndarray:
+    return np.where(table.nulls["tpep_pickup_datetime"], "unknown",
+                    table["tpep_pickup_datetime"].astype("datetime64[us]").astype("datetime64[M]").astype(str))
+
+
+def test_feather_round_trip(tmp_path, small_path):
+    reference = load_trips(small_path)
+    path = str(tmp_path / "trips.feather")
+    write_arrow(reference, path)
+    assert_same_table(load_trips(path), reference)
+    columns = ["fare_amount", "PULocationID"]
+    assert_same_table(load_trips(path, columns), load_trips(small_path, columns))
+
+
+def test_parquet_round_trip_keeps_every_month_in_file_order(tmp_path, medium_path):
+    reference = load_trips(medium_path)
+    written = write_partitioned(medium_path, str(tmp_path / "dataset"), row_group_rows=4096)
+    assert all("pickup_month=" in path for path in written)
+    table = load_trips(str(tmp_path / "dataset"))
+    assert len(table) == len(reference)
+    #The rows come back grouped by month, in the order of the csv within a month
+    table_months, reference_months = months(table), months(reference)
+    for month in np.unique(reference_months):
+        assert_same_table(table.take(table_months == month), reference.take(reference_months == month))
+
+
+@pytest.mark.parametrize("where", [[("PULocationID", "in", {132, 43})], [("fare_amount", ">=", 50.0)],
+                                   [("passenger_count", "==", 2.0), ("tip_amount", ">", 0.0)]])
+def test_filtered_read_matches_the_scanner(tmp_path, small_path, where):
+    columns = ["PULocationID", "fare_amount", "passenger_count", "tip_amount"]
+    write_partitioned(small_path, str(tmp_path / "dataset"), row_group_rows=500)
+    table = read_columnar(str(tmp_path / "dataset"), columns, where)
+    expected = scan_trips(small_path, columns, where)
+    assert len(table) == len(expected) > 0
+    #Partitioning groups the rows by month, so the rows are compared in a common order
+    order = lambda t: np.lexsort([t[name] for name in reversed(columns)])
+    assert_same_table(table.take(order(table)), expected.take(order(expected)))
+
+
+def test_predicates_skip_row_groups(tmp_path, small_path):
+    #Sorted by fare, the statistics of most row groups exclude large fares
+    data = load_trips(small_path)
+    data = data.take(np.argsort(data["fare_amount"], kind="stable"))
+    path = str(tmp_path / "by_fare.parquet")
+    pa.parquet.write_table(to_arrow(data), path, row_group_size=250)
+    where = [("fare_amount", ">=", 60.0)]
+    fragment = next(pa.dataset.dataset(path).get_fragments())
+    groups = fragment.split_by_row_group(_expression(fragment.physical_schema.names, where))
+    assert 0 < len(groups) < fragment.metadata.num_row_groups // 4
+    table = read_columnar(path, ["fare_amount"], where)
+    assert np.array_equal(table["fare_amount"], data["fare_amount"][data["fare_amount"] >= 60.0])
@@ -0,0 +1,60 @@
+import csv
+
+import numpy as np
+
+from nyctaxi.trip_loader import TRIP_SCHEMA, iter_csv_chunks, load_trips, parse_timestamps
+
+
+def expected_cell(cell: str, kind):
+    #What the loader should hold for a raw cell, None for a null
+    if cell == "":
+        return None
+    if kind == "flag":
+        return cell
+    if kind == "timestamp":
+        return int(np.datetime64(cell, "us").view(np.int64))
+    return float(cell)
+
+
+def test_load_trips_matches_dict_reader(small_path):
+    data = load_trips(small_path)
+    with open(small_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(data) == len(rows)
+    for name, kind in TRIP_SCHEMA.items():
+        expected = [expected_cell(row[name], kind) for row in rows]
+        nulls = data.nulls[name].tolist()
+        assert nulls == [value is None for value in expected], name
+        got = data[name].tolist()
+        assert [value for value, null in zip(got, nulls) if not null] == [value for value in expected
+                                                                        if value is not None], name
+
+
+def test_column_projection_and_csv_reference(small_path):
+    data = load_trips(small_path, ["fare_amount", "PULocationID"])
+    assert list(data.columns) == ["fare_amount", "PULocationID"]
+    assert data["PULocationID"].dtype == np.int16
+    reference = list(iter_csv_chunks(small_path, ["fare_amount", "PULocationID"], chunk_rows=100))
+    assert np.array_equal(np.concatenate([chunk["fare_amount"] for chunk in reference]), data["fare_amount"],
+                          equal_nan=True)
+    assert np.array_equal(np.concatenate([chunk["PULocationID"] for chunk in reference]), data["PULocationID"])
+
+
+def test_short_rows_and_malformed_cells(tmp_path):
+    path = tmp_path / "trips.txt"
+    with open(path, "w", newline="") as f:
+        f.write(",".join(TRIP_SCHEMA) + "\r\n")
+        f.write("2,2022-07-18T16:18:31.000,2022-07-18T16:22:26.000,1.0,0.27,1.0,N,140,abc,2,4.0\r\n")
+        f.write("1,not a date,2022-07-18T16:22:26.000,1.0,0.27,1.0,N,140,140,2,x\r\n")
+    data = load_trips(str(path))
+    assert len(data) == 2
+    assert data.nulls["total_amount"].all()
+    assert data.nulls["DOLocationID"].tolist() == [True, False]
+    assert data.nulls["fare_amount"].tolist() == [False, True]
+    assert data.nulls["tpep_pickup_datetime"].tolist() == [False, True]
+
+
+def test_parse_timestamps_flags_bad_cells():
+    parsed, nulls = parse_timestamps(["2022-07-18T16:18:31.000", "", "2022-02-30T00:00:00.000"])
+    assert nulls.tolist() == [False, True, True]
+    assert parsed[0] == np.datetime64("2022-07-18T16:18:31", "us").view(np.int64)
@@ -0,0 +1,40 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from nyctaxi.trip_loader import load_trips
+from nyctaxi.trip_parallel import parallel_aggregate, shard_ranges
+from nyctaxi.trip_stats import FieldAccumulator, exact_sum, exact_to_float, stream_stats
+from task1_project import calculate_speed, calculate_stats
+
+
+def test_exact_sum_matches_fractions():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.normal(0, 1e6, 1000), rng.normal(0, 1e-6, 1000), [5e-324, -1e308, 1e308, 0.1]])
+    expected = sum(Fraction(value) for value in values.tolist())
+    assert exact_to_float(exact_sum(values)) == float(expected)
+
+
+def test_field_accumulator_sum_does_not_depend_on_the_split():
+    values = np.random.default_rng(1).normal(14.7, 12.0, 10_000)
+    whole = FieldAccumulator().update(values)
+    parts = [FieldAccumulator().update(part) for part in np.array_split(values, 7)]
+    merged = FieldAccumulator()
+    for part in reversed(parts):
+        merged.merge(part)
+    assert merged.sum == whole.sum
+    assert merged.result() == whole.result()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sharded_file_equals_the_serial_path(medium_path, workers):
+    _, ranges = shard_ranges(medium_path, 50_000)
+    assert len(ranges) > 1
+    result = parallel_aggregate(medium_path, workers=workers, shard_bytes=50_000)
+    data = load_trips(medium_path)
+    assert result.stats.stats() == calculate_stats(data)
+    assert result.stats.speed_summary() == calculate_speed(data)
+    streamed = stream_stats(medium_path, chunk_rows=777)
+    assert result.stats.stats() == streamed.stats()
+    assert result.stats.speed_summary() == streamed.speed_summary()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from nyctaxi.trip_quantiles import KLLSketch, quantiles, select
+
+QS = np.linspace(0.005, 0.995, 199)
+
+
+def rank_error(sketch: KLLSketch, values: np.ndarray) -> float:
+    #Largest distance between the wanted quantiles and the true ranks of the returned values
+    values = np.sort(values)
+    error = 0.0
+    for q, value in zip(QS, sketch.quantiles(QS)):
+        low = np.searchsorted(values, value, side="left") / len(values)
+        high = np.searchsorted(values, value, side="right") / len(values)
+        error = max(error, 0.0 if low <= q <= high else min(abs(q - low), abs(q - high)))
+    return error
+
+
+def test_exact_selection_matches_numpy():
+    values = np.random.default_rng(0).normal(size=1001)
+    assert select(values, 17) == np.sort(values)[17]
+    assert quantiles(values, [0.1, 0.5, 0.93]) == pytest.approx(np.quantile(values, [0.1, 0.5, 0.93]), abs=0)
+    with pytest.raises(IndexError):
+        select(values, 1001)
+
+
+@pytest.mark.parametrize("k", [100, 200])
+@pytest.mark.parametrize("seed", range(4))
+def test_kll_rank_error_before_and_after_merge(k, seed):
+    rng = np.random.default_rng(seed)
+    first, second = rng.lognormal(2.0, 1.0, 200_000), rng.normal(0.0, 1.0, 150_000)
+    sketch = KLLSketch(k, seed)
+    for chunk in np.array_split(first, 20):
+        sketch.update(chunk)
+    other = KLLSketch(k, seed + 100)
+    for chunk in np.array_split(second, 7):
+        other.update(chunk)
+    assert rank_error(sketch, first) <= 3 / k
+    assert rank_error(other, second) <= 3 / k
+
+    sketch.merge(other)
+    both = np.concatenate([first, second])
+    assert sketch.count == len(both)
+    assert (sketch.min, sketch.max) == (both.min(), both.max())
+    assert len(sketch) <= 3 * k
+    assert rank_error(sketch, both) <= 3 / k
+    assert abs(sketch.rank(np.median(both)) - 0.5) <= 3 / k
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from nyctaxi.trip_loader import TRIP_SCHEMA, concat_tables, iter_csv_chunks
+from nyctaxi.trip_scanner import _fast_block, iter_scan, scan_block, scan_trips
+
+COLUMNS = ["tpep_pickup_datetime", "passenger_count", "store_and_fwd_flag", "PULocationID", "fare_amount"]
+
+
+def assert_same_table(table, reference, columns):
+    assert list(table.columns) == list(columns)
+    for name in columns:
+        assert table[name].dtype == reference[name].dtype, name
+        assert np.array_equal(table.nulls[name], reference.nulls[name]), name
+        assert np.array_equal(table[name], reference[name], equal_nan=table[name].dtype.kind == "f"), name
+
+
+@pytest.mark.parametrize("block_bytes", [4096, 1 << 23])
+def test_projection_matches_the_csv_loader(medium_path, block_bytes):
+    reference = concat_tables(list(iter_csv_chunks(medium_path, COLUMNS)))
+    assert_same_table(scan_trips(medium_path, COLUMNS, block_bytes=block_bytes), reference, COLUMNS)
+
+
+def test_predicates_keep_the_matching_rows(medium_path):
+    where = [("PULocationID", "in", {1, 132, 74, 43}), ("fare_amount", ">", 0)]
+    table = scan_trips(medium_path, ["PULocationID", "fare_amount", "tip_amount"], where, block_bytes=8192)
+    full = concat_tables(list(iter_csv_chunks(medium_path, ["PULocationID", "fare_amount", "tip_amount"])))
+    keep = (~full.nulls["PULocationID"] & np.isin(full["PULocationID"], [1, 132, 74, 43])
+            & ~full.nulls["fare_amount"] & (full["fare_amount"] > 0))
+    assert 0 < len(table) < len(full)
+    assert_same_table(table, full.take(keep), ["PULocationID", "fare_amount", "tip_amount"])
+
+
+def test_unknown_predicate_operator(small_path):
+    with pytest.raises(ValueError):
+        scan_trips(small_path, ["fare_amount"], [("fare_amount", "~", 0)])
+
+
+def test_quoted_rows_fall_back_to_csv_reader(tmp_path):
+    header = list(TRIP_SCHEMA)
+    plain = "2,2022-07-18T16:18:31.000,2022-07-18T16:22:26.000,1.0,0.27,1.0,N,140,140,2,4.0,1.0,0.5,0.0,0.0,0.3,8.3,2.5,0.0"
+    quoted = '1,2022-07-19T10:00:00.000,2022-07-19T10:30:00.000,2.0,5.1,1.0,"N",132,"74",1,"21.5",0,0.5,3,0,0.3,25.3,,'
+    block = f"{plain}\r\n{quoted}\r\n".encode()
+    buffer = np.frombuffer(block, dtype=np.uint8)
+    assert _fast_block(buffer, header, header, ()) is None
+    table = scan_block(block, header, ["store_and_fwd_flag", "DOLocationID", "fare_amount", "airport_fee"])
+    assert table["store_and_fwd_flag"].tolist() == ["N", "N"]
+    assert table["DOLocationID"].tolist() == [140, 74]
+    assert table["fare_amount"].tolist() == [4.0, 21.5]
+    assert table.nulls["airport_fee"].tolist() == [False, True]
+
+    path = tmp_path / "quoted.txt"
+    path.write_bytes((",".join(header) + "\r\n").encode() + block)
+    reference = concat_tables(list(iter_csv_chunks(str(path))))
+    assert_same_table(scan_trips(str(path)), reference, header)
+
+
+#A scan abandoned by a break is closed when collected, where an error would only be a warning
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+def test_scan_stopped_after_the_first_block(small_path):
+    scan = iter_scan(small_path, ["fare_amount"], block_bytes=4096)
+    first = next(scan)
+    scan.close()
+    assert len(first) > 0
+    for table in iter_scan(small_path, where=[("PULocationID", "in", {132})], block_bytes=4096):
+        break
+    with pytest.raises(KeyError):
+        for table in iter_scan(small_path, block_bytes=4096):
+            raise KeyError
+    assert len(table) > 0
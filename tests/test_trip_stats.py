@@ -0,0 +1,72 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from nyctaxi.trip_loader import load_trips
+from nyctaxi.trip_stats import SpeedFilters, TripStats, stream_stats
+from task1_project import calculate_speed, calculate_stats
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 1000, 1 << 20])
+def test_stream_stats_equals_calculate_stats(small_path, chunk_rows):
+    data = load_trips(small_path)
+    result = stream_stats(small_path, chunk_rows=chunk_rows)
+    assert result.rows == len(data)
+    assert result.stats() == calculate_stats(data)
+    assert result.speed_summary() == calculate_speed(data)
+
+
+@pytest.mark.parametrize("chunk_rows", [333, 65536])
+def test_stream_stats_of_the_medium_file(medium_path, chunk_rows):
+    data = load_trips(medium_path)
+    filters = SpeedFilters(max_speed_kmh=200)
+    result = stream_stats(medium_path, chunk_rows=chunk_rows, speed_filters=filters)
+    assert result.stats() == calculate_stats(data)
+    assert result.speed_summary() == calculate_speed(data, filters)
+
+
+def test_stream_stats_merges_into_other_files(small_path, medium_path):
+    both = TripStats().update(load_trips(small_path)).update(load_trips(medium_path))
+    merged = stream_stats(medium_path, into=stream_stats(small_path, chunk_rows=50))
+    assert merged.stats() == both.stats()
+    assert merged.speed_summary() == both.speed_summary()
+
+
+#calculate_stats and calculate_speed of the original csv.DictReader code, sums taken value by value
+BASELINE = {
+    "small": {
+        "passenger_count": (0.0, 6.0, 1.4167185231279817),
+        "fare_amount": (-104.5, 162.0, 14.778389999999987),
+        "total_amount": (-109.13, 185.85, 21.58335000000081),
+        "tip_amount": (-0.01, 46.32, 2.7063119999999965),
+        "speed": (0.0, 96647.3687336, 49.483908171554226),
+    },
+    "medium": {
+        "passenger_count": (0.0, 6.0, 1.4035577619195367),
+        "fare_amount": (-124.0, 450.0, 14.707487000000045),
+        "total_amount": (-139.05, 476.25, 21.469335333333582),
+        "tip_amount": (-2.0, 75.24, 2.7055033333333767),
+        "speed": (0.0, 485929.591356, 41.79701944447325),
+    },
+}
+
+
+def exact_mean(values: np.ndarray) -> float:
+    #The exact sum rounded once, divided by the count
+    return float(sum(map(Fraction, values.tolist()))) / len(values)
+
+
+@pytest.mark.parametrize("name", ["small", "medium"])
+def test_against_the_original_code(request, name):
+    #min and max are the original ones; the averages divide the exact sums rounded once, which
+    #differ from the original running float sums in the last digits only
+    data = load_trips(request.getfixturevalue(f"{name}_path"))
+    stats = calculate_stats(data)
+    _, min_speed, _, max_speed, _, avg_speed = calculate_speed(data)
+    stats["speed"] = {"min": min_speed, "max": max_speed, "avg": avg_speed}
+    for field, (low, high, average) in BASELINE[name].items():
+        assert (stats[field]["min"], stats[field]["max"]) == (low, high)
+        assert stats[field]["avg"] == pytest.approx(average, rel=1e-13)
+        if field != "speed":
+            assert stats[field]["avg"] == exact_mean(data.valid(field).astype(np.float64))
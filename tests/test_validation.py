@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from nyctaxi.trip_loader import TripTable, iter_trip_chunks, load_trips
+from nyctaxi.trip_stats import TripStats, stream_stats
+from nyctaxi.validation import (DEFAULT_RULES, ValidationReport, in_range, iter_validated, known_zone, not_null,
+                                ordered, rule_columns, rules_from_spec, validate)
+
+
+def table(**columns) -> TripTable:
+    #Columns given as lists, None for a blank cell
+    values = {name: np.array([0 if cell is None else cell for cell in cells]) for name, cells in columns.items()}
+    nulls = {name: np.array([cell is None for cell in cells]) for name, cells in columns.items()}
+    return TripTable(values, nulls)
+
+
+def test_per_rule_rejection_counts():
+    data = table(fare_amount=[5.0, -1.0, None, 12.0, -3.0],
+                 PULocationID=[1, 300, 43, None, 0],
+                 tpep_pickup_datetime=[10, 20, 30, 40, 50],
+                 tpep_dropoff_datetime=[11, 19, 31, 41, 49])
+    rules = [not_null("fare_amount"), in_range("fare_amount", 0), not_null("PULocationID"),
+             known_zone("PULocationID"), ordered("tpep_pickup_datetime", "tpep_dropoff_datetime"),
+             in_range("tip_amount", 0)]
+    result = validate(data, rules)
+    assert result.report.rejections == {"missing_fare_amount": 1, "negative_fare_amount": 2, "missing_PULocationID": 1,
+                                        "unknown_PULocationID": 2,
+                                        "tpep_dropoff_datetime_before_tpep_pickup_datetime": 2,
+                                        "negative_tip_amount": 0}
+    assert result.report.skipped == ["negative_tip_amount"]
+    assert result.keep.tolist() == [True, False, False, False, False]
+    assert (result.report.rows, result.report.kept, result.report.rejected) == (5, 1, 4)
+    assert result.clean["fare_amount"].tolist() == [5.0]
+
+
+def test_rules_from_spec():
+    rules = rules_from_spec({"passenger_count": {"min": 0, "max": 9, "required": True},
+                             "PULocationID": {"known_zone": True},
+                             "ordered": [["tpep_pickup_datetime", "tpep_dropoff_datetime"]]})
+    assert [rule.name for rule in rules] == [
+        "missing_passenger_count", "passenger_count_out_of_range", "unknown_PULocationID",
+        "tpep_dropoff_datetime_before_tpep_pickup_datetime"]
+    with pytest.raises(ValueError):
+        rules_from_spec({"fare_amount": {"minimum": 0}})
+
+
+def test_chunked_validation_adds_up(medium_path):
+    columns = rule_columns(DEFAULT_RULES)
+    whole = validate(load_trips(medium_path, columns))
+    report = ValidationReport()
+    rows = sum(len(chunk) for chunk in iter_validated(iter_trip_chunks(medium_path, columns, 1000),
+                                                      report=report))
+    assert report.as_dict() == whole.report.as_dict()
+    assert rows == whole.report.kept
+    assert 0 < whole.report.rejected < whole.report.rows
+
+
+def test_stream_stats_of_the_clean_trips(medium_path):
+    report = ValidationReport()
+    streamed = stream_stats(medium_path, chunk_rows=4096, rules=DEFAULT_RULES, report=report)
+    clean = validate(load_trips(medium_path)).clean
+    expected = TripStats().update(clean)
+    assert streamed.stats() == expected.stats()
+    assert streamed.speed_summary() == expected.speed_summary()
+    assert report.kept == len(clean)
@@ -0,0 +1,74 @@
+import csv
+import os
+from collections import Counter, defaultdict
+
+import numpy as np
+import pytest
+
+from nyctaxi.zones import NO_CODE, load_catalog
+
+LOOKUP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "taxi+_zone_lookup.csv")
+
+
+@pytest.fixture(scope="module")
+def rows() -> list:
+    with open(LOOKUP, "r", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_catalog_matches_the_lookup_file(rows):
+    catalog = load_catalog(LOOKUP)
+    assert len(catalog) == len(rows) == 265
+    assert catalog.ids.tolist() == [int(row["LocationID"]) for row in rows]
+    assert catalog.names_dict() == {int(row["LocationID"]): row["Zone"] for row in rows}
+    #Read once, then shared
+    assert load_catalog(LOOKUP) is catalog
+
+
+def test_catalog_is_read_again_when_the_file_changes(tmp_path, rows):
+    path = str(tmp_path / "lookup.csv")
+    with open(LOOKUP, "r", newline="") as f, open(path, "w", newline="") as out:
+        out.write(f.read())
+    catalog = load_catalog(path)
+    with open(path, "a", newline="") as out:
+        out.write('300,"Queens","New Zone","Boro Zone"\r\n')
+    changed = load_catalog(path)
+    assert changed is not catalog
+    assert len(changed) == len(rows) + 1
+    assert changed.names_dict([300]) == {300: "New Zone"}
+
+
+def test_zones_sharing_a_name_and_missing_ids():
+    catalog = load_catalog(LOOKUP)
+    #56 and 57 are both Corona; 0, 266 and -3 are not in the file
+    assert catalog.names_dict([57, 0, 56, 266, -3, 93]) == {57: "Corona", 56: "Corona",
+                                                             93: "Flushing Meadows-Corona Park"}
+    assert catalog.name_of([56, 57, 0, 266], default="?").tolist() == ["Corona", "Corona", "?", "?"]
+    assert catalog.borough_of([56, 0, 1, 264], default="?").tolist() == ["Queens", "?", "EWR", "Unknown"]
+    assert catalog.code_of([0, 266, -3]).tolist() == [NO_CODE] * 3
+    assert not catalog.known[0]
+
+
+@pytest.mark.parametrize("by, column", [("borough", "Borough"), ("service_zone", "service_zone")])
+def test_group_matches_a_counter(rows, by, column):
+    catalog = load_catalog(LOOKUP)
+    trips = np.arange(300) % 7
+    expected = Counter()
+    for row in rows:
+        expected[row[column]] += int(trips[int(row["LocationID"])])
+    #The trips of 0 and of the ids past 265 are left out
+    grouped = catalog.group(trips, by)
+    assert grouped == dict(expected)
+    assert list(grouped) == list(dict.fromkeys(row[column] for row in rows))
+    assert sum(grouped.values()) == int(trips[1:266].sum())
+    #Float results, the two Corona zones counted apart
+    fares = defaultdict(float)
+    per_zone = np.linspace(0.5, 133.0, 266)
+    for row in rows:
+        fares[row[column]] += per_zone[int(row["LocationID"])]
+    assert catalog.group(per_zone, by) == pytest.approx(dict(fares))
+
+
+def test_group_unknown_attribute():
+    with pytest.raises(ValueError):
+        load_catalog(LOOKUP).group(np.ones(266), "zone")